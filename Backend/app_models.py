@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, LargeBinary, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, BigInteger, String, Float, Boolean, LargeBinary, ForeignKey, DateTime, Index
+from sqlalchemy.orm import deferred, relationship
 from sqlalchemy.sql import func
 from database import Base
 
@@ -20,6 +21,12 @@ class Ticket(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     resolved_at = Column(DateTime(timezone=True))
+    # Video analysis job that created the ticket (makes job completion idempotent)
+    source_job_id = Column(String(32), nullable=True, index=True)
+
+    # Read-only navigation for listings (writes go through the FK columns)
+    user = relationship("User", viewonly=True)
+    sub_tickets = relationship("SubTicket", viewonly=True, order_by="SubTicket.id")
 
 
 class SubTicket(Base):
@@ -40,6 +47,8 @@ class SubTicket(Base):
     resolved_by = Column(String, nullable=True) # Store inspector name
     assigned_to = Column(Integer, ForeignKey("users.id"), nullable=True) # ID of assigned inspector
 
+    images = relationship("ComplaintImage", viewonly=True, order_by="ComplaintImage.id")
+
 
 class ComplaintImage(Base):
     __tablename__ = "complaint_images"
@@ -47,7 +56,14 @@ class ComplaintImage(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     sub_id = Column(String, ForeignKey("sub_tickets.sub_id"), nullable=False)
 
-    image_data = Column(LargeBinary, nullable=False)
+    # Legacy inline blob - new media lives in the media store (see storage_key)
+    # Deferred: only loaded when .image_data is actually accessed
+    image_data = deferred(Column(LargeBinary, nullable=True))
+    storage_key = Column(String(64), index=True, nullable=True)  # SHA-256 key of the stored (annotated) media
+    original_key = Column(String(64), index=True, nullable=True)  # SHA-256 key of the original upload
+    size_bytes = Column(BigInteger, nullable=True)
+    thumb_key = Column(String(64), nullable=True)  # WebP thumbnail rendition (see app_utils/renditions.py)
+    medium_key = Column(String(64), nullable=True)  # WebP medium rendition
     content_type = Column(String, nullable=False)
     media_type = Column(String, nullable=False, default="image")
     file_name = Column(String, nullable=True)
@@ -55,6 +71,7 @@ class ComplaintImage(Base):
     
     # Image deduplication fields
     image_hash = Column(String, index=True, nullable=True)  # Perceptual hash for similarity detection
+    image_phash = Column(BigInteger, nullable=True)  # Same pHash as signed 64-bit int for SQL Hamming filtering (NULL for MD5)
     latitude = Column(Float, index=True, nullable=True)  # GPS latitude for geospatial queries
     longitude = Column(Float, index=True, nullable=True)  # GPS longitude for geospatial queries
     confidence = Column(Float, nullable=True)  # Detection confidence score
@@ -62,6 +79,11 @@ class ComplaintImage(Base):
     # Timestamp - when image was uploaded
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
 
+    __table_args__ = (
+        # Bounding-box lookups for location-based duplicate detection
+        Index("idx_complaint_images_lat_lon", "latitude", "longitude"),
+    )
+
 
 class User(Base):
     __tablename__ = "users"
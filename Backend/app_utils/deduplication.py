@@ -11,8 +11,9 @@ FINAL RULES:
 from sqlalchemy.orm import Session
 from typing import Optional, Tuple
 from app_models import ComplaintImage, SubTicket, Ticket
-from app_utils.geo import calculate_distance
-from app_utils.image_hash import calculate_image_hash, compare_image_hashes
+from app_utils.geo import bounding_box, calculate_distance
+from app_utils.image_hash import calculate_image_hash, phash_to_int
+from app_utils.hash_index import hamming_distance, phash_index
 
 # ---------------- CONFIG ----------------
 DEFAULT_DISTANCE_THRESHOLD = 50  # meters
@@ -40,19 +41,32 @@ def check_duplicate_image(
         and latitude != 0.0 and longitude != 0.0
     )
 
-    # 🔹 Only compare against SAME ISSUE
-    query = (
-        db.query(ComplaintImage)
+    # 🔹 Only compare against SAME ISSUE, and never pull image_data
+    base_query = (
+        db.query(
+            ComplaintImage.id,
+            ComplaintImage.sub_id,
+            ComplaintImage.image_hash,
+            ComplaintImage.latitude,
+            ComplaintImage.longitude,
+        )
         .join(SubTicket, SubTicket.sub_id == ComplaintImage.sub_id)
         .filter(SubTicket.issue_type == issue_type)
         .filter(ComplaintImage.image_hash.isnot(None))
     )
 
-    for existing in query.all():
-        distance = None
-
-        # ---------------- LOCATION CHECK ----------------
-        if has_location and existing.latitude and existing.longitude:
+    # ---------------- LOCATION CHECK ----------------
+    if has_location:
+        # Bounding box on the indexed lat/lon columns, exact distance only for candidates
+        min_lat, max_lat, min_lon, max_lon = bounding_box(latitude, longitude, distance_threshold)
+        nearby = (
+            base_query
+            .filter(ComplaintImage.latitude.between(min_lat, max_lat))
+            .filter(ComplaintImage.longitude.between(min_lon, max_lon))
+            .order_by(ComplaintImage.id)
+        )
+
+        for existing in nearby:
             distance = calculate_distance(
                 latitude,
                 longitude,
@@ -74,43 +88,86 @@ def check_duplicate_image(
                     }
                 )
 
-        # ---------------- IMAGE SIMILARITY CHECK ----------------
-        if compare_image_hashes(new_hash, existing.image_hash, hash_threshold):
-            # ✅ RULE 2: Same issue + similar image (but far)
-            ticket_info = _build_ticket_info(db, existing)
-            return (
-                True,
-                "Duplicate image detected. This issue has already been reported.",
-                {
-                    "id": existing.id,
-                    "sub_id": existing.sub_id,
-                    "distance_meters": round(distance, 2) if distance else None,
-                    "ticket_info": ticket_info
-                }
-            )
+    # ---------------- IMAGE SIMILARITY CHECK ----------------
+    existing = _find_similar_image(db, base_query, new_hash, issue_type, hash_threshold)
+    if existing is not None:
+        # ✅ RULE 2: Same issue + similar image (but far)
+        distance = None
+        if has_location and existing.latitude and existing.longitude:
+            distance = calculate_distance(latitude, longitude, existing.latitude, existing.longitude)
+
+        ticket_info = _build_ticket_info(db, existing)
+        return (
+            True,
+            "Duplicate image detected. This issue has already been reported.",
+            {
+                "id": existing.id,
+                "sub_id": existing.sub_id,
+                "distance_meters": round(distance, 2) if distance else None,
+                "ticket_info": ticket_info
+            }
+        )
 
     # ✅ No conflicts
     return False, None, None
 
 
 # --------------------------------------------------
-# Helper to build clean ticket info
+# Helper to find a same-issue image with a similar hash
 # --------------------------------------------------
-def _build_ticket_info(db: Session, image: ComplaintImage) -> Optional[dict]:
-    sub_ticket = db.query(SubTicket).filter(
-        SubTicket.sub_id == image.sub_id
-    ).first()
-
-    if not sub_ticket:
+def _find_similar_image(db: Session, base_query, new_hash: str, issue_type: Optional[str], hash_threshold: int):
+    """
+    Lowest-id image whose pHash is within hash_threshold of new_hash.
+    Uses the in-memory BK-tree when it is built, otherwise filters with
+    popcount(xor) in the database. MD5 fallback hashes only ever match exactly.
+    """
+    new_phash = phash_to_int(new_hash)
+    if new_phash is None:
+        # MD5 fallback hash: exact match on the indexed column
+        return base_query.filter(ComplaintImage.image_hash == new_hash).order_by(ComplaintImage.id).first()
+
+    if phash_index.ready:
+        phash_index.sync(db)
+        for image_id, _ in phash_index.query(issue_type, new_phash, hash_threshold):
+            # Re-check the hash in SQL: the id may have been reused for another image since it was indexed
+            existing = (
+                base_query
+                .filter(ComplaintImage.id == image_id)
+                .filter(hamming_distance(ComplaintImage.image_phash, new_phash) <= hash_threshold)
+                .first()
+            )
+            if existing is not None:
+                return existing
+            # Deleted (or replaced) by another worker since it was indexed
+            phash_index.discard([image_id])
         return None
 
-    ticket = db.query(Ticket).filter(
-        Ticket.ticket_id == sub_ticket.ticket_id
-    ).first()
+    # Index not built yet: Hamming filter in SQL
+    return (
+        base_query
+        .filter(ComplaintImage.image_phash.isnot(None))
+        .filter(hamming_distance(ComplaintImage.image_phash, new_phash) <= hash_threshold)
+        .order_by(ComplaintImage.id)
+        .first()
+    )
+
 
-    if not ticket:
+# --------------------------------------------------
+# Helper to build clean ticket info
+# --------------------------------------------------
+def _build_ticket_info(db: Session, image) -> Optional[dict]:
+    row = (
+        db.query(Ticket, SubTicket)
+        .join(SubTicket, SubTicket.ticket_id == Ticket.ticket_id)
+        .filter(SubTicket.sub_id == image.sub_id)
+        .first()
+    )
+
+    if not row:
         return None
 
+    ticket, sub_ticket = row
+
     return {
         "ticket_id": ticket.ticket_id,
         "sub_id": sub_ticket.sub_id,
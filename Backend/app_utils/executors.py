@@ -0,0 +1,123 @@
+"""
+Executor Layer
+Keeps blocking work (YOLO inference, OpenCV encoding, SQLAlchemy sessions,
+disk I/O) off the asyncio event loop.
+
+Four bounded pools are provided:
+- inference_executor: few workers, for model forward passes and image encoding
+- io_executor: more workers, for database and file I/O
+- background_executor: fire-and-forget post-ingest work (e.g. renditions)
+- video_executor: long-running video analysis jobs (services/video_jobs.py)
+
+Each pool admits at most `max_pending` queued + running jobs. Past that,
+`run()` raises ExecutorSaturated, which main.py turns into a 503 response
+so clients back off instead of piling up requests behind a busy model.
+"""
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable
+
+
+class ExecutorSaturated(Exception):
+    """Raised when a bounded executor already holds its maximum number of jobs"""
+
+    def __init__(self, name: str, max_pending: int):
+        self.name = name
+        self.max_pending = max_pending
+        super().__init__(f"Server busy: {name} queue is full ({max_pending} pending jobs). Please retry shortly.")
+
+
+class BoundedExecutor:
+    """Thread pool with a hard cap on queued + running jobs"""
+
+    def __init__(self, name: str, max_workers: int, max_pending: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_pending = max(max_pending, max_workers)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        """Number of jobs currently queued or running"""
+        return self._pending
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """
+        Submit a job without waiting for it.
+
+        Raises:
+            ExecutorSaturated: if max_pending jobs are already in flight
+        """
+        if not self._slots.acquire(blocking=False):
+            raise ExecutorSaturated(self.name, self.max_pending)
+        with self._pending_lock:
+            self._pending += 1
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except Exception:
+            self._release()
+            raise
+        # Release the slot when the job finishes, even if the awaiting request was cancelled
+        future.add_done_callback(lambda _: self._release())
+        return future
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run a blocking callable in this pool and await its result"""
+        return await asyncio.wrap_future(self.submit(functools.partial(fn, *args, **kwargs)))
+
+    def shutdown(self, wait: bool = False):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _release(self):
+        with self._pending_lock:
+            self._pending -= 1
+        self._slots.release()
+
+
+# ---------------- POOLS ----------------
+inference_executor = BoundedExecutor(
+    "inference",
+    max_workers=int(os.getenv("YOLO_INFERENCE_WORKERS", "2")),
+    max_pending=int(os.getenv("YOLO_INFERENCE_MAX_PENDING", "16")),
+)
+
+io_executor = BoundedExecutor(
+    "io",
+    max_workers=int(os.getenv("IO_WORKERS", "16")),
+    max_pending=int(os.getenv("IO_MAX_PENDING", "256")),
+)
+
+background_executor = BoundedExecutor(
+    "background",
+    max_workers=int(os.getenv("BACKGROUND_WORKERS", "2")),
+    max_pending=int(os.getenv("BACKGROUND_MAX_PENDING", "1024")),
+)
+
+video_executor = BoundedExecutor(
+    "video",
+    max_workers=int(os.getenv("VIDEO_JOB_WORKERS", "1")),
+    max_pending=int(os.getenv("VIDEO_JOB_MAX_PENDING", "32")),
+)
+
+
+async def run_inference(fn: Callable, *args, **kwargs) -> Any:
+    """Run model inference / encoding work on the bounded inference pool"""
+    return await inference_executor.run(fn, *args, **kwargs)
+
+
+async def run_io(fn: Callable, *args, **kwargs) -> Any:
+    """Run database / file I/O on the bounded I/O pool"""
+    return await io_executor.run(fn, *args, **kwargs)
+
+
+def shutdown_executors():
+    inference_executor.shutdown()
+    io_executor.shutdown()
+    background_executor.shutdown()
+    video_executor.shutdown()
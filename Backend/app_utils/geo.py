@@ -20,6 +20,18 @@ def calculate_distance(lat1, lon1, lat2, lon2):
     r = 6371000 # Radius of earth in meters
     return c * r
 
+def bounding_box(lat, lon, radius_m):
+    """
+    Lat/lon box that fully contains the circle of radius_m meters around a point.
+    Used as an index-friendly pre-filter before the exact haversine check.
+    Returns (min_lat, max_lat, min_lon, max_lon).
+    """
+    lat_delta = math.degrees(radius_m / 6371000)
+    # Longitude degrees shrink with latitude; clamp near the poles
+    cos_lat = max(math.cos(math.radians(lat)), 1e-6)
+    lon_delta = min(lat_delta / cos_lat, 180.0)
+    return lat - lat_delta, lat + lat_delta, lon - lon_delta, lon + lon_delta
+
 def group_by_location(items, distance_threshold=20):
     """
     Group items by GPS coordinates.
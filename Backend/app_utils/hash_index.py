@@ -0,0 +1,167 @@
+"""
+Perceptual Hash Index
+In-memory BK-tree over 64-bit pHashes, partitioned by issue type, for
+"all images within Hamming distance <= k" lookups in sub-linear time.
+Also provides hamming_distance(), an SQL expression for the same
+comparison inside the database.
+
+The index is rebuilt from the database at startup, updated by save_image,
+and catches up on rows written by other worker processes (anything with an
+id above the highest id loaded from the database) before each query.
+"""
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.expression import FunctionElement
+from sqlalchemy.types import Integer
+
+from app_models import ComplaintImage, SubTicket
+from app_utils.image_hash import MASK64
+
+
+# ---------------- SQL HAMMING DISTANCE ----------------
+class hamming_distance(FunctionElement):
+    """popcount(a XOR b) over signed 64-bit integer hashes, compiled per dialect"""
+    type = Integer()
+    name = "hamming_distance"
+    inherit_cache = True
+
+
+@compiles(hamming_distance)
+def _compile_hamming_default(element, compiler, **kw):
+    # MySQL: BIT_COUNT(a ^ b)
+    a, b = (compiler.process(arg, **kw) for arg in element.clauses)
+    return f"bit_count({a} ^ {b})"
+
+
+@compiles(hamming_distance, "postgresql")
+def _compile_hamming_postgresql(element, compiler, **kw):
+    # PostgreSQL 14+: bit_count() over the two's complement bit pattern
+    a, b = (compiler.process(arg, **kw) for arg in element.clauses)
+    return f"bit_count(CAST(({a} # {b}) AS BIT(64)))"
+
+
+@compiles(hamming_distance, "sqlite")
+def _compile_hamming_sqlite(element, compiler, **kw):
+    # Python function registered on each connection in database.py
+    a, b = (compiler.process(arg, **kw) for arg in element.clauses)
+    return f"hamming_distance({a}, {b})"
+
+
+# ---------------- BK-TREE ----------------
+class BKTree:
+    """BK-tree keyed by Hamming distance; each node holds every item sharing its hash"""
+
+    def __init__(self):
+        self._root = None  # [hash, items, {distance: child}]
+        self.size = 0
+
+    def add(self, value: int, item):
+        self.size += 1
+        if self._root is None:
+            self._root = [value, [item], {}]
+            return
+
+        node = self._root
+        while True:
+            distance = (value ^ node[0]).bit_count()
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [item], {}]
+                return
+            node = child
+
+    def search(self, value: int, max_distance: int) -> List[Tuple[object, int]]:
+        """All (item, distance) pairs within max_distance of value"""
+        results = []
+        if self._root is None:
+            return results
+
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            distance = (value ^ node[0]).bit_count()
+            if distance <= max_distance:
+                results.extend((item, distance) for item in node[1])
+            # Triangle inequality: only children in [d - k, d + k] can match
+            low, high = distance - max_distance, distance + max_distance
+            stack.extend(child for d, child in node[2].items() if low <= d <= high)
+        return results
+
+
+class PerceptualHashIndex:
+    """Per-issue-type BK-trees of ComplaintImage ids keyed by pHash"""
+
+    def __init__(self):
+        self._trees: Dict[str, BKTree] = {}
+        # Live images: id -> (issue type, pHash). Tree entries that no longer
+        # match (deleted, or the id was reused after a delete) are ignored.
+        self._entries: Dict[int, Tuple[str, int]] = {}
+        # Highest id loaded from the database. Only _load advances it: ids this
+        # process adds itself can be above rows other workers commit later
+        self._synced_id = 0
+        self._lock = threading.RLock()
+        self.ready = False
+
+    def add(self, issue_type: str, image_phash: Optional[int], image_id: int):
+        with self._lock:
+            if image_phash is None:
+                self._entries.pop(image_id, None)
+                return
+            entry = (issue_type, image_phash & MASK64)
+            if self._entries.get(image_id) == entry:
+                return  # already indexed (saved here, then seen again by sync)
+            self._entries[image_id] = entry
+            self._trees.setdefault(issue_type, BKTree()).add(entry[1], (image_id, entry[1]))
+
+    def discard(self, image_ids):
+        """Forget deleted images (their BK-tree nodes stay but no longer match)"""
+        with self._lock:
+            for image_id in image_ids:
+                self._entries.pop(image_id, None)
+
+    def query(self, issue_type: str, image_phash: int, max_distance: int) -> List[Tuple[int, int]]:
+        """(image_id, distance) pairs within max_distance, ordered by image id"""
+        with self._lock:
+            tree = self._trees.get(issue_type)
+            if tree is None:
+                return []
+            matches = [(image_id, d) for (image_id, value), d in tree.search(image_phash & MASK64, max_distance)
+                       if self._entries.get(image_id) == (issue_type, value)]
+        return sorted(matches)
+
+    def rebuild(self, db: Session):
+        """Reload the whole index from the database"""
+        with self._lock:
+            self._trees = {}
+            self._entries = {}
+            self._synced_id = 0
+            self._load(db, after_id=0)
+            self.ready = True
+
+    def sync(self, db: Session):
+        """Pick up rows inserted since the last load (e.g. by another worker process)"""
+        with self._lock:
+            self._load(db, after_id=self._synced_id)
+
+    def _load(self, db: Session, after_id: int):
+        rows = (
+            db.query(ComplaintImage.id, ComplaintImage.image_phash, SubTicket.issue_type)
+            .join(SubTicket, SubTicket.sub_id == ComplaintImage.sub_id)
+            .filter(ComplaintImage.id > after_id)
+            .filter(ComplaintImage.image_phash.isnot(None))
+            .order_by(ComplaintImage.id)
+            .yield_per(5000)
+        )
+        for image_id, image_phash, issue_type in rows:
+            self.add(issue_type, image_phash, image_id)
+            self._synced_id = max(self._synced_id, image_id)
+
+
+# Process-wide index, built on startup
+phash_index = PerceptualHashIndex()
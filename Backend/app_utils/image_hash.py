@@ -16,6 +16,9 @@ except ImportError:
     Image = None
     imagehash = None
 
+PHASH_HEX_LENGTH = 16  # 8x8 pHash -> 64 bits -> 16 hex chars
+MASK64 = (1 << 64) - 1  # signed pHash ints -> unsigned before popcount
+
 
 def calculate_perceptual_hash(image_bytes: bytes) -> Optional[str]:
     """
@@ -46,6 +49,47 @@ def calculate_perceptual_hash(image_bytes: bytes) -> Optional[str]:
         return calculate_md5_hash(image_bytes)
 
 
+def calculate_array_phash(pixels) -> Optional[int]:
+    """
+    pHash of an already decoded (ideally downscaled grayscale) frame, as the
+    same signed 64-bit integer as phash_to_int. Used to detect scene changes
+    between live frames without re-encoding them.
+    
+    Args:
+        pixels: uint8 numpy array (H x W grayscale or H x W x 3 RGB)
+        
+    Returns:
+        Signed 64-bit integer, or None if imagehash is not available
+    """
+    if not IMAGEHASH_AVAILABLE:
+        return None
+    try:
+        return phash_to_int(str(imagehash.phash(Image.fromarray(pixels), hash_size=8)))
+    except Exception:
+        return None
+
+
+def phash_to_int(image_hash: Optional[str]) -> Optional[int]:
+    """
+    Convert a 16-char hex pHash to the signed 64-bit integer stored in
+    ComplaintImage.image_phash.
+    
+    Args:
+        image_hash: Hex hash string as returned by calculate_image_hash
+        
+    Returns:
+        Signed 64-bit integer, or None for MD5 fallback / invalid hashes
+    """
+    if not image_hash or len(image_hash) != PHASH_HEX_LENGTH:
+        return None
+    try:
+        value = int(image_hash, 16)
+    except ValueError:
+        return None
+    # Fold into BIGINT range (two's complement keeps XOR/popcount semantics)
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
 def calculate_md5_hash(image_bytes: bytes) -> str:
     """
     Calculate MD5 hash for exact duplicate detection.
@@ -59,6 +103,15 @@ def calculate_md5_hash(image_bytes: bytes) -> str:
     return hashlib.md5(image_bytes).hexdigest()
 
 
+def calculate_md5_file(path) -> str:
+    """calculate_md5_hash() of a file on disk, read in chunks (videos)"""
+    md5 = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
 def compare_image_hashes(hash1: Optional[str], hash2: Optional[str], threshold: int = 5) -> bool:
     """
     Compare two perceptual hashes to determine if images are similar.
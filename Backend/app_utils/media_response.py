@@ -0,0 +1,141 @@
+"""
+Media Responses
+HTTP serving for immutable, content-addressed media: chunked streaming,
+single-range requests (206) for video seeking, strong ETags derived from
+the content hash, conditional GET (304) and long-lived immutable caching.
+"""
+import re
+from typing import Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+
+from app_utils.media_store import MediaStore, content_key
+
+# Media behind an image id never changes (the key is its content hash)
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def etag_for(key: str) -> str:
+    return f'"{key}"'
+
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    candidates = [tag.strip() for tag in header.split(",")]
+    # Weak comparison for If-None-Match: ignore a W/ prefix
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single `bytes=` range into an inclusive (start, end).
+
+    Returns None when there is no usable range (absent, malformed, or
+    multi-range - the full body is served instead).
+    Raises ValueError when the range cannot be satisfied.
+    """
+    if not header:
+        return None
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        return None
+
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError("empty suffix range")
+        return max(size - length, 0), size - 1
+
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError("range not satisfiable")
+    return start, min(end, size - 1)
+
+
+def _negotiate(request: Request, etag: str, size: int, filename: Optional[str]):
+    """
+    Shared conditional-GET / Range handling.
+    Returns (early_response, headers, byte_range); early_response is a
+    304 or 416 that should be returned as-is, otherwise byte_range is the
+    inclusive (start, end) to serve or None for the full body.
+    """
+    headers = {
+        "ETag": etag,
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL,
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f'inline; filename="{filename or "image"}"',
+    }
+
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers), headers, None
+
+    # If-Range: only honour Range when the client's copy is still current
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if if_range and if_range.strip() != etag:
+        range_header = None
+
+    try:
+        byte_range = parse_range(range_header, size)
+    except ValueError:
+        headers["Content-Range"] = f"bytes */{size}"
+        return Response(status_code=416, headers=headers), headers, None
+
+    if byte_range is None:
+        headers["Content-Length"] = str(size)
+    else:
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1)
+    return None, headers, byte_range
+
+
+def media_response(
+    request: Request,
+    store: MediaStore,
+    key: str,
+    content_type: str,
+    filename: Optional[str] = None,
+) -> Response:
+    """Serve a stored blob with caching, conditional GET and Range support"""
+    early, headers, byte_range = _negotiate(request, etag_for(key), store.size(key), filename)
+    if early is not None:
+        return early
+
+    if byte_range is None:
+        return StreamingResponse(store.iter_chunks(key), media_type=content_type, headers=headers)
+
+    start, end = byte_range
+    return StreamingResponse(
+        store.iter_chunks(key, start=start, end=end),
+        status_code=206,
+        media_type=content_type,
+        headers=headers
+    )
+
+
+def inline_media_response(
+    request: Request,
+    data: bytes,
+    content_type: str,
+    filename: Optional[str] = None,
+) -> Response:
+    """Same caching / range semantics for legacy blobs still stored in the database"""
+    early, headers, byte_range = _negotiate(request, etag_for(content_key(data)), len(data), filename)
+    if early is not None:
+        return early
+
+    if byte_range is None:
+        return Response(content=data, media_type=content_type, headers=headers)
+
+    start, end = byte_range
+    return Response(content=data[start:end + 1], status_code=206, media_type=content_type, headers=headers)
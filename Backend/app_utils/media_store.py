@@ -0,0 +1,271 @@
+"""
+Content-Addressed Media Store
+Complaint images and videos live outside the database, keyed by the SHA-256
+of their bytes. Identical uploads share one stored object; the database only
+keeps the key and the size.
+
+Backends (selected with MEDIA_STORE):
+- local (default): files sharded as MEDIA_ROOT/ab/cd/<sha256>
+- s3: any S3-compatible endpoint (AWS, MinIO, ...) via boto3
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional
+
+CHUNK_SIZE = 256 * 1024
+
+
+# Lazy import boto3 so the local backend works without it
+def _get_boto3():
+    try:
+        import boto3
+        return boto3
+    except ImportError:
+        return None
+
+
+def content_key(data: bytes) -> str:
+    """SHA-256 hex digest used as the storage key"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def content_key_file(path: str | Path) -> str:
+    """content_key() of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class MediaStore(ABC):
+    """Interface shared by the storage backends"""
+
+    @abstractmethod
+    def put(self, data: bytes, content_type: Optional[str] = None) -> str:
+        """Store bytes (no-op if already present) and return their key"""
+
+    @abstractmethod
+    def put_file(self, path: str | Path, content_type: Optional[str] = None) -> str:
+        """put() for a file on disk, streamed instead of loaded into memory (e.g. videos)"""
+
+    @abstractmethod
+    def open(self, key: str) -> BinaryIO:
+        """Readable, seekable binary file object for a stored blob"""
+
+    @abstractmethod
+    def size(self, key: str) -> int:
+        """Size of a stored blob in bytes"""
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        """Whether a blob is stored under this key"""
+
+    @abstractmethod
+    def delete(self, key: str):
+        """Remove a blob (no-op if it is missing)"""
+
+    def local_path(self, key: str) -> Optional[Path]:
+        """Filesystem path of the blob if the backend has one, else None"""
+        return None
+
+    def read(self, key: str) -> bytes:
+        with self.open(key) as f:
+            return f.read()
+
+    def iter_chunks(self, key: str, start: int = 0, end: Optional[int] = None,
+                    chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        """Yield the bytes in [start, end] (inclusive) without loading the whole blob"""
+        with self.open(key) as f:
+            f.seek(start)
+            remaining = None if end is None else end - start + 1
+            while remaining is None or remaining > 0:
+                chunk = f.read(chunk_size if remaining is None else min(chunk_size, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+
+class LocalMediaStore(MediaStore):
+    """Blobs on local disk, sharded by the first two byte pairs of the hash"""
+
+    def __init__(self, root: str | Path):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / key[2:4] / key
+
+    def put(self, data: bytes, content_type: Optional[str] = None) -> str:
+        key = content_key(data)
+        path = self._path(key)
+        if path.exists():
+            return key
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temp file and rename so readers never see a partial blob
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            try: os.remove(tmp_path)
+            except OSError: pass
+            raise
+        return key
+
+    def put_file(self, path: str | Path, content_type: Optional[str] = None) -> str:
+        key = content_key_file(path)
+        target = self._path(key)
+        if target.exists():
+            return key
+
+        target.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=target.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f, open(path, "rb") as src:
+                shutil.copyfileobj(src, f, CHUNK_SIZE)
+            os.replace(tmp_path, target)
+        except Exception:
+            try: os.remove(tmp_path)
+            except OSError: pass
+            raise
+        return key
+
+    def open(self, key: str) -> BinaryIO:
+        return open(self._path(key), "rb")
+
+    def size(self, key: str) -> int:
+        return self._path(key).stat().st_size
+
+    def exists(self, key: str) -> bool:
+        return self._path(key).exists()
+
+    def delete(self, key: str):
+        try:
+            self._path(key).unlink()
+        except FileNotFoundError:
+            pass
+
+    def local_path(self, key: str) -> Optional[Path]:
+        return self._path(key)
+
+
+class S3MediaStore(MediaStore):
+    """Blobs in an S3-compatible bucket (set S3_ENDPOINT_URL for MinIO or other local stand-ins)"""
+
+    def __init__(self, bucket: str, endpoint_url: Optional[str] = None, prefix: str = "media/"):
+        boto3 = _get_boto3()
+        if boto3 is None:
+            raise ImportError("MEDIA_STORE=s3 requires boto3. Please install: pip install boto3")
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = boto3.client("s3", endpoint_url=endpoint_url)
+
+    def _object_key(self, key: str) -> str:
+        return f"{self.prefix}{key[:2]}/{key[2:4]}/{key}"
+
+    def put(self, data: bytes, content_type: Optional[str] = None) -> str:
+        key = content_key(data)
+        if self.exists(key):
+            return key
+        extra = {"ContentType": content_type} if content_type else {}
+        self.client.put_object(Bucket=self.bucket, Key=self._object_key(key), Body=data, **extra)
+        return key
+
+    def put_file(self, path: str | Path, content_type: Optional[str] = None) -> str:
+        key = content_key_file(path)
+        if self.exists(key):
+            return key
+        extra = {"ContentType": content_type} if content_type else {}
+        # upload_file streams the file (multipart for large videos)
+        self.client.upload_file(str(path), self.bucket, self._object_key(key), ExtraArgs=extra or None)
+        return key
+
+    def open(self, key: str) -> BinaryIO:
+        return _S3RangeReader(self, key)
+
+    def size(self, key: str) -> int:
+        head = self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+        return head["ContentLength"]
+
+    def exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+            return True
+        except ClientError as e:
+            # Only a missing object is "not there"; credential / network errors must surface
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=self._object_key(key))
+
+
+class _S3RangeReader:
+    """Minimal seekable reader that fetches byte ranges from S3 on demand"""
+
+    def __init__(self, store: S3MediaStore, key: str):
+        self.store = store
+        self.key = key
+        self.pos = 0
+        self.length = store.size(key)
+
+    def seek(self, offset: int, whence: int = 0):
+        base = {0: 0, 1: self.pos, 2: self.length}[whence]
+        self.pos = max(0, base + offset)
+        return self.pos
+
+    def tell(self) -> int:
+        return self.pos
+
+    def read(self, size: int = -1) -> bytes:
+        if self.pos >= self.length:
+            return b""
+        end = self.length - 1 if size is None or size < 0 else min(self.pos + size, self.length) - 1
+        obj = self.store.client.get_object(
+            Bucket=self.store.bucket,
+            Key=self.store._object_key(self.key),
+            Range=f"bytes={self.pos}-{end}"
+        )
+        data = obj["Body"].read()
+        self.pos += len(data)
+        return data
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Global store instance (lazy loading)
+_media_store: Optional[MediaStore] = None
+
+
+def get_media_store() -> MediaStore:
+    """Get or create the configured media store"""
+    global _media_store
+    if _media_store is None:
+        backend = os.getenv("MEDIA_STORE", "local").lower()
+        if backend == "s3":
+            _media_store = S3MediaStore(
+                bucket=os.getenv("S3_BUCKET", "mdms-media"),
+                endpoint_url=os.getenv("S3_ENDPOINT_URL"),
+            )
+        else:
+            _media_store = LocalMediaStore(os.getenv("MEDIA_ROOT", "uploads/media"))
+    return _media_store
@@ -0,0 +1,120 @@
+"""
+Inference Preprocessing
+Letterbox + normalize for YOLOv5Service without per-frame allocations.
+
+The stock path (utils/augmentations.letterbox, then transpose/flip,
+ascontiguousarray, float conversion and divide) allocates five full-size
+arrays per frame. Here:
+- resize/pad geometry is computed once per (input shape, img_size, auto)
+  and cached; the grey padding of a cached canvas is painted only once
+- cv2.resize writes straight into the canvas region inside the padding
+- BGR->RGB and HWC->CHW are one cv2.split into reused uint8 planes, and
+  the 1/255 scaling writes each plane straight into its channel of a
+  reusable float32 batch buffer (pinned memory on CUDA, so the
+  host->device copy can be asynchronous). This beats a single strided
+  numpy pass over the interleaved canvas.
+
+A fixed-size camera therefore reuses the same canvas and batch buffer on
+every frame. Buffers are not thread-safe: YOLOv5Service keeps one
+Preprocessor per thread.
+"""
+from collections import OrderedDict
+from typing import Sequence, Tuple
+
+import cv2
+import numpy as np
+
+PAD_COLOR = 114
+SCALE = np.float32(1 / 255)
+MAX_CACHED_SHAPES = 8   # distinct input geometries kept per thread
+MAX_CACHED_BATCHES = 4  # distinct (batch, H, W) float buffers kept per thread
+
+
+class LetterboxGeometry:
+    """Resize/pad parameters for one input shape (same math as utils/augmentations.letterbox)"""
+
+    def __init__(self, shape: Tuple[int, int], img_size: int, stride: int, auto: bool):
+        h, w = shape
+        r = min(img_size / h, img_size / w)
+        self.new_unpad = round(w * r), round(h * r)  # (w, h) for cv2.resize
+        dw, dh = img_size - self.new_unpad[0], img_size - self.new_unpad[1]
+        if auto:  # minimum rectangle
+            dw, dh = dw % stride, dh % stride
+        dw /= 2
+        dh /= 2
+        self.top, bottom = round(dh - 0.1), round(dh + 0.1)
+        self.left, right = round(dw - 0.1), round(dw + 0.1)
+        self.out_shape = (self.new_unpad[1] + self.top + bottom, self.new_unpad[0] + self.left + right)
+        # For scale_boxes(..., ratio_pad=): the exact pixel offsets used, not re-derived from shapes
+        self.ratio_pad = ((r, r), (self.left, self.top))
+        self.resize = (w, h) != self.new_unpad
+
+
+class Preprocessor:
+    """Reusable buffers for one thread"""
+
+    def __init__(self, torch, device, stride: int):
+        self.torch = torch
+        self.device = device
+        self.stride = stride
+        self.pin = device.type == "cuda"
+        self._canvases = OrderedDict()  # geometry key -> (LetterboxGeometry, uint8 HWC canvas, B/G/R planes)
+        self._batches = OrderedDict()   # (n, H, W) -> (torch float32 tensor, numpy view of it)
+
+    def _canvas(self, shape: Tuple[int, int], img_size: int, auto: bool):
+        key = (shape, img_size, auto)
+        entry = self._canvases.get(key)
+        if entry is None:
+            geometry = LetterboxGeometry(shape, img_size, self.stride, auto)
+            canvas = np.full((*geometry.out_shape, 3), PAD_COLOR, dtype=np.uint8)
+            planes = [np.empty(geometry.out_shape, dtype=np.uint8) for _ in range(3)]
+            entry = self._canvases[key] = (geometry, canvas, planes)
+            if len(self._canvases) > MAX_CACHED_SHAPES:
+                self._canvases.popitem(last=False)
+        else:
+            self._canvases.move_to_end(key)
+        return entry
+
+    def _batch(self, n: int, out_shape: Tuple[int, int]):
+        key = (n, *out_shape)
+        entry = self._batches.get(key)
+        if entry is None:
+            tensor = self.torch.empty((n, 3, *out_shape), dtype=self.torch.float32, pin_memory=self.pin)
+            entry = self._batches[key] = (tensor, tensor.numpy())
+            if len(self._batches) > MAX_CACHED_BATCHES:
+                self._batches.popitem(last=False)
+        else:
+            self._batches.move_to_end(key)
+        return entry
+
+    def __call__(self, images: Sequence[np.ndarray], img_size: int, auto: bool, half: bool = False):
+        """
+        Letterbox and normalize a batch of BGR frames.
+
+        Returns:
+            (tensor on self.device, one LetterboxGeometry per image). On CPU the
+            tensor is the reused buffer itself: it is only valid until this
+            thread's next call.
+        """
+        entries = [self._canvas(im0.shape[:2], img_size, auto) for im0 in images]
+        out_shapes = {geometry.out_shape for geometry, _, _ in entries}
+        if len(out_shapes) > 1:
+            raise ValueError(f"Images letterbox to different shapes {sorted(out_shapes)}; use auto=False for batches")
+
+        tensor, buffer = self._batch(len(entries), entries[0][0].out_shape)
+        for i, (im0, (geometry, canvas, planes)) in enumerate(zip(images, entries)):
+            w, h = geometry.new_unpad
+            region = canvas[geometry.top:geometry.top + h, geometry.left:geometry.left + w]
+            if geometry.resize:
+                cv2.resize(im0, geometry.new_unpad, dst=region, interpolation=cv2.INTER_LINEAR)
+            else:
+                region[...] = im0
+            cv2.split(canvas, planes)  # HWC -> B, G, R planes, in place
+            for channel, plane in enumerate(reversed(planes)):  # RGB order, /255 straight into the buffer
+                np.multiply(plane, SCALE, out=buffer[i, channel])
+
+        if self.device.type != "cpu":
+            tensor = tensor.to(self.device, non_blocking=self.pin)
+        if half:
+            tensor = tensor.half()
+        return tensor, [geometry for geometry, _, _ in entries]
@@ -0,0 +1,269 @@
+"""
+INT8 Post-Training Quantization
+Turns the custom pothole/garbage weights into an INT8 model for CPU edge
+boxes, on top of the FP32 exports from app_utils/runtime_export.py.
+
+1. The FP32 ONNX / OpenVINO export is taken from the runtime cache
+   (exporting on a miss, same dynamic axes as the served model)
+2. Activation ranges are calibrated on a small local image set, read
+   through YOLOv5's LoadImagesAndLabels with the same letterbox as
+   validation (labels are optional for calibration)
+3. Weights and activations are quantized to INT8:
+   - onnx:     onnxruntime.quantization.quantize_static, QDQ format,
+               per-channel weights
+   - openvino: nncf.quantize (MIXED preset, nncf>=2.6)
+   The Detect head's box decoding (grid/anchor Mul/Add/Pow, Concat) is
+   kept in FP32 - quantizing pixel coordinates costs most of the mAP
+4. FP32 and INT8 are both run through val.py on the dataset's val split
+   and the mAP / latency delta is reported (and written next to the model)
+
+The result is an ordinary weights file for DetectMultiBackend: point
+YOLO_WEIGHTS at it and YOLOv5Service serves it like any other export.
+Run it with scripts/quantize_model.py.
+"""
+import json
+import re
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from app_utils.runtime_export import export_runtime_model
+
+CALIBRATION_METHODS = ("minmax", "entropy", "percentile")
+DEFAULT_CALIBRATION_SIZE = 300  # images; a few hundred is plenty for activation ranges
+
+
+class CalibrationDataset:
+    """
+    Representative dataset for calibration: up to `limit` images from
+    `path`, evenly spread over the set, yielded as normalized 1x3xHxW
+    float32 arrays (the exact input the served model sees).
+    """
+
+    def __init__(self, path, img_size: int, stride: int = 32, limit: int = DEFAULT_CALIBRATION_SIZE):
+        from utils.dataloaders import LoadImagesAndLabels  # yolov5/utils
+
+        self.dataset = LoadImagesAndLabels(
+            path, img_size=img_size, batch_size=1, augment=False, rect=False, stride=stride, pad=0.5,
+            prefix="calibration: ",
+        )
+        n = len(self.dataset)
+        self.indices = np.linspace(0, n - 1, min(limit, n)).round().astype(int).tolist() if n else []
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __iter__(self):
+        for index in self.indices:
+            img = self.dataset[index][0].numpy()  # CHW RGB uint8, letterboxed to img_size
+            yield np.expand_dims(img, 0).astype(np.float32) / 255
+
+
+def _detect_head_prefix(node_names) -> Optional[str]:
+    """Name prefix of the Detect module (the highest /model.N/ index in the export)"""
+    indices = [int(m.group(1)) for m in (re.match(r"/model\.(\d+)/", name) for name in node_names) if m]
+    return f"/model.{max(indices)}/" if indices else None
+
+
+def quantize_onnx(fp32_path: Path, output_path: Path, calibration: CalibrationDataset, method: str = "minmax") -> Path:
+    """Static QDQ quantization with ONNX Runtime; returns output_path"""
+    import onnx
+    from onnxruntime.quantization import (
+        CalibrationDataReader, CalibrationMethod, QuantFormat, QuantType, quantize_static,
+    )
+    from utils.general import LOGGER  # yolov5/utils
+
+    class Reader(CalibrationDataReader):
+        def __init__(self, input_name):
+            self.input_name = input_name
+            self.batches = iter(calibration)
+
+        def get_next(self):
+            batch = next(self.batches, None)
+            return None if batch is None else {self.input_name: batch}
+
+    fp32_model = onnx.load(str(fp32_path))
+    prefix = _detect_head_prefix(node.name for node in fp32_model.graph.node)
+    exclude = [
+        node.name for node in fp32_model.graph.node
+        if prefix and node.name.startswith(prefix) and node.op_type != "Conv"
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Shape inference / graph cleanup first, as ONNX Runtime recommends for static quantization
+        model_input = fp32_path
+        try:
+            from onnxruntime.quantization.shape_inference import quant_pre_process
+
+            model_input = Path(tmp) / "preprocessed.onnx"
+            quant_pre_process(str(fp32_path), str(model_input))
+        except Exception as e:
+            LOGGER.warning(f"⚠️ ONNX quantization pre-processing skipped: {e}")
+            model_input = fp32_path
+
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        quantize_static(
+            str(model_input),
+            str(output_path),
+            Reader(fp32_model.graph.input[0].name),
+            quant_format=QuantFormat.QDQ,
+            per_channel=True,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            calibrate_method={
+                "minmax": CalibrationMethod.MinMax,
+                "entropy": CalibrationMethod.Entropy,
+                "percentile": CalibrationMethod.Percentile,
+            }[method],
+            nodes_to_exclude=exclude,
+        )
+
+    # DetectMultiBackend reads stride/names from the ONNX metadata; make sure it survived
+    int8_model = onnx.load(str(output_path))
+    present = {prop.key for prop in int8_model.metadata_props}
+    for prop in fp32_model.metadata_props:
+        if prop.key not in present:
+            int8_model.metadata_props.add(key=prop.key, value=prop.value)
+    onnx.save(int8_model, str(output_path))
+    return output_path
+
+
+def quantize_openvino(fp32_dir: Path, output_dir: Path, calibration: CalibrationDataset) -> Path:
+    """NNCF post-training quantization of an OpenVINO IR; returns output_dir"""
+    import nncf
+    from openvino.runtime import Core, serialize
+
+    xml = next(Path(fp32_dir).glob("*.xml"))
+    ov_model = Core().read_model(model=xml, weights=xml.with_suffix(".bin"))
+    prefix = _detect_head_prefix(op.get_friendly_name() for op in ov_model.get_ops())
+    ignored = [
+        op.get_friendly_name() for op in ov_model.get_ops()
+        if prefix and op.get_friendly_name().startswith(prefix)
+        and op.get_type_name() not in ("Convolution", "Constant", "Result")
+    ]
+
+    int8_model = nncf.quantize(
+        ov_model,
+        nncf.Dataset(calibration),
+        preset=nncf.QuantizationPreset.MIXED,
+        subset_size=len(calibration),
+        ignored_scope=nncf.IgnoredScope(names=ignored, validate=False) if ignored else None,
+    )
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    serialize(int8_model, str(output_dir / xml.name))
+    metadata = xml.with_suffix(".yaml")  # stride/names for DetectMultiBackend
+    if metadata.exists():
+        shutil.copy2(metadata, output_dir / metadata.name)
+    return output_dir
+
+
+def validate(weights: Path, data: str, img_size: int, workers: int = 0) -> dict:
+    """val.py metrics for one model on the dataset's val split (CPU, batch 1, like the edge boxes)"""
+    import val  # yolov5/val.py
+
+    with tempfile.TemporaryDirectory() as tmp:
+        (mp, mr, map50, map50_95, *_), _, speed = val.run(
+            data=data, weights=str(weights), batch_size=1, imgsz=img_size, device="cpu", workers=workers,
+            task="val", half=False, plots=False, project=tmp, name="val", exist_ok=True,
+        )
+    return {
+        "precision": round(float(mp), 4),
+        "recall": round(float(mr), 4),
+        "mAP50": round(float(map50), 4),
+        "mAP50-95": round(float(map50_95), 4),
+        "inference_ms": round(float(speed[1]), 2),
+    }
+
+
+def _default_output(weights_path: Path, backend: str) -> Path:
+    if backend == "onnx":
+        return weights_path.with_name(f"{weights_path.stem}_int8.onnx")
+    return weights_path.with_name(f"{weights_path.stem}_int8_openvino_model")
+
+
+def quantize_model(
+    weights_path: Path,
+    data: str,
+    cache_dir: Path,
+    backend: str = "onnx",
+    img_size: int = 640,
+    calibration_images: Optional[str] = None,
+    calibration_size: int = DEFAULT_CALIBRATION_SIZE,
+    method: str = "minmax",
+    output_path: Optional[Path] = None,
+    run_validation: bool = True,
+) -> dict:
+    """
+    Calibrate, quantize and (optionally) validate.
+
+    Must be called after yolo_service._import_dependencies() (uses YOLOv5's
+    export.py, val.py and dataloaders).
+
+    Args:
+        weights_path: FP32 weights (.pt, or an export matching `backend`)
+        data: dataset YAML (val split for the mAP report, train split for calibration)
+        cache_dir: runtime export cache (YOLOv5Service.runtime_cache) holding the FP32 export
+        backend: "onnx" (ONNX Runtime) or "openvino"
+        calibration_images: image dir / list file / glob; defaults to the dataset's train split
+        method: ONNX Runtime calibration method (see CALIBRATION_METHODS)
+
+    Returns:
+        Report dict (also written to <output>_quantization.json)
+    """
+    from utils.general import LOGGER, check_dataset, check_yaml  # yolov5/utils
+
+    if backend not in ("onnx", "openvino"):
+        raise ValueError(f"INT8 quantization supports onnx and openvino, not {backend!r}")
+    if method not in CALIBRATION_METHODS:
+        raise ValueError(f"Unknown calibration method {method!r} (expected one of {', '.join(CALIBRATION_METHODS)})")
+
+    weights_path = Path(weights_path)
+    dataset = check_dataset(check_yaml(data))
+    calibration_images = calibration_images or dataset.get("train") or dataset["val"]
+    output_path = Path(output_path) if output_path else _default_output(weights_path, backend)
+
+    # FP32 reference model, from the same cache YOLOv5Service serves from
+    if weights_path.suffix == ".pt":
+        fp32_path = export_runtime_model(weights_path, backend, img_size, Path(cache_dir))
+        if fp32_path is None:
+            raise RuntimeError(f"{backend} export of {weights_path.name} failed")
+    else:
+        fp32_path = weights_path
+
+    calibration = CalibrationDataset(calibration_images, img_size, limit=calibration_size)
+    if not len(calibration):
+        raise ValueError(f"No calibration images found in {calibration_images}")
+    LOGGER.info(f"🔧 Quantizing {fp32_path.name} to INT8 ({backend}), calibrating on {len(calibration)} image(s)...")
+
+    if backend == "onnx":
+        quantize_onnx(fp32_path, output_path, calibration, method)
+    else:
+        quantize_openvino(fp32_path, output_path, calibration)
+    LOGGER.info(f"✅ INT8 model written to {output_path}")
+
+    report = {
+        "weights": str(weights_path),
+        "backend": backend,
+        "img_size": img_size,
+        "calibration_images": len(calibration),
+        "calibration_method": method if backend == "onnx" else "nncf-mixed",
+        "fp32_model": str(fp32_path),
+        "int8_model": str(output_path),
+    }
+    if run_validation:
+        report["fp32"] = validate(fp32_path, data, img_size)
+        report["int8"] = validate(output_path, data, img_size)
+        report["delta"] = {
+            key: round(report["int8"][key] - report["fp32"][key], 4)
+            for key in ("precision", "recall", "mAP50", "mAP50-95")
+        }
+        if report["int8"]["inference_ms"]:
+            report["speedup"] = round(report["fp32"]["inference_ms"] / report["int8"]["inference_ms"], 2)
+
+    report_path = output_path.parent / f"{output_path.stem}_quantization.json"
+    report_path.write_text(json.dumps(report, indent=2))
+    return report
@@ -0,0 +1,143 @@
+"""
+Media Renditions
+Fixed-size WebP renditions (thumb / medium) of complaint media for list
+views. They are generated in a background worker right after ingest, stored
+in the media store like any other blob, and generated on demand for rows
+that predate this pipeline. Videos get a poster frame.
+"""
+import os
+import tempfile
+from io import BytesIO
+from typing import Dict, Optional
+
+from app_utils.executors import ExecutorSaturated, background_executor
+
+# Longest side in pixels, largest first (smaller renditions are derived from the previous one)
+RENDITION_SIZES = {
+    "medium": 1024,
+    "thumb": 256,
+}
+RENDITION_CONTENT_TYPE = "image/webp"
+RENDITION_QUALITY = int(os.getenv("RENDITION_QUALITY", "80"))
+# Stored in thumb_key / medium_key when the media cannot be decoded, so
+# get_image serves the full media instead of retrying the render every time
+RENDITION_FAILED = ""
+
+
+# Lazy import PIL to avoid startup errors
+def _get_pil():
+    try:
+        from PIL import Image
+        return Image
+    except ImportError:
+        return None
+
+
+def _video_poster(video_bytes: bytes):
+    """First decodable frame of a video as an RGB PIL image"""
+    import cv2
+    Image = _get_pil()
+
+    with tempfile.NamedTemporaryFile(suffix=".mp4", delete=False) as tmp:
+        tmp.write(video_bytes)
+        tmp_path = tmp.name
+    try:
+        cap = cv2.VideoCapture(tmp_path)
+        ok, frame = cap.read()
+        cap.release()
+    finally:
+        try: os.remove(tmp_path)
+        except OSError: pass
+
+    if not ok:
+        return None
+    return Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+
+
+def render(data: bytes, content_type: str) -> Dict[str, bytes]:
+    """
+    Build every rendition for one media blob.
+
+    Returns:
+        {size_name: webp_bytes}; empty if the media cannot be decoded
+    """
+    Image = _get_pil()
+    if Image is None:
+        return {}
+
+    if content_type and content_type.startswith("video/"):
+        img = _video_poster(data)
+        if img is None:
+            return {}
+    else:
+        try:
+            img = Image.open(BytesIO(data))
+            # Let the JPEG decoder downscale while decoding (much cheaper than a full decode)
+            largest = max(RENDITION_SIZES.values())
+            img.draft("RGB", (largest, largest))
+            img = img.convert("RGB")
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            # e.g. HEIC proofs Pillow has no decoder for
+            print(f"Cannot decode {content_type or 'media'} for renditions: {e}")
+            return {}
+
+    renditions = {}
+    for name, max_side in RENDITION_SIZES.items():
+        img.thumbnail((max_side, max_side), Image.LANCZOS)
+        buf = BytesIO()
+        img.save(buf, format="WEBP", quality=RENDITION_QUALITY, method=4)
+        renditions[name] = buf.getvalue()
+    return renditions
+
+
+def generate_renditions(db, image_id: int) -> Optional[Dict[str, str]]:
+    """
+    Render and store thumb/medium for one ComplaintImage and record their keys.
+
+    Undecodable media is recorded with RENDITION_FAILED keys so it is not
+    rendered again.
+
+    Returns:
+        {size_name: storage_key}, or None if the image is missing / undecodable
+    """
+    from app_models import ComplaintImage
+    from app_utils.media_store import get_media_store
+
+    image = db.query(ComplaintImage).filter(ComplaintImage.id == image_id).first()
+    if image is None or _get_pil() is None:
+        return None
+
+    store = get_media_store()
+    data = store.read(image.storage_key) if image.storage_key else image.image_data
+    if not data:
+        return None
+
+    renditions = render(data, image.content_type)
+    if not renditions:
+        image.thumb_key = image.medium_key = RENDITION_FAILED
+        db.commit()
+        return None
+
+    keys = {name: store.put(blob, RENDITION_CONTENT_TYPE) for name, blob in renditions.items()}
+    image.thumb_key = keys.get("thumb")
+    image.medium_key = keys.get("medium")
+    db.commit()
+    return keys
+
+
+def _generate_in_background(image_id: int):
+    from database import SessionLocal
+    try:
+        with SessionLocal() as db:
+            generate_renditions(db, image_id)
+    except Exception as e:
+        print(f"Rendition generation failed for image {image_id}: {e}")
+
+
+def schedule_renditions(image_id: int):
+    """Queue rendition generation for a freshly saved image"""
+    try:
+        background_executor.submit(_generate_in_background, image_id)
+    except ExecutorSaturated:
+        # Not fatal: get_image renders missing renditions on first request
+        print(f"Rendition queue full, deferring image {image_id} to first request")
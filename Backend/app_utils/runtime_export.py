@@ -0,0 +1,162 @@
+"""
+Runtime Export
+Serves YOLOv5 weights from an optimized CPU runtime instead of eager
+PyTorch.
+
+On first start the .pt weights are exported with yolov5/export.py (ONNX
+with dynamic batch/height/width, or OpenVINO IR built from that ONNX) into
+a cache directory keyed by the weights' SHA-256, so later starts load the
+exported graph directly and new weights trigger a fresh export. The result
+is loaded through DetectMultiBackend like any other weights file; its
+session is then rebuilt with tuned intra-op / inter-op thread settings.
+
+Export happens in a temporary directory that is renamed into place, so a
+crashed export or several workers starting at once never leave a
+half-written model behind.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+RUNTIME_BACKENDS = ("pytorch", "onnx", "openvino")
+
+YOLO_INTRA_OP_THREADS = int(os.getenv("YOLO_INTRA_OP_THREADS", "0"))  # 0 = all cores
+YOLO_INTER_OP_THREADS = int(os.getenv("YOLO_INTER_OP_THREADS", "1"))
+
+
+def _module_available(name: str) -> bool:
+    import importlib.util
+    return importlib.util.find_spec(name) is not None
+
+
+def resolve_backend(requested: str, device_type: str) -> str:
+    """
+    "auto" -> onnx (or openvino) on CPU when the runtime is installed,
+    pytorch otherwise (GPUs keep the PyTorch path).
+    """
+    if requested != "auto":
+        if requested not in RUNTIME_BACKENDS:
+            raise ValueError(f"Unknown YOLO backend {requested!r} (expected auto or one of {', '.join(RUNTIME_BACKENDS)})")
+        return requested
+    if device_type != "cpu":
+        return "pytorch"
+    if _module_available("onnxruntime"):
+        return "onnx"
+    if _module_available("openvino"):
+        return "openvino"
+    return "pytorch"
+
+
+def weights_digest(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def _exported_path(export_dir: Path, stem: str, backend: str) -> Path:
+    if backend == "onnx":
+        return export_dir / f"{stem}.onnx"
+    return export_dir / f"{stem}_openvino_model"
+
+
+def export_runtime_model(weights_path: Path, backend: str, img_size: int, cache_dir: Path) -> Optional[Path]:
+    """
+    Exported model for these weights, exporting on a cache miss.
+
+    Must be called after yolo_service._import_dependencies() (export.py
+    imports YOLOv5's models/utils packages).
+
+    Returns:
+        Path to the .onnx file / OpenVINO model dir, or None if the export failed
+    """
+    weights_path = Path(weights_path)
+    export_dir = cache_dir / f"{weights_path.stem}-{weights_digest(weights_path)}-{img_size}"
+    exported = _exported_path(export_dir, weights_path.stem, backend)
+    if exported.exists():
+        return exported
+
+    import export  # yolov5/export.py
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    work_dir = Path(tempfile.mkdtemp(prefix=".export-", dir=cache_dir))
+    try:
+        # export.py writes next to the weights file, so export a copy inside the work dir
+        work_weights = work_dir / weights_path.name
+        shutil.copy2(weights_path, work_weights)
+        export.run(
+            weights=work_weights,
+            imgsz=(img_size, img_size),
+            include=("onnx",) if backend == "onnx" else ("openvino",),
+            device="cpu",
+            dynamic=True,  # any batch size (micro-batcher, multi-camera) and letterbox shape
+            simplify=_module_available("onnxsim"),
+        )
+        if not _exported_path(work_dir, weights_path.stem, backend).exists():
+            return None
+        work_weights.unlink()
+
+        export_dir.mkdir(parents=True, exist_ok=True)
+        target = _exported_path(export_dir, weights_path.stem, backend)
+        for path in work_dir.iterdir():
+            destination = export_dir / path.name
+            if not destination.exists():
+                os.replace(path, destination)  # another worker may have won the race; theirs is identical
+        return target if target.exists() else None
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def runtime_of(model) -> str:
+    """Which runtime a loaded DetectMultiBackend runs on"""
+    return "onnx" if getattr(model, "onnx", False) else "openvino" if getattr(model, "xml", False) else "pytorch"
+
+
+def has_dynamic_input(model) -> bool:
+    """Does a loaded ONNX / OpenVINO model accept variable input shapes (dynamic-axes export)?"""
+    if getattr(model, "onnx", False):
+        return any(not isinstance(dim, int) for dim in model.session.get_inputs()[0].shape)
+    if getattr(model, "xml", False):
+        return model.ov_compiled_model.inputs[0].get_partial_shape().is_dynamic
+    return False
+
+
+def tune_runtime(model, backend: str, model_path: Path, intra_op_threads: int = YOLO_INTRA_OP_THREADS,
+                 inter_op_threads: int = YOLO_INTER_OP_THREADS):
+    """Rebuild a loaded DetectMultiBackend's session with explicit threading / optimization settings"""
+    intra_op_threads = intra_op_threads or os.cpu_count() or 1
+
+    if backend == "onnx" and getattr(model, "onnx", False):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+        options.execution_mode = (
+            onnxruntime.ExecutionMode.ORT_PARALLEL if inter_op_threads > 1 else onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+        )
+        model.session = onnxruntime.InferenceSession(
+            str(model_path), sess_options=options, providers=model.session.get_providers()
+        )
+        model.output_names = [x.name for x in model.session.get_outputs()]
+
+    elif backend == "openvino" and getattr(model, "xml", False):
+        from openvino.runtime import Core
+
+        model_path = Path(model_path)
+        xml = model_path if model_path.is_file() else next(model_path.glob("*.xml"))
+        core = Core()
+        model.ov_compiled_model = core.compile_model(
+            core.read_model(model=xml, weights=xml.with_suffix(".bin")),
+            device_name="CPU",
+            config={
+                "INFERENCE_NUM_THREADS": str(intra_op_threads),
+                "NUM_STREAMS": str(inter_op_threads),
+                "PERFORMANCE_HINT": "LATENCY" if inter_op_threads == 1 else "THROUGHPUT",
+            },
+        )
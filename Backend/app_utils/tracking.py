@@ -0,0 +1,227 @@
+"""
+Object Tracking
+Lightweight SORT-style multi-object tracker: a constant-velocity Kalman
+filter per object and IoU association (Hungarian matching) between
+predicted track boxes and new detections of the same class.
+
+Used by YOLOv5Service so that:
+- the detector only runs on keyframes while tracks are propagated in between
+- every detection carries a stable track_id
+- a video collapses to one best-confidence detection per physical object
+  instead of one detection per frame per box
+"""
+from typing import Dict, List
+
+import numpy as np
+
+
+# Lazy import scipy (Hungarian matching); greedy matching is used without it
+def _get_linear_sum_assignment():
+    try:
+        from scipy.optimize import linear_sum_assignment
+        return linear_sum_assignment
+    except ImportError:
+        return None
+
+
+def _bbox_to_z(bbox: dict) -> np.ndarray:
+    """x1,y1,x2,y2 -> [cx, cy, area, aspect ratio]"""
+    w = bbox["x2"] - bbox["x1"]
+    h = bbox["y2"] - bbox["y1"]
+    return np.array([bbox["x1"] + w / 2, bbox["y1"] + h / 2, w * h, w / max(h, 1e-6)], dtype=float)
+
+
+def _x_to_bbox(x: np.ndarray) -> dict:
+    area = max(float(x[2]), 0.0)
+    w = np.sqrt(area * max(float(x[3]), 1e-6))
+    h = area / w if w > 0 else 0.0
+    return {"x1": float(x[0] - w / 2), "y1": float(x[1] - h / 2), "x2": float(x[0] + w / 2), "y2": float(x[1] + h / 2)}
+
+
+def iou(a: dict, b: dict) -> float:
+    w = min(a["x2"], b["x2"]) - max(a["x1"], b["x1"])
+    h = min(a["y2"], b["y2"]) - max(a["y1"], b["y1"])
+    if w <= 0 or h <= 0:
+        return 0.0
+    inter = w * h
+    union = (a["x2"] - a["x1"]) * (a["y2"] - a["y1"]) + (b["x2"] - b["x1"]) * (b["y2"] - b["y1"]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+class KalmanBoxFilter:
+    """Constant-velocity Kalman filter over [cx, cy, area, ratio] (the SORT formulation)"""
+
+    def __init__(self, bbox: dict):
+        self.F = np.eye(7)
+        self.F[0, 4] = self.F[1, 5] = self.F[2, 6] = 1.0
+        self.H = np.eye(4, 7)
+        self.R = np.eye(4)
+        self.R[2:, 2:] *= 10.0
+        self.P = np.eye(7) * 10.0
+        self.P[4:, 4:] *= 1000.0  # unknown initial velocity
+        self.Q = np.eye(7)
+        self.Q[4:, 4:] *= 0.01
+        self.Q[-1, -1] *= 0.01
+        self.x = np.zeros(7)
+        self.x[:4] = _bbox_to_z(bbox)
+
+    def predict(self) -> dict:
+        if self.x[6] + self.x[2] <= 0:
+            self.x[6] = 0.0
+        self.x = self.F @ self.x
+        self.P = self.F @ self.P @ self.F.T + self.Q
+        return _x_to_bbox(self.x)
+
+    def update(self, bbox: dict):
+        y = _bbox_to_z(bbox) - self.H @ self.x
+        S = self.H @ self.P @ self.H.T + self.R
+        K = self.P @ self.H.T @ np.linalg.inv(S)
+        self.x = self.x + K @ y
+        self.P = (np.eye(7) - K @ self.H) @ self.P
+
+    @property
+    def bbox(self) -> dict:
+        return _x_to_bbox(self.x)
+
+
+class Track:
+    def __init__(self, track_id: int, detection: dict, frame_index: int):
+        self.track_id = track_id
+        self.class_name = detection["class_name"]
+        self.kf = KalmanBoxFilter(detection["bbox"])
+        self.hits = 1
+        self.misses = 0           # frames since the last matched detection
+        self.first_frame = frame_index
+        self.last_frame = frame_index
+        self.last_confidence = detection["confidence"]
+        self.best = dict(detection, frame=frame_index)
+
+
+class SortTracker:
+    """
+    Associates per-keyframe detections into tracks.
+
+    Call predict() once per frame (keyframe or not) to advance every track,
+    then update() on keyframes with the detector's output.
+    """
+
+    def __init__(self, iou_threshold: float = 0.3, max_age: int = 30, min_hits: int = 2, keep_history: bool = True):
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age      # frames a track survives without a matching detection
+        self.min_hits = min_hits    # keyframe matches before a track counts as a real object
+        self.keep_history = keep_history  # keep expired tracks for summary() (off for endless live streams)
+        self.tracks: List[Track] = []
+        self.finished: List[Track] = []
+        self.keyframes = 0
+        self._next_id = 1
+
+    def predict(self) -> List[dict]:
+        """Advance all tracks by one frame; returns the propagated boxes of live tracks"""
+        propagated = []
+        for track in self.tracks:
+            bbox = track.kf.predict()
+            track.misses += 1
+            if track.hits >= self.min_hits or track.misses <= 1:
+                propagated.append({
+                    "class_name": track.class_name,
+                    "confidence": track.last_confidence,
+                    "bbox": bbox,
+                    "track_id": track.track_id,
+                    "predicted": True,
+                })
+        self._expire()
+        return propagated
+
+    def update(self, detections: List[dict], frame_index: int) -> List[dict]:
+        """
+        Match a keyframe's detections to the (already predicted) tracks.
+
+        Returns:
+            The detections, each with a track_id added
+        """
+        self.keyframes += 1
+        tracked = [dict(det) for det in detections]
+        matches = self._associate(tracked)
+
+        matched_dets = set()
+        for det_index, track in matches:
+            det = tracked[det_index]
+            matched_dets.add(det_index)
+            track.kf.update(det["bbox"])
+            track.hits += 1
+            track.misses = 0
+            track.last_frame = frame_index
+            track.last_confidence = det["confidence"]
+            if det["confidence"] > track.best["confidence"]:
+                track.best = dict(det, frame=frame_index)
+            det["track_id"] = track.track_id
+
+        for det_index, det in enumerate(tracked):
+            if det_index not in matched_dets:
+                track = Track(self._next_id, det, frame_index)
+                self._next_id += 1
+                self.tracks.append(track)
+                det["track_id"] = track.track_id
+        return tracked
+
+    def _associate(self, detections: List[dict]):
+        if not detections or not self.tracks:
+            return []
+        cost = np.zeros((len(detections), len(self.tracks)))
+        for i, det in enumerate(detections):
+            for j, track in enumerate(self.tracks):
+                if det["class_name"] == track.class_name:
+                    cost[i, j] = iou(det["bbox"], track.kf.bbox)
+
+        linear_sum_assignment = _get_linear_sum_assignment()
+        if linear_sum_assignment is not None:
+            rows, cols = linear_sum_assignment(-cost)
+            pairs = zip(rows, cols)
+        else:
+            # Greedy: best IoU first
+            pairs, used_rows, used_cols = [], set(), set()
+            for flat in np.argsort(-cost, axis=None):
+                i, j = np.unravel_index(flat, cost.shape)
+                if i not in used_rows and j not in used_cols:
+                    pairs.append((i, j))
+                    used_rows.add(i)
+                    used_cols.add(j)
+        return [(i, self.tracks[j]) for i, j in pairs if cost[i, j] >= self.iou_threshold]
+
+    def _expire(self):
+        alive = []
+        for track in self.tracks:
+            if track.misses <= self.max_age:
+                alive.append(track)
+            elif self.keep_history:
+                self.finished.append(track)
+        self.tracks = alive
+
+    def summary(self, include_unconfirmed: bool = False) -> List[dict]:
+        """
+        One best-confidence detection per confirmed track (ordered by first
+        appearance). Tracks need min_hits keyframe matches, unless the clip
+        had fewer keyframes than that.
+
+        include_unconfirmed also keeps tracks seen on fewer keyframes (marked
+        confirmed=False): on a sampled clip an object may only be in frame
+        for a single keyframe, and the per-frame output used to report it.
+        """
+        required = min(self.min_hits, max(self.keyframes, 1))
+        results = []
+        for track in sorted(self.finished + self.tracks, key=lambda t: t.track_id):
+            confirmed = track.hits >= required
+            if not confirmed and not include_unconfirmed:
+                continue
+            results.append(dict(
+                track.best,
+                track_id=track.track_id,
+                hits=track.hits,
+                first_frame=track.first_frame,
+                last_frame=track.last_frame,
+                confirmed=confirmed,
+            ))
+        return results
+
+    def stats(self) -> Dict[str, int]:
+        return {"active_tracks": len(self.tracks), "total_tracks": self._next_id - 1}
@@ -3,13 +3,21 @@ import uuid
 
 
 # ---------- Ticket ----------
-def get_or_create_ticket(db, lat, lon, user_id=None):
+def get_or_create_ticket(db, lat, lon, user_id=None, source_job_id=None):
     """
     ALWAYS create a new ticket.
     Previously this reused an open ticket at the same lat/lon, which caused
     new complaints to show the same ticket_id. The product requirement is to
     generate a fresh ticket ID for each submission.
+
+    The one exception is a video analysis job (source_job_id) that is
+    completed again after a failure: it gets back the ticket it already created.
     """
+    if source_job_id:
+        existing = db.query(Ticket).filter(Ticket.source_job_id == source_job_id).first()
+        if existing:
+            return existing
+
     from app_utils.geo import get_address_details
     address_info = get_address_details(lat, lon)
     
@@ -20,7 +28,8 @@ def get_or_create_ticket(db, lat, lon, user_id=None):
         longitude=lon,
         area=address_info.get("area"),
         district=address_info.get("district"),
-        address=address_info.get("full_address")
+        address=address_info.get("full_address"),
+        source_job_id=source_job_id
     )
     db.add(ticket)
     db.commit()
@@ -138,27 +147,95 @@ def save_image(
     file_name=None,
     latitude=None,
     longitude=None,
-    confidence=None
+    confidence=None,
+    original_bytes=None
 ):
     # Calculate image hash for deduplication
-    from app_utils.image_hash import calculate_image_hash
+    from app_utils.image_hash import calculate_image_hash, phash_to_int
     image_hash = calculate_image_hash(image_bytes, use_perceptual=True)
+    image_phash = phash_to_int(image_hash)
+
+    # Bytes go to the content-addressed media store; the row keeps only keys + size
+    from app_utils.media_store import get_media_store
+    store = get_media_store()
+    storage_key = store.put(image_bytes, content_type)
+    original_key = store.put(original_bytes, content_type) if original_bytes else None
     
-    image = ComplaintImage(
+    return _add_media_row(
+        db,
         sub_id=sub_id,
-        image_data=image_bytes,
+        storage_key=storage_key,
+        original_key=original_key,
+        size_bytes=len(image_bytes),
         content_type=content_type,
         media_type=media_type,
         file_name=file_name,
         gps_extracted=gps_extracted,
         image_hash=image_hash,
+        image_phash=image_phash,
+        latitude=latitude,
+        longitude=longitude,
+        confidence=confidence
+    )
+
+
+def save_media_file(
+    db,
+    sub_id,
+    file_path,
+    content_type,
+    gps_extracted,
+    media_type="video",
+    file_name=None,
+    latitude=None,
+    longitude=None,
+    confidence=None,
+    original_path=None
+):
+    """
+    save_image() for media on disk (analysed videos): streamed into the media
+    store without loading it into memory. Hashed with MD5 (no pHash for videos).
+    """
+    from pathlib import Path
+    from app_utils.image_hash import calculate_md5_file
+    from app_utils.media_store import get_media_store
+    store = get_media_store()
+    storage_key = store.put_file(file_path, content_type)
+    original_key = store.put_file(original_path, content_type) if original_path else None
+
+    return _add_media_row(
+        db,
+        sub_id=sub_id,
+        storage_key=storage_key,
+        original_key=original_key,
+        size_bytes=Path(file_path).stat().st_size,
+        content_type=content_type,
+        media_type=media_type,
+        file_name=file_name,
+        gps_extracted=gps_extracted,
+        image_hash=calculate_md5_file(file_path),
+        image_phash=None,
         latitude=latitude,
         longitude=longitude,
         confidence=confidence
     )
+
+
+def _add_media_row(db, **fields):
+    image = ComplaintImage(**fields)
     db.add(image)
     db.commit()
     db.refresh(image)
+
+    # Keep the in-memory near-duplicate index in sync
+    from app_utils.hash_index import phash_index
+    if phash_index.ready and image.image_phash is not None:
+        issue_type = db.query(SubTicket.issue_type).filter(SubTicket.sub_id == image.sub_id).scalar()
+        phash_index.add(issue_type, image.image_phash, image.id)
+
+    # Thumbnail / medium renditions are built off the request path
+    from app_utils.renditions import schedule_renditions
+    schedule_renditions(image.id)
     return image
 
 
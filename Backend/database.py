@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
 from dotenv import load_dotenv
 import os
@@ -25,6 +25,16 @@ if DATABASE_URL.startswith("sqlite"):
         connect_args={"check_same_thread": False},
         echo=False
     )
+
+    @event.listens_for(engine, "connect")
+    def _register_sqlite_functions(dbapi_conn, connection_record):
+        # popcount(a XOR b) for 64-bit perceptual hashes (PostgreSQL uses bit_count)
+        def hamming_distance(a, b):
+            if a is None or b is None:
+                return None
+            return ((a ^ b) & 0xFFFFFFFFFFFFFFFF).bit_count()
+
+        dbapi_conn.create_function("hamming_distance", 2, hamming_distance, deterministic=True)
 else:
     # PostgreSQL connection settings
     engine = create_engine(
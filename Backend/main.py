@@ -1,12 +1,14 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
 from routers.complaints import router as complaints_router
 from routers.yolo_live import router as yolo_live_router  # NEW YOLO Live Camera API
 from routers.inspector import router as inspector_router  # NEW Inspector API
 from routers.auth import router as auth_router            # NEW Auth API
 
-from database import engine, Base
+from database import engine, Base, SessionLocal
+from app_utils.executors import ExecutorSaturated, shutdown_executors
 import logging
 
 logger = logging.getLogger(__name__)
@@ -31,6 +33,45 @@ async def startup_event():
         logger.error(f"Failed to create database tables: {e}")
         logger.warning("Application will continue, but DB operations may fail")
 
+    # Build the perceptual-hash index used for near-duplicate lookups
+    try:
+        from app_utils.hash_index import phash_index
+        with SessionLocal() as db:
+            phash_index.rebuild(db)
+        logger.info("Perceptual hash index built")
+    except Exception as e:
+        logger.error(f"Failed to build perceptual hash index: {e}")
+        logger.warning("Duplicate detection will fall back to a linear hash scan")
+
+
+    # Pick up video analysis jobs interrupted by the last shutdown
+    try:
+        from services.video_jobs import video_jobs
+        resumed = video_jobs.resume_pending()
+        if resumed:
+            logger.info(f"Resumed {resumed} video analysis job(s)")
+    except Exception as e:
+        logger.error(f"Failed to resume video analysis jobs: {e}")
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    from services.video_jobs import video_jobs
+    video_jobs.shutdown()
+    shutdown_executors()
+
+
+# -------------------------------------
+# Backpressure - Executor Queues Full
+# -------------------------------------
+@app.exception_handler(ExecutorSaturated)
+async def executor_saturated_handler(request: Request, exc: ExecutorSaturated):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": "2"}
+    )
+
 
 # -------------------------------------
 # CORS SETTINGS
@@ -1,23 +1,35 @@
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Query, Form
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Query, Form, Request
+from fastapi.responses import RedirectResponse
+from sqlalchemy import and_, case, exists, func, or_
+from sqlalchemy.orm import Session, joinedload, selectinload
 from typing import List, Optional
 from datetime import datetime
 
+import asyncio
 import os
 import cv2
 import uuid
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from database import get_db
+from database import get_db, SessionLocal
 from app_utils.exif import extract_gps_from_image_bytes
 from app_utils.geo import group_by_location
 from app_utils.deduplication import check_duplicate_image
+from app_utils.hash_index import phash_index
+from app_utils.media_store import get_media_store
+from app_utils.media_response import inline_media_response, media_response
+from app_utils.renditions import RENDITION_CONTENT_TYPE, generate_renditions
+from app_utils.executors import ExecutorSaturated, inference_executor, run_inference, run_io, video_executor
 from yolo_service import get_yolo_service
+from services.video_jobs import FAILED, VideoJob, video_jobs
 from app_models import Ticket, SubTicket, ComplaintImage, User
 
 from crud import (
     get_or_create_ticket,
     get_or_create_sub_ticket,
-    save_image
+    save_image,
+    save_media_file
 )
 
 router = APIRouter(prefix="/api/complaints", tags=["Complaints"])
@@ -27,24 +39,155 @@ UPLOAD_DIR = Path("uploads")
 # AI folders
 AI_IMG_DIR = UPLOAD_DIR / "ai" / "images"
 AI_VID_DIR = UPLOAD_DIR / "ai" / "videos"
-# Original folders
-ORIGINAL_IMG_DIR = UPLOAD_DIR / "original" / "images"
-ORIGINAL_VID_DIR = UPLOAD_DIR / "original" / "videos"
-# Results folders
-RESULTS_IMG_DIR = UPLOAD_DIR / "results" / "images"
-RESULTS_VID_DIR = UPLOAD_DIR / "results" / "videos"
 
 # Ensure all directories exist
 AI_IMG_DIR.mkdir(parents=True, exist_ok=True)
 AI_VID_DIR.mkdir(parents=True, exist_ok=True)
-ORIGINAL_IMG_DIR.mkdir(parents=True, exist_ok=True)
-ORIGINAL_VID_DIR.mkdir(parents=True, exist_ok=True)
-RESULTS_IMG_DIR.mkdir(parents=True, exist_ok=True)
-RESULTS_VID_DIR.mkdir(parents=True, exist_ok=True)
 
 # ---------------- Authority Mapping ----------------
 from app_utils.constants import AUTHORITY_MAP, DEFAULT_LAT, DEFAULT_LON
 
+# ---------------- Batch Detection ----------------
+# Images per batched forward pass for /batch uploads (also bounds decoded-image memory)
+BATCH_INFERENCE_SIZE = int(os.getenv("YOLO_UPLOAD_BATCH", "16"))
+
+# Decode / EXIF / encode work for batch uploads (OpenCV and PIL release the GIL)
+_media_pool = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1), thread_name_prefix="media")
+
+
+def _is_image(file: UploadFile) -> bool:
+    return bool(file.content_type and file.content_type.startswith("image/"))
+
+
+def _decode_image(image_bytes: bytes):
+    return cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+
+
+def _encode_jpeg(img) -> Optional[bytes]:
+    ok, encoded_img = cv2.imencode('.jpg', img)
+    return encoded_img.tobytes() if ok else None
+
+
+def _detect_images_batched(yolo_service, images_bytes: List[bytes]) -> List[tuple]:
+    """
+    Decode, detect and re-encode uploaded images in chunks of BATCH_INFERENCE_SIZE.
+    Each chunk is decoded in parallel, run as one batched forward + NMS, and the
+    annotated outputs are JPEG-encoded in parallel.
+
+    Returns a list of (detections, annotated_bytes) aligned with the input.
+    Images that fail to decode or detect keep ([], original bytes).
+    """
+    results = []
+    for start in range(0, len(images_bytes), BATCH_INFERENCE_SIZE):
+        chunk = images_bytes[start:start + BATCH_INFERENCE_SIZE]
+        chunk_results = [([], image_bytes) for image_bytes in chunk]
+
+        decoded = list(_media_pool.map(_decode_image, chunk))
+        valid = [i for i, im in enumerate(decoded) if im is not None]
+        try:
+            batch_out = yolo_service.detect_batch([decoded[i] for i in valid])
+            encoded = list(_media_pool.map(_encode_jpeg, [annotated for _, annotated in batch_out]))
+            for i, (detections, _), annotated_bytes in zip(valid, batch_out, encoded):
+                chunk_results[i] = (detections, annotated_bytes or chunk[i])
+        except Exception as e:
+            print(f"YOLO batch detection failed for {len(valid)} image(s): {e}")
+
+        results.extend(chunk_results)
+    return results
+
+
+async def _detect_and_encode(image_bytes: bytes) -> tuple:
+    """
+    Run YOLO on one uploaded image; returns (detections, annotated JPEG bytes or original).
+
+    Decoding and JPEG encoding run on the inference pool, but the detection
+    itself is awaited on the event loop: pool threads never block on the
+    micro-batcher, so concurrent uploads can fill a whole YOLO_MAX_BATCH.
+
+    Raises:
+        ExecutorSaturated: if the pool or the batcher already holds
+            YOLO_INFERENCE_MAX_PENDING jobs
+    """
+    yolo_service = await run_inference(get_yolo_service)
+    im0 = await run_inference(_decode_image, image_bytes)
+    if im0 is None:
+        raise ValueError("Failed to decode image")
+
+    batcher = yolo_service.batcher
+    if batcher is not None:
+        if batcher.pending >= inference_executor.max_pending:
+            raise ExecutorSaturated("inference", inference_executor.max_pending)
+        detections, annotated_cv2_img = await asyncio.wrap_future(batcher.submit(im0))
+    else:
+        detections, annotated_cv2_img = await run_inference(yolo_service.detect_image, im0)
+
+    annotated_bytes = await run_inference(_encode_jpeg, annotated_cv2_img) if annotated_cv2_img is not None else None
+    return detections, annotated_bytes or image_bytes
+
+
+def _is_video(file: UploadFile) -> bool:
+    return bool(file.content_type and file.content_type.startswith("video/"))
+
+
+def _detected_issues(detections: List[dict]) -> List[dict]:
+    """Highest confidence per AUTHORITY_MAP issue type"""
+    detected_issues_map = {}
+
+    for det in detections:
+        class_name = det["class_name"].lower().replace("_", "").replace(" ", "")
+        confidence = det["confidence"]
+
+        if class_name in AUTHORITY_MAP:
+            # Keep only highest confidence per issue
+            if (
+                class_name not in detected_issues_map
+                or confidence > detected_issues_map[class_name]
+            ):
+                detected_issues_map[class_name] = confidence
+
+    # Final deduplicated issues
+    return [
+        {"issue_type": issue, "confidence": conf}
+        for issue, conf in detected_issues_map.items()
+    ]
+
+
+def _complete_video_job(job: VideoJob) -> dict:
+    """
+    video_jobs.on_complete: create tickets for an analysed video (runs on the job worker).
+    Video detections are already collapsed to one best-confidence entry per tracked object.
+    """
+    # Paths, not bytes: the files are streamed into the media store by save_media_file
+    item = {
+        "file_path": job.source_path,
+        "annotated_path": job.output_path if job.output_path.exists() else job.source_path,
+        "content_type": job.content_type,
+        "file_name": job.file_name,
+        "media_type": "video",
+        "latitude": job.context.get("latitude"),
+        "longitude": job.context.get("longitude"),
+        "gps_extracted": False,
+    }
+    detected_issues = _detected_issues(job.detections)
+    if detected_issues:
+        items = [
+            dict(item, issue_type=issue["issue_type"], detection_confidence=issue["confidence"], no_detection=False)
+            for issue in detected_issues
+        ]
+    else:
+        items = [dict(item, issue_type=None, detection_confidence=None, no_detection=True)]
+
+    # Tagged with the job id: completing a resumed job again reuses what was already saved
+    with SessionLocal() as db:
+        results, total_rejected = _save_location_groups(
+            db, group_by_location(items, distance_threshold=20), job.context.get("user_id"),
+            source_job_id=job.job_id
+        )
+    return {"tickets_created": results, "rejected": total_rejected}
+
+
+video_jobs.on_complete = _complete_video_job
+
 
 # ==================================================
 # SINGLE IMAGE COMPLAINT UPLOAD (REFERENCE-STYLE)
@@ -88,7 +231,7 @@ async def upload_complaint_image(
     image_bytes = await file.read()
 
     # 🔍 Extract GPS from image bytes
-    gps_data = extract_gps_from_image_bytes(image_bytes)
+    gps_data = await run_io(extract_gps_from_image_bytes, image_bytes)
 
     # ✅ FINAL LOCATION LOGIC
     # ONLY use EXIF GPS data from the image itself
@@ -110,11 +253,13 @@ async def upload_complaint_image(
     check_lat = lat if gps_extracted and lat != DEFAULT_LAT else None
     check_lon = lon if gps_extracted and lon != DEFAULT_LON else None
 
-    is_duplicate, reason, existing_info = check_duplicate_image(
+    is_duplicate, reason, existing_info = await run_io(
+        check_duplicate_image,
         db=db,
         image_bytes=image_bytes,
         latitude=check_lat,
         longitude=check_lon,
+        issue_type=normalized_issue,
         distance_threshold=50,  # 50 meters for location-aware matching
     )
 
@@ -127,19 +272,16 @@ async def upload_complaint_image(
         }
 
     # 🔍 Run YOLO detection for results
-    yolo_service = get_yolo_service()
     annotated_bytes = image_bytes  # Fallback
     max_confidence = None
     detections_found = False
     try:
-        detections, annotated_cv2_img = yolo_service.detect_from_bytes(image_bytes)
-        if annotated_cv2_img is not None:
-            _, encoded_img = cv2.imencode('.jpg', annotated_cv2_img)
-            annotated_bytes = encoded_img.tobytes()
-            
-            if detections:
-                detections_found = True
-                max_confidence = max(d['confidence'] for d in detections)
+        detections, annotated_bytes = await _detect_and_encode(image_bytes)
+        if detections:
+            detections_found = True
+            max_confidence = max(d['confidence'] for d in detections)
+    except ExecutorSaturated:
+        raise
     except Exception as e:
         print(f"YOLO detection failed for single upload: {e}")
 
@@ -152,30 +294,23 @@ async def upload_complaint_image(
         }
 
     # 1️⃣ MAIN TICKET (LOCATION BASED)
-    ticket = get_or_create_ticket(db, lat, lon, user_id=user_id)
+    ticket = await run_io(get_or_create_ticket, db, lat, lon, user_id=user_id)
 
     # 2️⃣ SUB TICKET (ISSUE BASED)
-    sub_ticket = get_or_create_sub_ticket(
+    sub_ticket = await run_io(
+        get_or_create_sub_ticket,
         db,
         ticket.ticket_id,
         normalized_issue,
         authority,
     )
 
-    # Save to filesystem
     unique_id = uuid.uuid4().hex[:8]
     safe_name = f"{unique_id}_{file.filename}"
-    
-    # Save original
-    with open(ORIGINAL_IMG_DIR / safe_name, "wb") as f:
-        f.write(image_bytes)
-        
-    # Save result (annotated)
-    with open(RESULTS_IMG_DIR / safe_name, "wb") as f:
-        f.write(annotated_bytes)
 
-    # 3️⃣ SAVE IMAGE TO DB
-    image = save_image(
+    # 3️⃣ SAVE IMAGE (annotated + original go to the media store)
+    image = await run_io(
+        save_image,
         db=db,
         sub_id=sub_ticket.sub_id,
         image_bytes=annotated_bytes,
@@ -185,7 +320,8 @@ async def upload_complaint_image(
         file_name=safe_name,
         latitude=lat if gps_extracted else None,
         longitude=lon if gps_extracted else None,
-        confidence=max_confidence
+        confidence=max_confidence,
+        original_bytes=image_bytes
     )
 
     return {
@@ -216,18 +352,45 @@ async def upload_batch_complaints(
     latitude: Optional[float] = Form(None),
     longitude: Optional[float] = Form(None),
     user_id: Optional[int] = Form(None),
+    video_sampling: Optional[str] = Form(
+        None, regex="^(stride|scene|budget)$",
+        description="Video keyframe sampling: stride, scene or budget (default: YOLO_VIDEO_SAMPLING)"
+    ),
     db: Session = Depends(get_db)
 ):
     if not files:
         raise HTTPException(400, "No files uploaded")
 
-    yolo_service = get_yolo_service()
     processed_items = []
 
+    # Videos are queued only after the image work below (which can 503); check for
+    # room up front too, so a 503 never leaves jobs behind that a client retry would duplicate
+    videos = [file for file in files if _is_video(file)]
+    if videos and video_executor.max_pending - video_executor.pending < len(videos):
+        raise ExecutorSaturated(video_executor.name, video_executor.max_pending)
+
+    # ---------------- READ + EXIF (PARALLEL) ----------------
+    uploads = [(file, await file.read()) for file in files if not _is_video(file)]
+
+    gps_results = await run_io(lambda: list(_media_pool.map(
+        lambda upload: extract_gps_from_image_bytes(upload[1]) if _is_image(upload[0]) else None,
+        uploads
+    )))
+
+    # ---------------- BATCHED IMAGE DETECTION ----------------
+    image_indices = [i for i, (file, _) in enumerate(uploads) if _is_image(file)]
+    image_results = {}
+    if image_indices:
+        image_results = dict(zip(
+            image_indices,
+            await run_inference(
+                lambda: _detect_images_batched(get_yolo_service(), [uploads[i][1] for i in image_indices])
+            )
+        ))
+
     # ---------------- PROCESS EACH FILE ----------------
-    for file in files:
-        content_type = file.content_type
-        file_bytes = await file.read()
+    for idx, (file, file_bytes) in enumerate(uploads):
+        content_type = file.content_type or ""
 
         lat, lon = None, None
         gps_extracted = False
@@ -236,13 +399,12 @@ async def upload_batch_complaints(
         # ---------- IMAGE GPS (EXIF ONLY) ----------
         # Only use GPS data embedded in the image file itself
         # Screenshots and images without GPS metadata will have NO location
-        if content_type and content_type.startswith("image/"):
-            gps_data = extract_gps_from_image_bytes(file_bytes)
-            if gps_data and gps_data.get("latitude") and gps_data.get("longitude"):
-                lat = gps_data["latitude"]
-                lon = gps_data["longitude"]
-                gps_extracted = True
-                gps_source = "exif"
+        gps_data = gps_results[idx]
+        if gps_data and gps_data.get("latitude") and gps_data.get("longitude"):
+            lat = gps_data["latitude"]
+            lon = gps_data["longitude"]
+            gps_extracted = True
+            gps_source = "exif"
 
         # If no EXIF GPS found, use manual fallback if provided
         if not gps_extracted:
@@ -260,63 +422,11 @@ async def upload_batch_complaints(
         annotated_bytes = file_bytes  # Fallback to original
         
         if content_type.startswith("image/"):
-            try:
-                detections, annotated_cv2_img = yolo_service.detect_from_bytes(file_bytes)
-                if annotated_cv2_img is not None:
-                     _, encoded_img = cv2.imencode('.jpg', annotated_cv2_img)
-                     annotated_bytes = encoded_img.tobytes()
-            except Exception as e:
-                print(f"YOLO detection failed for image {file.filename}: {e}")
-                detections = []
-        
-        elif content_type.startswith("video/"):
-            try:
-                # For videos, we need to save to a temp file first for processing
-                import tempfile
-                with tempfile.NamedTemporaryFile(suffix=".mp4", delete=False) as tmp:
-                    tmp.write(file_bytes)
-                    tmp_path = tmp.name
-                
-                output_vid_path, detections, _ = yolo_service.detect_video(tmp_path)
-                
-                # Use the annotated video as the "annotated_bytes"
-                if os.path.exists(output_vid_path):
-                    with open(output_vid_path, "rb") as f:
-                        annotated_bytes = f.read()
-                    
-                    # Cleanup output video file
-                    try: os.remove(output_vid_path)
-                    except: pass
-                
-                # Cleanup input temp file
-                try: os.remove(tmp_path)
-                except: pass
-                    
-            except Exception as e:
-                print(f"YOLO detection failed for video {file.filename}: {e}")
-                detections = []
+            detections, annotated_bytes = image_results[idx]
 
-        # Find the primary issue type for this file (image or video)
+        # Find the primary issue type for this file
         # Priority: Find the issue type with highest confidence detection
-        detected_issues_map = {}
-
-        for det in detections:
-            class_name = det["class_name"].lower().replace("_", "").replace(" ", "")
-            confidence = det["confidence"]
-
-            if class_name in AUTHORITY_MAP:
-                # Keep only highest confidence per issue
-                if (
-                    class_name not in detected_issues_map
-                    or confidence > detected_issues_map[class_name]
-                ):
-                    detected_issues_map[class_name] = confidence
-
-        # Final deduplicated issues
-        detected_issues = [
-            {"issue_type": issue, "confidence": conf}
-            for issue, conf in detected_issues_map.items()
-        ]
+        detected_issues = _detected_issues(detections)
 
 
         # If no detection found, skip saving this file and mark rejected
@@ -356,7 +466,44 @@ async def upload_batch_complaints(
             })
 
 
+    # ---------------- VIDEOS -> BACKGROUND JOBS ----------------
+    # Videos are streamed to disk and analysed asynchronously; poll GET /jobs/{job_id}
+    video_jobs_started = []
+    queued = []
+    try:
+        for file in videos:
+            job = await run_io(
+                video_jobs.create, file.file, file.filename, file.content_type,
+                {
+                    # Videos carry no EXIF: manual location, else none
+                    "latitude": latitude if latitude is not None and longitude is not None else DEFAULT_LAT,
+                    "longitude": longitude if latitude is not None and longitude is not None else DEFAULT_LON,
+                    "user_id": user_id,
+                    "sampling": video_sampling,
+                }
+            )
+            try:
+                queued.append((job, video_jobs.start(job)))
+            except ExecutorSaturated:
+                video_jobs.discard(job)
+                raise
+            video_jobs_started.append({
+                "job_id": job.job_id,
+                "file_name": file.filename,
+                "status_url": f"{router.prefix}/jobs/{job.job_id}",
+            })
+    except BaseException:
+        # Lost a race for the last slots (or the I/O pool is full): undo this request's jobs
+        _discard_video_jobs(queued)
+        raise
+
     if not processed_items:
+        if video_jobs_started:
+            return {
+                "status": "processing",
+                "tickets_created": [],
+                "video_jobs": video_jobs_started
+            }
         raise HTTPException(400, "No valid complaints detected")
 
     # ---------------- GROUP BY LOCATION ----------------
@@ -365,6 +512,44 @@ async def upload_batch_complaints(
         distance_threshold=20  # meters
     )
 
+    try:
+        results, total_rejected = await run_io(_save_location_groups, db, location_groups, user_id)
+    except BaseException:
+        # The client gets an error and no job ids: drop the videos queued above
+        _discard_video_jobs(queued)
+        raise
+
+    response = {
+        "status": "success",
+        "tickets_created": results
+    }
+    if video_jobs_started:
+        response["video_jobs"] = video_jobs_started
+    
+    if total_rejected > 0:
+        response["message"] = f"{total_rejected} image(s) processed with issues. Some were rejected as duplicates or non-detections."
+        response["duplicates_found"] = total_rejected
+    
+    return response
+
+
+def _discard_video_jobs(queued: list):
+    """Cancel and delete (job, future) pairs from a failed /batch request; running jobs are left to finish"""
+    for job, future in queued:
+        if future.cancel():
+            video_jobs.discard(job)
+
+
+def _save_location_groups(
+    db: Session, location_groups: List[list], user_id: Optional[int], source_job_id: Optional[str] = None
+) -> tuple:
+    """
+    Dedup-check and persist grouped batch items (runs on the I/O pool).
+    Items carry either bytes (file_bytes / annotated_bytes) or paths on disk
+    (file_path / annotated_path, analysed videos).
+    With source_job_id, tickets and media already saved for that job are reused.
+    Returns (tickets_created results, total_rejected).
+    """
     results = []
     total_rejected = 0
 
@@ -450,7 +635,9 @@ async def upload_batch_complaints(
 
                 # 3. If NOT a duplicate, ensure TICKET and SUB-TICKET exist
                 if ticket_obj is None:
-                    ticket_obj = get_or_create_ticket(db, rep["latitude"], rep["longitude"], user_id=user_id)
+                    ticket_obj = get_or_create_ticket(
+                        db, rep["latitude"], rep["longitude"], user_id=user_id, source_job_id=source_job_id
+                    )
                     ticket_result["ticket_id"] = ticket_obj.ticket_id
                     ticket_result["area"] = ticket_obj.area
                     ticket_result["district"] = ticket_obj.district
@@ -458,34 +645,46 @@ async def upload_batch_complaints(
                 if sub_ticket_obj is None:
                     sub_ticket_obj = get_or_create_sub_ticket(db, ticket_obj.ticket_id, issue_type, authority)
 
-                # 4. Save to filesystem
-                unique_id = uuid.uuid4().hex[:8]
-                safe_name = f"{unique_id}_{item['file_name']}"
-                media_type = item["media_type"]
-                
-                if media_type == "image":
-                    original_path = ORIGINAL_IMG_DIR / safe_name
-                    result_path = RESULTS_IMG_DIR / safe_name
+                # 4. Save media (annotated + original) to the media store and the row to DB
+                image_obj = None
+                if source_job_id:
+                    # Job completed before (e.g. resumed after a failure past this point)
+                    image_obj = db.query(ComplaintImage).filter(ComplaintImage.sub_id == sub_ticket_obj.sub_id).first()
+
+                if image_obj is not None:
+                    safe_name = image_obj.file_name
+                elif "file_path" in item:
+                    safe_name = f"{uuid.uuid4().hex[:8]}_{item['file_name']}"
+                    image_obj = save_media_file(
+                        db=db,
+                        sub_id=sub_ticket_obj.sub_id,
+                        file_path=item["annotated_path"],
+                        content_type=item["content_type"],
+                        gps_extracted=item["gps_extracted"],
+                        media_type=item["media_type"],
+                        file_name=safe_name,
+                        latitude=item["latitude"] if has_gps else None,
+                        longitude=item["longitude"] if has_gps else None,
+                        confidence=item.get("detection_confidence"),
+                        original_path=item["file_path"]
+                    )
                 else:
-                    original_path = ORIGINAL_VID_DIR / safe_name
-                    result_path = RESULTS_VID_DIR / safe_name
-                
-                with open(original_path, "wb") as f: f.write(item["file_bytes"])
-                with open(result_path, "wb") as f: f.write(item["annotated_bytes"])
-
-                # 5. Save to DB
-                image_obj = save_image(
-                    db=db,
-                    sub_id=sub_ticket_obj.sub_id,
-                    image_bytes=item["annotated_bytes"],
-                    content_type=item["content_type"],
-                    gps_extracted=item["gps_extracted"],
-                    media_type=item["media_type"],
-                    file_name=safe_name,
-                    latitude=item["latitude"] if has_gps else None,
-                    longitude=item["longitude"] if has_gps else None,
-                    confidence=item.get("detection_confidence")
-                )
+                    unique_id = uuid.uuid4().hex[:8]
+                    safe_name = f"{unique_id}_{item['file_name']}"
+
+                    image_obj = save_image(
+                        db=db,
+                        sub_id=sub_ticket_obj.sub_id,
+                        image_bytes=item["annotated_bytes"],
+                        content_type=item["content_type"],
+                        gps_extracted=item["gps_extracted"],
+                        media_type=item["media_type"],
+                        file_name=safe_name,
+                        latitude=item["latitude"] if has_gps else None,
+                        longitude=item["longitude"] if has_gps else None,
+                        confidence=item.get("detection_confidence"),
+                        original_bytes=item["file_bytes"]
+                    )
                 saved_count += 1
                 saved_images.append({
                     "id": image_obj.id,
@@ -509,56 +708,155 @@ async def upload_batch_complaints(
 
         results.append(ticket_result)
 
-    response = {
-        "status": "success",
-        "tickets_created": results
-    }
-    
-    if total_rejected > 0:
-        response["message"] = f"{total_rejected} image(s) processed with issues. Some were rejected as duplicates or non-detections."
-        response["duplicates_found"] = total_rejected
-    
-    return response
+    return results, total_rejected
+
+
+# ==================================================
+# VIDEO ANALYSIS JOBS
+# ==================================================
+@router.get("/jobs/{job_id}")
+def get_video_job(job_id: str):
+    """Progress of a video uploaded through /batch; includes the tickets once completed."""
+    job = video_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.info()
+
+
+@router.post("/jobs/{job_id}/resume")
+def resume_video_job(job_id: str):
+    """Retry a failed job from its last completed segment."""
+    job = video_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status != FAILED:
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}; only failed jobs can be resumed")
+    video_jobs.start(job)
+    return job.info()
 
 
 # ==================================================
 # GET ALL TICKETS
 # ==================================================
+# Columns needed by listing payloads - never the image_data blob
+IMAGE_LIST_COLUMNS = (
+    ComplaintImage.sub_id,
+    ComplaintImage.file_name,
+    ComplaintImage.media_type,
+    ComplaintImage.confidence,
+    ComplaintImage.latitude,
+    ComplaintImage.longitude,
+    ComplaintImage.created_at,
+)
+
+
+def _sub_ticket_media_summary(db: Session, sub_ids: List[str]) -> dict:
+    """
+    Per sub-ticket image count, first media and first GPS-tagged image,
+    aggregated in SQL. Returns {sub_id: (count, first_image, gps_image)}.
+    """
+    if not sub_ids:
+        return {}
+
+    has_gps = and_(ComplaintImage.latitude.isnot(None), ComplaintImage.longitude.isnot(None))
+    rows = (
+        db.query(
+            ComplaintImage.sub_id,
+            func.count(ComplaintImage.id),
+            func.min(ComplaintImage.id),
+            func.min(case((has_gps, ComplaintImage.id))),
+        )
+        .filter(ComplaintImage.sub_id.in_(sub_ids))
+        .group_by(ComplaintImage.sub_id)
+        .all()
+    )
+
+    picked_ids = {image_id for _, _, first_id, gps_id in rows for image_id in (first_id, gps_id) if image_id}
+    picked = {}
+    if picked_ids:
+        picked = {
+            img.id: img
+            for img in db.query(ComplaintImage.id, *IMAGE_LIST_COLUMNS).filter(ComplaintImage.id.in_(picked_ids))
+        }
+
+    return {
+        sub_id: (count, picked.get(first_id), picked.get(gps_id))
+        for sub_id, count, first_id, gps_id in rows
+    }
+
+
 @router.get("/tickets")
-async def get_tickets(
+def get_tickets(
     status: Optional[str] = Query(None, description="Filter by status"),
     issue_type: Optional[str] = Query(None, description="Filter by issue type"),
     user_id: Optional[int] = Query(None, description="Filter by user ID"),
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Page size (all tickets if omitted)"),
+    offset: int = Query(0, ge=0, description="Number of tickets to skip"),
+    cursor: Optional[int] = Query(None, description="Return tickets after this cursor (next_cursor of the previous page)"),
+    include_images: bool = Query(True, description="Include the full image list of each sub-ticket"),
     db: Session = Depends(get_db)
 ):
     """
-    Get all tickets with optional filtering
+    Get all tickets with optional filtering and pagination.
+
+    Uses a fixed number of queries regardless of result size: tickets joined
+    with the user name, their sub-tickets, and their image rows (columns only,
+    never the blob) - or an SQL aggregate per sub-ticket when include_images
+    is false.
     """
-    query = db.query(Ticket)
+    # Only tickets that have (matching) sub-tickets are listed
+    sub_match = SubTicket.ticket_id == Ticket.ticket_id
+    if issue_type:
+        sub_match = and_(sub_match, SubTicket.issue_type == issue_type)
+
+    sub_tickets_rel = Ticket.sub_tickets.and_(SubTicket.issue_type == issue_type) if issue_type else Ticket.sub_tickets
+    load_subs = selectinload(sub_tickets_rel)
+    if include_images:
+        load_subs = load_subs.selectinload(SubTicket.images).load_only(*IMAGE_LIST_COLUMNS)
+
+    query = (
+        db.query(Ticket)
+        .options(joinedload(Ticket.user).load_only(User.name), load_subs)
+        .filter(exists().where(sub_match))
+    )
     
     if status:
         query = query.filter(Ticket.status == status)
     
     if user_id:
         query = query.filter(Ticket.user_id == user_id)
+
+    if cursor is not None:
+        query = query.filter(Ticket.id > cursor)
+
+    query = query.order_by(Ticket.id)
+    if offset:
+        query = query.offset(offset)
+    if limit:
+        query = query.limit(limit + 1)  # One extra row tells us whether another page exists
     
     tickets = query.all()
+    has_more = limit is not None and len(tickets) > limit
+    if has_more:
+        tickets = tickets[:limit]
+
+    # ---------------- PER SUB-TICKET MEDIA ----------------
+    if include_images:
+        media_summary = {
+            sub.sub_id: (
+                len(sub.images),
+                sub.images[0] if sub.images else None,
+                next((img for img in sub.images if img.latitude is not None and img.longitude is not None), None),
+            )
+            for ticket in tickets for sub in ticket.sub_tickets
+        }
+    else:
+        media_summary = _sub_ticket_media_summary(
+            db, [sub.sub_id for ticket in tickets for sub in ticket.sub_tickets]
+        )
     
     results = []
     for ticket in tickets:
-        # Get sub-tickets for this ticket
-        sub_tickets = db.query(SubTicket).filter(
-            SubTicket.ticket_id == ticket.ticket_id
-        ).all()
-        
-        # Filter by issue_type if provided
-        if issue_type:
-            sub_tickets = [st for st in sub_tickets if st.issue_type == issue_type]
-        
-        if issue_type and not sub_tickets:
-            continue  # Skip ticket if no matching sub-tickets
-        
-        # Get images for each sub-ticket
         ticket_data = {
             "ticket_id": ticket.ticket_id,
             "latitude": ticket.latitude,
@@ -571,51 +869,12 @@ async def get_tickets(
             "updated_at": ticket.updated_at.isoformat() if ticket.updated_at else None,
             "resolved_at": ticket.resolved_at.isoformat() if ticket.resolved_at else None,
             "user_id": ticket.user_id,
-            "user_name": db.query(User.name).filter(User.id == ticket.user_id).scalar() or "Anonymous" if ticket.user_id else "Anonymous",
+            "user_name": (ticket.user.name if ticket.user else None) or "Anonymous",
             "sub_tickets": []
         }
         
-        for sub_ticket in sub_tickets:
-            # Get all media for preview (image or video)
-            images = db.query(ComplaintImage).filter(
-                ComplaintImage.sub_id == sub_ticket.sub_id
-            ).all()
-
-            
-            # Get earliest image timestamp for this sub_ticket
-            earliest_image = db.query(ComplaintImage).filter(
-                ComplaintImage.sub_id == sub_ticket.sub_id
-            ).order_by(ComplaintImage.created_at.asc()).first()
-            
-            # Get GPS coordinates from first image with GPS in this sub_ticket
-            gps_image = db.query(ComplaintImage).filter(
-                ComplaintImage.sub_id == sub_ticket.sub_id,
-                ComplaintImage.latitude.isnot(None),
-                ComplaintImage.longitude.isnot(None)
-            ).first()
-            
-            # sub_ticket_data = {
-            #     "sub_id": sub_ticket.sub_id,
-            #     "issue_type": sub_ticket.issue_type,
-            #     "authority": sub_ticket.authority,
-            #     "status": sub_ticket.status,
-            #     "latitude": gps_image.latitude if gps_image else None,
-            #     "longitude": gps_image.longitude if gps_image else None,
-            #     "image_count": db.query(ComplaintImage).filter(
-            #         ComplaintImage.sub_id == sub_ticket.sub_id
-            #     ).count(),
-            #     "has_image": first_media is not None,
-            #     "image_id": first_media.id if first_media else None,
-            #     "media_type": first_media.media_type if first_media else None,
-            #     "confidence": first_media.confidence if first_media else None,
-            #     "created_at": sub_ticket.created_at.isoformat() if sub_ticket.created_at else (earliest_image.created_at.isoformat() if earliest_image else None),
-            #     "updated_at": sub_ticket.updated_at.isoformat() if sub_ticket.updated_at else None,
-            #     "resolved_at": sub_ticket.resolved_at.isoformat() if sub_ticket.resolved_at else None
-            # }
-            first_media = max(images, key=lambda x: x.confidence or 0) if images else None
-
-
-            first_media = images[0] if images else None
+        for sub_ticket in ticket.sub_tickets:
+            image_count, first_media, gps_image = media_summary.get(sub_ticket.sub_id, (0, None, None))
 
             sub_ticket_data = {
                 "id": sub_ticket.id,
@@ -632,46 +891,46 @@ async def get_tickets(
                 # 🔑 REQUIRED FOR PREVIEW
                 "has_image": first_media is not None,
                 "image_id": first_media.id if first_media else None,
+                "thumbnail_url": f"/api/complaints/images/{first_media.id}?size=thumb" if first_media else None,
                 "media_type": first_media.media_type if first_media else None,
 
                 # confidence (first image is fine)
                 "confidence": first_media.confidence if first_media else None,
 
                 # counts
-                "image_count": len(images),
+                "image_count": image_count,
 
-                # optional full list
-                "images": [
+                "created_at": sub_ticket.created_at.isoformat()
+                    if sub_ticket.created_at else None,
+            }
+
+            # optional full list
+            if include_images:
+                sub_ticket_data["images"] = [
                     {
                         "id": img.id,
                         "file_name": img.file_name,
                         "media_type": img.media_type,
                         "confidence": img.confidence,
+                        "thumbnail_url": f"/api/complaints/images/{img.id}?size=thumb",
                     }
-                    for img in images
-                ],
-
-                "created_at": sub_ticket.created_at.isoformat()
-                    if sub_ticket.created_at else None,
-            }
-
-
-
+                    for img in sub_ticket.images
+                ]
             
             ticket_data["sub_tickets"].append(sub_ticket_data)
         
-        if ticket_data["sub_tickets"]:  # Only add if has sub_tickets
-            results.append(ticket_data)
+        results.append(ticket_data)
     
     return {
         "status": "success",
         "count": len(results),
+        "next_cursor": tickets[-1].id if has_more else None,
         "tickets": results
     }
 
 
 @router.get("/geocode")
-async def geocode_location(
+def geocode_location(
     lat: float = Query(...),
     lon: float = Query(...)
 ):
@@ -692,7 +951,7 @@ async def geocode_location(
 # GET TICKET BY ID
 # ==================================================
 @router.get("/tickets/{ticket_id}")
-async def get_ticket_by_id(
+def get_ticket_by_id(
     ticket_id: str,
     db: Session = Depends(get_db)
 ):
@@ -773,7 +1032,7 @@ async def get_ticket_by_id(
 # UPDATE TICKET LOCATION
 # ==================================================
 @router.patch("/tickets/{ticket_id}/location")
-async def update_ticket_location(
+def update_ticket_location(
     ticket_id: str,
     latitude: float = Form(...),
     longitude: float = Form(...),
@@ -815,34 +1074,97 @@ async def update_ticket_location(
 # GET IMAGE BY ID
 # ==================================================
 @router.get("/images/{image_id}")
-async def get_image(
+def get_image(
     image_id: int,
+    request: Request,
+    size: str = Query("full", regex="^(thumb|medium|full)$", description="Rendition: thumb, medium or full"),
     db: Session = Depends(get_db)
 ):
     """
-    Get image data by ID
+    Get image data by ID, streamed from the media store.
+    Supports Range requests (video seeking), ETag / If-None-Match and
+    long-lived immutable caching, since an image id's bytes never change.
+
+    `size=thumb|medium` serves a WebP rendition instead of the full media
+    (videos get a poster frame). Missing renditions are rendered on first
+    request; if that fails the client is redirected (302, not cached) to
+    the full media, so the immutable rendition URL never caches the full file.
     """
-    from fastapi.responses import Response
-    
-    image = db.query(ComplaintImage).filter(ComplaintImage.id == image_id).first()
+    image = (
+        db.query(
+            ComplaintImage.storage_key, ComplaintImage.content_type, ComplaintImage.file_name,
+            ComplaintImage.thumb_key, ComplaintImage.medium_key
+        )
+        .filter(ComplaintImage.id == image_id)
+        .first()
+    )
     
     if not image:
         raise HTTPException(status_code=404, detail="Image not found")
-    
-    return Response(
-        content=image.image_data,
-        media_type=image.content_type,
-        headers={
-            "Content-Disposition": f'inline; filename="{image.file_name or "image"}"'
-        }
-    )
+
+    store = get_media_store()
+
+    if size != "full":
+        rendition_key = image.thumb_key if size == "thumb" else image.medium_key
+        if rendition_key is None:
+            try:
+                keys = generate_renditions(db, image_id) or {}
+            except Exception as e:
+                db.rollback()
+                print(f"Rendition generation failed for image {image_id}: {e}")
+                keys = {}
+            rendition_key = keys.get(size)
+        if rendition_key and store.exists(rendition_key):
+            stem = (image.file_name or f"image_{image_id}").rsplit(".", 1)[0]
+            return media_response(request, store, rendition_key, RENDITION_CONTENT_TYPE, f"{stem}_{size}.webp")
+        # No rendition (RENDITION_FAILED, or rendering failed just now): not cacheable under this URL
+        return RedirectResponse(
+            str(request.url.remove_query_params("size")), status_code=302, headers={"Cache-Control": "no-cache"}
+        )
+
+    # Legacy rows that still hold the blob inline (not yet migrated)
+    if image.storage_key is None:
+        image_data = db.query(ComplaintImage.image_data).filter(ComplaintImage.id == image_id).scalar()
+        return inline_media_response(request, image_data, image.content_type, image.file_name)
+
+    if not store.exists(image.storage_key):
+        raise HTTPException(status_code=404, detail="Image file missing from media store")
+
+    return media_response(request, store, image.storage_key, image.content_type, image.file_name)
+
+
+# Every ComplaintImage column that references a media store blob
+MEDIA_KEY_COLUMNS = (
+    ComplaintImage.storage_key,
+    ComplaintImage.original_key,
+    ComplaintImage.thumb_key,
+    ComplaintImage.medium_key,
+)
+
+
+def _release_media(db: Session, keys: set):
+    """Delete media store blobs that are no longer referenced by any ComplaintImage."""
+    if not keys:
+        return
+    columns = MEDIA_KEY_COLUMNS
+    still_used = {
+        key
+        for row in db.query(*columns).filter(or_(*(column.in_(keys) for column in columns)))
+        for key in row
+    }
+    store = get_media_store()
+    for key in keys - still_used:
+        try:
+            store.delete(key)
+        except Exception as e:
+            print(f"Failed to delete media {key}: {e}")
 
 
 # ==================================================
 # DELETE TICKET
 # ==================================================
 @router.delete("/tickets/{ticket_id}")
-async def delete_ticket(
+def delete_ticket(
     ticket_id: str,
     db: Session = Depends(get_db)
 ):
@@ -859,15 +1181,25 @@ async def delete_ticket(
     
     # Delete images
     if sub_ids:
-        # Get image file paths before deleting from DB
-        images = db.query(ComplaintImage).filter(ComplaintImage.sub_id.in_(sub_ids)).all()
-        # Optionally delete physical files here
+        # Get image ids and media keys before deleting from DB
+        image_rows = (
+            db.query(ComplaintImage.id, *MEDIA_KEY_COLUMNS)
+            .filter(ComplaintImage.sub_id.in_(sub_ids))
+            .all()
+        )
+        phash_index.discard([row.id for row in image_rows])
+        media_keys = {key for row in image_rows for key in row[1:] if key}
         
         db.query(ComplaintImage).filter(ComplaintImage.sub_id.in_(sub_ids)).delete(synchronize_session=False)
         db.query(SubTicket).filter(SubTicket.ticket_id == ticket_id).delete(synchronize_session=False)
+    else:
+        media_keys = set()
     
     db.delete(ticket)
     db.commit()
+
+    # Content-addressed blobs may be shared; only remove ones no other row references
+    _release_media(db, media_keys)
     
     return {"status": "success", "message": f"Ticket {ticket_id} and all related data deleted successfully"}
 
@@ -876,7 +1208,7 @@ async def delete_ticket(
 # UPDATE TICKET STATUS
 # ==================================================
 @router.patch("/tickets/{ticket_id}/status")
-async def update_ticket_status(
+def update_ticket_status(
     ticket_id: str,
     status: str = Form(...),
     db: Session = Depends(get_db)
@@ -8,20 +8,17 @@ from pathlib import Path
 from database import get_db
 from app_models import Ticket, SubTicket, ComplaintImage
 from crud import save_image
+from app_utils.executors import run_io
 
 router = APIRouter(prefix="/api/inspector", tags=["Inspector"])
 
-# Directories for storing media
-UPLOAD_DIR = Path("uploads")
-RESOLUTION_IMG_DIR = UPLOAD_DIR / "resolution" / "images"
-RESOLUTION_IMG_DIR.mkdir(parents=True, exist_ok=True)
-
 # --------------------------------------------------
 # GET ASSIGNED TICKETS (Inspector View)
 # --------------------------------------------------
 @router.get("/tickets")
-async def get_inspector_tickets(
+def get_inspector_tickets(
     inspector_id: Optional[int] = Query(None, description="ID of the inspector requesting their tickets"),
+    authority: Optional[str] = Query(None, description="Filter by authority (e.g. Garbage issues only)"),
     status: Optional[str] = Query(None, description="Filter by status (open, resolved, etc.)"),
     db: Session = Depends(get_db)
 ):
@@ -72,6 +69,7 @@ async def get_inspector_tickets(
             },
             "complaint_image": {
                 "url": f"/api/complaints/images/{complaint_image.id}" if complaint_image else None,
+                "thumbnail_url": f"/api/complaints/images/{complaint_image.id}?size=thumb" if complaint_image else None,
                 "id": complaint_image.id if complaint_image else None
             }
         })
@@ -100,6 +98,31 @@ async def resolve_sub_ticket(
     - Optionally uploads a 'Resolution Proof' image.
     - Optionally saves a resolution comment.
     """
+    # Validate and read the proof upload on the event loop; everything else is blocking
+    file_bytes = None
+    if file:
+        if not file.content_type.startswith("image/"):
+            raise HTTPException(status_code=400, detail="Only image files allowed for proof")
+        file_bytes = await file.read()
+
+    return await run_io(
+        _apply_resolution,
+        db, sub_id, status, comment, resolved_by,
+        file_bytes, file.filename if file else None, file.content_type if file else None
+    )
+
+
+def _apply_resolution(
+    db: Session,
+    sub_id: str,
+    status: str,
+    comment: Optional[str],
+    resolved_by: Optional[str],
+    file_bytes: Optional[bytes],
+    filename: Optional[str],
+    content_type: Optional[str]
+):
+    """Update the sub-ticket, store the proof image and roll status up to the parent (runs on the I/O pool)."""
     sub_ticket = db.query(SubTicket).filter(SubTicket.sub_id == sub_id).first()
     if not sub_ticket:
         raise HTTPException(status_code=404, detail="SubTicket not found")
@@ -118,28 +141,19 @@ async def resolve_sub_ticket(
 
     # Handle Proof Image Upload
     image_info = None
-    if file:
-        if not file.content_type.startswith("image/"):
-            raise HTTPException(status_code=400, detail="Only image files allowed for proof")
-        
-        file_bytes = await file.read()
+    if file_bytes is not None:
         unique_id = uuid.uuid4().hex[:8]
-        safe_name = f"resolution_{unique_id}_{file.filename}"
-        
-        # Save to resolution folder
-        save_path = RESOLUTION_IMG_DIR / safe_name
-        with open(save_path, "wb") as f:
-            f.write(file_bytes)
+        safe_name = f"resolution_{unique_id}_{filename}"
         
-        # Save to DB (using existing save_image crud, but we might want to mark it?)
+        # Save to DB (bytes go to the media store via save_image)
         # For now, we save it as a regular image linked to the sub-ticket.
-        # Ideally, we should add a 'type' field to ComplaintImage, but for now we'll rely on the folder or just date.
+        # Ideally, we should add a 'type' field to ComplaintImage, but for now we'll rely on the date.
         
         image = save_image(
             db=db,
             sub_id=sub_id,
             image_bytes=file_bytes, # Logic inside save_image handles binary, but we pass bytes here
-            content_type=file.content_type,
+            content_type=content_type,
             gps_extracted=False, # Usually resolution pics might need GPS, but keeping it simple
             media_type="image",
             file_name=safe_name,
@@ -1,20 +1,20 @@
-from fastapi import APIRouter, Response, Query
+from fastapi import APIRouter, Response, Query, Form, HTTPException, Header, WebSocket, WebSocketDisconnect
 from fastapi.responses import StreamingResponse
 import cv2
+import struct
 import threading
 import time
 import sys
 import logging
 import asyncio
-from collections import deque
 import json
 import os
 import uuid
 from pathlib import Path
+from typing import Optional
 
-from yolo_service import get_yolo_service
-from database import SessionLocal
-from crud import save_image
+from services.live_pipeline import CameraStream, LiveResult, camera_registry
+from services.event_bus import live_events
 
 logger = logging.getLogger("yolo-live")
 logger.setLevel(logging.INFO)
@@ -22,293 +22,407 @@ logger.setLevel(logging.INFO)
 camera_lock = threading.Lock()
 router = APIRouter(prefix="/api/yolo", tags=["YOLO Live Camera"])
 
-# Global state
-camera = None
-running = False
+# Camera used by the single-stream /live and /stop endpoints
+DEFAULT_CAMERA = "default"
+DEFAULT_SOURCE = os.getenv("LIVE_DEFAULT_SOURCE", "0")
 
-# ✅ Live camera location
-live_location = {
-    "latitude": None,
-    "longitude": None
-}
+# Seconds between "Monitoring..." status logs per camera
+STATUS_LOG_INTERVAL = 2.0
 
-# Global log buffer for SSE
-log_buffer = deque(maxlen=50)
-log_cond = threading.Condition()
+# Seconds between SSE heartbeats on an idle connection
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+
+# WebSocket frame message: header, n detections, then the JPEG bytes
+#   header:    version (u8), frame_id (u32), timestamp (f64), n (u16)
+#   detection: x1, y1, x2, y2, confidence, class index, track_id (-1 if none) as float32
+WS_PROTOCOL_VERSION = 1
+WS_HEADER = struct.Struct("<BIdH")
+WS_DETECTION = struct.Struct("<7f")
 
 # Temp storage for captured live frames
 LIVE_CAPTURE_DIR = Path("uploads/results/live")
 LIVE_CAPTURE_DIR.mkdir(parents=True, exist_ok=True)
 
 def log_terminal(message: str, data: dict = None):
-    """Prints to terminal and adds to SSE buffer."""
+    """Prints to terminal and publishes to SSE clients (safe from any thread)."""
     # Always print to server terminal for debugging
     print(f"DEBUG: {message}")
     sys.stdout.flush()
-    
-    with log_cond:
-        log_entry = {"message": message, "time": time.time()}
-        if data:
-            log_entry.update(data)
-        log_buffer.append(log_entry)
-        # We don't really use notify since we poll in sse_logs, but it's good practice
-        log_cond.notify_all()
+
+    log_entry = {"message": message, "time": time.time()}
+    if data:
+        log_entry.update(data)
+    live_events.publish(log_entry)
 
 
 from app_utils.constants import AUTHORITY_MAP
 
-def generate_frames():
-    global running, camera
+def _is_valid_detection(det: dict) -> bool:
+    """Only classes that map to an authority count as deviations"""
+    # Normalize class name to match AUTHORITY_MAP keys
+    norm_class = det["class_name"].lower().replace(" ", "").replace("_", "").replace("-", "")
+
+    # Handle common mappings manually if needed (though service.py does some)
+    if norm_class in ["pothole"]: norm_class = "pathholes"
+    if norm_class in ["streetdebris"]: norm_class = "streetdebris"
+
+    return norm_class in AUTHORITY_MAP
+
+
+def _handle_live_result(live: CameraStream, result: LiveResult) -> bool:
+    """
+    Runs on the shared inference thread for every inferred frame of a camera.
+    Returns True (stop that camera after this frame) when a deviation is found.
+    """
+    camera_data = {"camera": live.name, "session_id": live.session_id}
+    # ----------------------------
+    # 🔥 DETAILED LOGGING & AUTO-STOP
+    # ----------------------------
+    valid_detections = [det for det in (result.detections or []) if _is_valid_detection(det)]
+
+    if not valid_detections:
+        # Log status every ~2 seconds if nothing found to show it's alive
+        now = time.time()
+        if now - live.last_status_at >= STATUS_LOG_INTERVAL:
+            live.last_status_at = now
+            log_terminal(
+                f"[{live.name}] Monitoring... (No deviations found) | FPS: {live.stats['fps']:.2f} "
+                f"| Skipped frames: {live.stats['dropped']} | Static frames skipped: {live.skip_ratio:.0%}",
+                data={**camera_data, "skip_ratio": round(live.skip_ratio, 3), "stats": dict(live.stats)}
+            )
+        return False
 
-    yolo = get_yolo_service()
-    frame_id = 0
-    prev_time = time.time()
-    
-    # 🔵 Initial log to indicate detection engine is starting
-    log_terminal("🚀 Started Detection ...")
+    # ✅ USE LOCATION (per camera)
+    lat = live.location["latitude"]
+    lon = live.location["longitude"]
 
-    while True:
-        try:
-            with camera_lock:
-                if not running:
-                    break
-                if camera is None or not camera.isOpened():
-                    break
-                success, frame = camera.read()
-
-            if not success:
-                time.sleep(0.01)
-                continue
+    det_names = [f"{d['class_name']} #{d['track_id']}" if "track_id" in d else d["class_name"] for d in valid_detections]
+    log_terminal(
+        f"⚠️ [{live.name}] Deviation Detected ({', '.join(det_names)})! Saving frame and stopping camera...",
+        data={"latitude": lat, "longitude": lon, **camera_data}
+    )
 
-            frame_id += 1
-
-            # ----------------------------
-            # YOLO DETECTION PER FRAME
-            # ----------------------------
-            detections, annotated = yolo.detect_image(frame)
-
-            now = time.time()
-            fps = 1 / (now - prev_time) if (now - prev_time) > 0 else 0
-            prev_time = now
-
-            # ----------------------------
-            # 🔥 DETAILED LOGGING & AUTO-STOP
-            # ----------------------------
-            
-            # Check for VALID detections (must be in AUTHORITY_MAP)
-            valid_detections = []
-            if detections:
-                for det in detections:
-                    # Normalize class name to match AUTHORITY_MAP keys
-                    norm_class = det["class_name"].lower().replace(" ", "").replace("_", "").replace("-", "")
-                    
-                    # Handle common mappings manually if needed (though service.py does some)
-                    if norm_class in ["pothole"]: norm_class = "pathholes"
-                    if norm_class in ["streetdebris"]: norm_class = "streetdebris"
-                    
-                    if norm_class in AUTHORITY_MAP:
-                        valid_detections.append(det)
-
-            if valid_detections:
-                # ✅ USE LOCATION
-                lat = live_location["latitude"]
-                lon = live_location["longitude"]
-                
-                det_names = [d["class_name"] for d in valid_detections]
-                log_terminal(
-                    f"⚠️ Deviation Detected ({', '.join(det_names)})! Saving frame and stopping camera...",
-                    data={"latitude": lat, "longitude": lon}
-                )
-                
-                # Stop the camera and vision thread immediately
-                with camera_lock:
-                    running = False
-                    if camera:
-                        camera.release()
-                        camera = None
-                
-                # Encode and log the final frame
-                ret, buffer = cv2.imencode(".jpg", annotated)
-                if ret:
-                    frame_stream = buffer.tobytes()
-                    
-                    # Yield the final frame
-                    yield (
-                        b"--frame\r\n"
-                        b"Content-Type: image/jpeg\r\n\r\n" +
-                        frame_stream +
-                        b"\r\n"
-                    )
-                
-                # Save to database (optional but recommended since the user said "save image")
-                # We'll at least notify the frontend that a capture is ready
-                unique_id = uuid.uuid4().hex[:8]
-                filename = f"live_capture_{unique_id}.png"
-                filepath = LIVE_CAPTURE_DIR / filename
-                
-                # IMPORTANT: Save CLEAN frame for re-analysis, not annotated
-                # Use PNG to avoid compression artifacts lowering confidence on re-check
-                cv2.imwrite(str(filepath), frame)
-                
-                # ----------------------------
-                # 💾 SAVE TO DATABASE - DISABLED (Let Frontend Handle Registration)
-                # ----------------------------
-                # We disable auto-save here to prevent duplicates when the user clicks "Register Complaint"
-                # The "Proceed to Analysis" flow will handle the actual ticket creation using the captured frame.
-                """
-                try:
-                    from services.complaint_service import create_complaint_workflow
-                    
-                    with SessionLocal() as db:
-                        primary_det = valid_detections[0]
-                        issue_type = primary_det["class_name"]
-                        confidence = primary_det["confidence"]
-
-                        result = create_complaint_workflow(
-                            db=db,
-                            lat=lat,
-                            lon=lon,
-                            issue_type=issue_type,
-                            image_bytes=buffer.tobytes(),
-                            content_type="image/jpeg",
-                            media_type="live_capture",
-                            file_name=filename,
-                            check_duplicates=False, # Live capture might be spammy, but we want to capture deviations. Maybe True? User said "save image".
-                            authority_map=AUTHORITY_MAP
-                        )
-                        
-                        if result["status"] == "success":
-                            ticket = result["ticket"]
-                            sub = result["sub_ticket"]
-                            log_terminal(f"💾 Saved to DB: Ticket {ticket.ticket_id} | Sub {sub.sub_id}")
-                        else:
-                            log_terminal(f"⚠️ Not saved: {result.get('message')}")
-
-                except Exception as e:
-                    log_terminal(f"❌ Database Error: {e}")
-                """
-
-
-                log_terminal(
-                    f"✅ Frame saved successfully as {filename}",
-                    data={
-                        "capture_filename": filename,
-                        "latitude": lat,
-                        "longitude": lon
-                    }
-                )
-                log_terminal("🛑 Detection stopped.")
-                break
-            else:
-                # Log status every 2 seconds if nothing found to show it's alive
-                if frame_id % 60 == 0:
-                    log_terminal(f"Monitoring... (No deviations found) | FPS: {fps:.2f}")
+    # We'll at least notify the frontend that a capture is ready
+    unique_id = uuid.uuid4().hex[:8]
+    filename = f"live_capture_{unique_id}.png"
+    filepath = LIVE_CAPTURE_DIR / filename
 
-            ret, buffer = cv2.imencode(".jpg", annotated)
-            if not ret:
-                continue
-            frame_stream = buffer.tobytes()
+    # IMPORTANT: Save CLEAN frame for re-analysis, not annotated
+    # Use PNG to avoid compression artifacts lowering confidence on re-check
+    cv2.imwrite(str(filepath), result.frame)
+
+    # ----------------------------
+    # 💾 SAVE TO DATABASE - DISABLED (Let Frontend Handle Registration)
+    # ----------------------------
+    # We disable auto-save here to prevent duplicates when the user clicks "Register Complaint"
+    # The "Proceed to Analysis" flow will handle the actual ticket creation using the captured frame.
+
+    log_terminal(
+        f"✅ Frame saved successfully as {filename}",
+        data={
+            "capture_filename": filename,
+            "latitude": lat,
+            "longitude": lon,
+            **camera_data
+        }
+    )
+    log_terminal(f"🛑 [{live.name}] Detection stopped.", data=camera_data)
+    # The annotated deviation frame is still encoded and sent as the final frame
+    return True
 
-            yield (
-                b"--frame\r\n"
-                b"Content-Type: image/jpeg\r\n\r\n" +
-                frame_stream +
-                b"\r\n"
+
+def _log_controller_change(state: dict):
+    """Publish adaptive controller decisions on the events stream"""
+    log_terminal(f"⚙️ Adaptive tuning: {', '.join(state['changes'])}", data={"controller": state})
+
+
+if camera_registry.controller is not None:
+    camera_registry.controller.on_change = _log_controller_change
+
+
+def _start_camera(name: str, source, latitude: Optional[float], longitude: Optional[float]) -> CameraStream:
+    """Start (or reuse the running) camera `name`. Raises HTTPException if it cannot be started."""
+    with camera_lock:
+        stream = camera_registry.get(name)
+        if stream is not None and stream.running:
+            return stream
+
+        # Clear old logs when the first stream of a fresh session starts
+        if not camera_registry.any_running():
+            live_events.clear_history()
+
+        try:
+            stream = camera_registry.add(
+                name, source,
+                latitude=latitude, longitude=longitude,
+                on_result=_handle_live_result
             )
-            
-            # Tiny sleep to allow thread switching
-            time.sleep(0.001)
-            
-        except Exception as e:
-            log_terminal(f"Error in Vision Thread: {str(e)}")
-            time.sleep(0.1)
-            continue
+        except ValueError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        if stream is None:
+            raise HTTPException(status_code=500, detail=f"Unable to open video source {source!r}")
+
+    # 🔵 Initial log to indicate detection engine is starting
+    log_terminal(
+        f"🚀 Started Detection ... [{name}]",
+        data={"camera": name, "session_id": stream.session_id}
+    )
+    log_terminal(
+        "🔵 Camera Stream Activated",
+        data={"latitude": latitude, "longitude": longitude, "camera": name, "session_id": stream.session_id}
+    )
+    return stream
+
+
+def _stop_camera(name: str) -> bool:
+    with camera_lock:
+        stream = camera_registry.remove(name)
+    if stream is None:
+        return False
+    log_terminal(f"🔴 Camera Stream Deactivated [{name}]", data={"camera": name, "session_id": stream.session_id})
+    return True
 
 
 @router.get("/live")
-async def start_live(
+def start_live(
     latitude: float = Query(None),
     longitude: float = Query(None)
 ):
-    global camera, running, live_location
+    """Single-camera stream on the default source (kept for the existing frontend)."""
+    try:
+        stream = _start_camera(DEFAULT_CAMERA, DEFAULT_SOURCE, latitude, longitude)
+    except HTTPException:
+        return Response("Unable to open webcam", status_code=500)
 
-    with camera_lock:
-        if not running:
-            # Clear old logs when starting a fresh stream
-            with log_cond:
-                log_buffer.clear()
-            
-            running = True
-            camera = cv2.VideoCapture(0)
-            if not camera.isOpened():
-                running = False
-                return Response("Unable to open webcam", status_code=500)
-
-            # ✅ STORE LOCATION
-            live_location["latitude"] = latitude
-            live_location["longitude"] = longitude
+    return StreamingResponse(stream.mjpeg(),
+                             media_type="multipart/x-mixed-replace; boundary=frame")
 
-    log_terminal(
-        "🔵 Camera Stream Activated",
-        data={"latitude": latitude, "longitude": longitude}
-    )
-    return StreamingResponse(generate_frames(),
+
+# ==================================================
+# MULTI-CAMERA
+# ==================================================
+@router.post("/cameras")
+def add_camera(
+    name: str = Form(..., description="Unique camera name"),
+    source: str = Form(..., description="Device index (e.g. 0), RTSP/HTTP URL, or video file path"),
+    latitude: Optional[float] = Form(None),
+    longitude: Optional[float] = Form(None)
+):
+    """Register and start a named camera. All running cameras share one batched inference pass per tick."""
+    stream = _start_camera(name, source, latitude, longitude)
+    return {"status": "success", "camera": stream.info()}
+
+
+@router.get("/cameras")
+def list_cameras():
+    """All registered cameras with their stats, plus shared batch statistics."""
+    return {
+        "status": "success",
+        "cameras": [stream.info() for stream in camera_registry.streams()],
+        "inference": dict(camera_registry.batch_stats),
+        "controller": camera_registry.controller.snapshot() if camera_registry.controller else None,
+    }
+
+
+@router.get("/cameras/{name}/live")
+def camera_live(name: str):
+    """MJPEG stream of one camera's annotated frames."""
+    stream = camera_registry.get(name)
+    if stream is None:
+        raise HTTPException(status_code=404, detail=f"Camera '{name}' not found")
+    return StreamingResponse(stream.mjpeg(),
                              media_type="multipart/x-mixed-replace; boundary=frame")
 
 
+@router.delete("/cameras/{name}")
+def remove_camera(name: str):
+    if not _stop_camera(name):
+        raise HTTPException(status_code=404, detail=f"Camera '{name}' not found")
+    return {"status": "camera stopped", "camera": name}
+
+
+# ==================================================
+# WEBSOCKET (frames + detections + logs on one connection)
+# ==================================================
+def _pack_frame(frame, class_index: dict) -> bytes:
+    """Binary frame message; class names are mapped through the connection's class_index"""
+    parts = [WS_HEADER.pack(WS_PROTOCOL_VERSION, frame.frame_id & 0xFFFFFFFF, frame.timestamp, len(frame.detections))]
+    for det in frame.detections:
+        bbox = det["bbox"]
+        track_id = det.get("track_id")
+        parts.append(WS_DETECTION.pack(
+            bbox["x1"], bbox["y1"], bbox["x2"], bbox["y2"], det["confidence"],
+            class_index[det["class_name"]], track_id if track_id is not None else -1
+        ))
+    parts.append(frame.jpeg)
+    return b"".join(parts)
+
+
+def _ws_number(value, low: float, high: float) -> float:
+    """Numeric control value within [low, high]; ValueError otherwise"""
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not low <= value <= high:
+        raise ValueError(value)
+    return float(value)
+
+
+@router.websocket("/ws/{name}")
+async def camera_ws(websocket: WebSocket, name: str):
+    """
+    Annotated frames of one camera with the detections drawn on them.
+
+    Server -> client:
+      binary: one frame (see WS_HEADER / WS_DETECTION)
+      text:   JSON - {"type": "hello"}, {"type": "classes"} (class index -> name,
+              sent before the first frame that uses a new class), {"type": "event"}
+              (the /events log entries of this camera), {"type": "ack"}, {"type": "error"}
+    Client -> server (JSON text):
+      {"action": "pause"} / {"action": "resume"}      this connection only
+      {"action": "set_location", "latitude": .., "longitude": ..}
+      {"action": "set_thresholds", "conf": 0.4}       per camera (null resets)
+      {"action": "keyframe"}                           force inference on the next frame
+    A slow client only ever loses frames (drop-oldest queue); it never delays the camera.
+    """
+    await websocket.accept()
+    stream = camera_registry.get(name)
+    if stream is None:
+        await websocket.send_json({"type": "error", "detail": f"Camera '{name}' not found"})
+        await websocket.close(code=4404)
+        return
+
+    sub = stream.jpegs.subscribe_async()
+    events, _ = live_events.subscribe()
+    paused = asyncio.Event()
+    class_index = {}
+
+    await websocket.send_json({"type": "hello", "version": WS_PROTOCOL_VERSION, "camera": stream.info()})
+
+    async def send_frames():
+        while True:
+            frame = await sub.get()
+            if frame is None:
+                return
+            if paused.is_set():
+                continue
+            new_names = [d["class_name"] for d in frame.detections if d["class_name"] not in class_index]
+            if new_names:
+                for class_name in new_names:
+                    class_index.setdefault(class_name, len(class_index))
+                await websocket.send_json({"type": "classes", "classes": {i: n for n, i in class_index.items()}})
+            await websocket.send_bytes(_pack_frame(frame, class_index))
+
+    async def send_events():
+        while True:
+            _, event = await events.get()
+            if event.get("camera", name) == name:
+                await websocket.send_json({"type": "event", **event})
+
+    async def receive_controls():
+        while True:
+            try:
+                message = json.loads(await websocket.receive_text())
+                action = message.get("action")
+            except (ValueError, AttributeError):
+                await websocket.send_json({"type": "error", "detail": "Expected a JSON object"})
+                continue
+
+            if action == "pause":
+                paused.set()
+            elif action == "resume":
+                paused.clear()
+            elif action == "set_location":
+                try:
+                    location = {
+                        "latitude": _ws_number(message.get("latitude"), -90, 90),
+                        "longitude": _ws_number(message.get("longitude"), -180, 180),
+                    }
+                except ValueError:
+                    await websocket.send_json({"type": "error", "detail": "latitude / longitude must be valid coordinates"})
+                    continue
+                stream.location = location
+            elif action == "set_thresholds":
+                # NMS IoU is fixed by the shared batched pass; only confidence is per camera
+                conf = message.get("conf")
+                try:
+                    stream.conf_threshold = _ws_number(conf, 0, 1) if conf is not None else None
+                except ValueError:
+                    await websocket.send_json({"type": "error", "detail": "conf must be a number between 0 and 1"})
+                    continue
+            elif action == "keyframe":
+                if stream.gate is not None:
+                    stream.gate.request_keyframe()
+            else:
+                await websocket.send_json({"type": "error", "detail": f"Unknown action {action!r}"})
+                continue
+            await websocket.send_json({"type": "ack", "action": action})
+
+    tasks = [asyncio.create_task(coro) for coro in (send_frames(), send_events(), receive_controls())]
+    try:
+        # Ends when the camera stops (send_frames returns) or the client goes away
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task.exception() and not isinstance(task.exception(), WebSocketDisconnect):
+                print(f"❌ WebSocket [{name}] error: {task.exception()}")
+    finally:
+        for task in tasks:
+            task.cancel()
+        sub.close()
+        live_events.unsubscribe(events)
+    try:
+        await websocket.close()
+    except RuntimeError:
+        pass  # already closed by the client
+
+
+def _sse_event(seq: int, event: dict) -> str:
+    return f"id: {seq}\ndata: {json.dumps(event)}\n\n"
+
+
 @router.get("/events")
-async def sse_logs():
-    """Stream detection logs to frontend via SSE."""
+async def sse_logs(last_event_id: Optional[str] = Header(None)):
+    """
+    Stream detection logs to frontend via SSE.
+    Each event carries an `id:`; browsers reconnect with Last-Event-ID and
+    receive only the retained events they missed.
+    """
+    try:
+        resume_from = int(last_event_id) if last_event_id else None
+    except ValueError:
+        resume_from = None
+
     async def event_generator():
-        # Start by sending any existing logs in the buffer (history)
-        with log_cond:
-            initial_logs = list(log_buffer)
-            for log in initial_logs:
-                yield f"data: {json.dumps(log)}\n\n"
-        
-        last_log_time = time.time()
-        heartbeat_count = 0
-        
-        while True:
-            new_logs = []
-            with log_cond:
-                new_logs = [l for l in log_buffer if l["time"] > last_log_time]
-            
-            if new_logs:
-                for log in new_logs:
-                    yield f"data: {json.dumps(log)}\n\n"
-                last_log_time = new_logs[-1]["time"]
-            
-            # Send a heartbeat every 5 seconds to keep connection alive
-            heartbeat_count += 1
-            if heartbeat_count % 50 == 0:
-                yield f"data: {json.dumps({'message': 'HEARTBEAT', 'time': time.time(), 'heartbeat': True})}\n\n"
-            
-            await asyncio.sleep(0.1)
+        queue, backlog = live_events.subscribe(resume_from)
+        try:
+            # History (or what was missed while disconnected)
+            for seq, event in backlog:
+                yield _sse_event(seq, event)
+
+            while True:
+                try:
+                    seq, event = await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    # Heartbeat keeps proxies from closing an idle connection
+                    yield f"data: {json.dumps({'message': 'HEARTBEAT', 'time': time.time(), 'heartbeat': True})}\n\n"
+                    continue
+                yield _sse_event(seq, event)
+        finally:
+            live_events.unsubscribe(queue)
 
     return StreamingResponse(event_generator(), media_type="text/event-stream")
 
 
 @router.get("/stop")
-async def stop_camera():
-    global camera, running
-
-    with camera_lock:
-        running = False
-        if camera:
-            try:
-                camera.release()
-            except:
-                pass
-            camera = None
-
-    # ✅ CLEAR LOCATION
-    live_location["latitude"] = None
-    live_location["longitude"] = None
-
-    # Clear logs when stopped so they don't persist to the next session
-    with log_cond:
-        log_buffer.clear()
+def stop_camera(
+    camera: Optional[str] = Query(None, description="Camera to stop (default: all cameras)")
+):
+    if camera:
+        _stop_camera(camera)
+    else:
+        for stream in camera_registry.streams():
+            _stop_camera(stream.name)
+
+    # Clear logs when everything is stopped so they don't persist to the next session
+    if not camera_registry.any_running():
+        live_events.clear_history()
 
     log_terminal("🔴 Camera Stream Deactivated")
     return {"status": "camera stopped"}
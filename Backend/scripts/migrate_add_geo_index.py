@@ -0,0 +1,59 @@
+"""
+Database Migration Script
+Adds a composite (latitude, longitude) index to complaint_images so that
+duplicate detection can use a bounding-box range scan instead of a full
+table scan.
+"""
+from sqlalchemy import text
+from database import engine
+import sys
+
+
+def migrate():
+    """Run migration to add the lat/lon composite index"""
+    print("Starting migration: Adding lat/lon index to complaint_images...")
+    
+    try:
+        with engine.connect() as conn:
+            # Start transaction
+            trans = conn.begin()
+            
+            try:
+                if engine.url.drivername.startswith('mysql'):
+                    # MySQL has no CREATE INDEX IF NOT EXISTS: check the catalog first
+                    result = conn.execute(text("""
+                        SELECT COUNT(*) FROM information_schema.statistics
+                        WHERE table_schema = DATABASE() AND table_name = 'complaint_images'
+                        AND index_name = 'idx_complaint_images_lat_lon'
+                    """))
+                    if result.scalar() == 0:
+                        conn.execute(text("""
+                            CREATE INDEX idx_complaint_images_lat_lon
+                            ON complaint_images(latitude, longitude)
+                        """))
+                        print("[OK] Index created")
+                    else:
+                        print("[OK] Index already exists")
+                else:
+                    # SQLite and PostgreSQL accept IF NOT EXISTS
+                    conn.execute(text("""
+                        CREATE INDEX IF NOT EXISTS idx_complaint_images_lat_lon
+                        ON complaint_images(latitude, longitude)
+                    """))
+                    print("[OK] Index created")
+                
+                # Commit transaction
+                trans.commit()
+                print("\n[SUCCESS] Migration completed successfully!")
+                
+            except Exception as e:
+                trans.rollback()
+                raise e
+                
+    except Exception as e:
+        print(f"\n[ERROR] Migration failed: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,86 @@
+"""
+Database Migration Script
+Adds image_phash (BIGINT) to complaint_images and backfills it from the
+hex image_hash column, so near-duplicate filtering can run as
+popcount(xor) inside the database. MD5 fallback hashes stay NULL.
+"""
+from sqlalchemy import text
+from database import engine
+from app_utils.image_hash import phash_to_int
+import sys
+
+BATCH_SIZE = 1000
+
+
+def migrate():
+    """Run migration to add and backfill the integer perceptual hash"""
+    print("Starting migration: Adding image_phash to complaint_images...")
+    
+    try:
+        with engine.connect() as conn:
+            # Start transaction
+            trans = conn.begin()
+            
+            try:
+                # Check if column already exists
+                if engine.url.drivername == 'sqlite':
+                    result = conn.execute(text("""
+                        SELECT COUNT(*) FROM pragma_table_info('complaint_images') 
+                        WHERE name = 'image_phash'
+                    """))
+                else:
+                    result = conn.execute(text("""
+                        SELECT COUNT(*) FROM information_schema.columns 
+                        WHERE table_name = 'complaint_images' AND column_name = 'image_phash'
+                    """))
+                existing = result.scalar() > 0
+                
+                if not existing:
+                    print("Adding image_phash column (BIGINT)...")
+                    conn.execute(text("ALTER TABLE complaint_images ADD COLUMN image_phash BIGINT"))
+                    print("[OK] Column added")
+                else:
+                    print("[OK] Column already exists")
+                
+                # Backfill in batches, keyed on id so progress survives re-runs
+                print("Backfilling image_phash from image_hash...")
+                last_id = 0
+                updated = 0
+                while True:
+                    rows = conn.execute(text("""
+                        SELECT id, image_hash FROM complaint_images
+                        WHERE id > :last_id AND image_phash IS NULL AND image_hash IS NOT NULL
+                        ORDER BY id LIMIT :limit
+                    """), {"last_id": last_id, "limit": BATCH_SIZE}).fetchall()
+                    if not rows:
+                        break
+                    
+                    params = [
+                        {"id": row_id, "phash": phash_to_int(image_hash)}
+                        for row_id, image_hash in rows
+                        if phash_to_int(image_hash) is not None
+                    ]
+                    if params:
+                        conn.execute(
+                            text("UPDATE complaint_images SET image_phash = :phash WHERE id = :id"),
+                            params
+                        )
+                    updated += len(params)
+                    last_id = rows[-1][0]
+                print(f"[OK] Backfilled {updated} row(s)")
+                
+                # Commit transaction
+                trans.commit()
+                print("\n[SUCCESS] Migration completed successfully!")
+                
+            except Exception as e:
+                trans.rollback()
+                raise e
+                
+    except Exception as e:
+        print(f"\n[ERROR] Migration failed: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    migrate()
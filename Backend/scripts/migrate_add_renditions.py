@@ -0,0 +1,91 @@
+"""
+Database Migration Script
+Adds thumb_key / medium_key to complaint_images and renders the WebP
+renditions for existing media, so list views can load thumbnails instead
+of full-size images. Rows that fail to render are marked RENDITION_FAILED
+(an empty key) and get_image redirects their thumb / medium requests to the
+full media.
+"""
+from sqlalchemy import text
+from database import engine, SessionLocal
+from app_utils.renditions import generate_renditions
+import sys
+
+BATCH_SIZE = 200
+COLUMNS = ("thumb_key", "medium_key")
+
+
+def migrate():
+    """Run migration to add rendition keys and backfill renditions"""
+    print("Starting migration: Adding thumb_key / medium_key to complaint_images...")
+
+    try:
+        with engine.connect() as conn:
+            # Start transaction
+            trans = conn.begin()
+
+            try:
+                for column in COLUMNS:
+                    # Check if column already exists
+                    if engine.url.drivername == 'sqlite':
+                        result = conn.execute(text("""
+                            SELECT COUNT(*) FROM pragma_table_info('complaint_images')
+                            WHERE name = :column
+                        """), {"column": column})
+                    else:
+                        result = conn.execute(text("""
+                            SELECT COUNT(*) FROM information_schema.columns
+                            WHERE table_name = 'complaint_images' AND column_name = :column
+                        """), {"column": column})
+
+                    if result.scalar() == 0:
+                        print(f"Adding {column} column...")
+                        conn.execute(text(f"ALTER TABLE complaint_images ADD COLUMN {column} VARCHAR(64)"))
+                        print("[OK] Column added")
+                    else:
+                        print(f"[OK] {column} already exists")
+
+                # Commit transaction
+                trans.commit()
+
+            except Exception as e:
+                trans.rollback()
+                raise e
+
+        # Render in batches, keyed on id so progress survives re-runs
+        print("Rendering thumbnails for existing media...")
+        last_id = 0
+        rendered = failed = 0
+        with SessionLocal() as db:
+            while True:
+                ids = [row[0] for row in db.execute(text("""
+                    SELECT id FROM complaint_images
+                    WHERE id > :last_id AND thumb_key IS NULL
+                    ORDER BY id LIMIT :limit
+                """), {"last_id": last_id, "limit": BATCH_SIZE})]
+                if not ids:
+                    break
+
+                for image_id in ids:
+                    try:
+                        if generate_renditions(db, image_id):
+                            rendered += 1
+                        else:
+                            failed += 1
+                    except Exception as e:
+                        db.rollback()
+                        failed += 1
+                        print(f"[WARN] Image {image_id}: {e}")
+                last_id = ids[-1]
+                print(f"  ... {rendered} rendered")
+
+        print(f"[OK] Rendered {rendered} image(s), {failed} skipped")
+        print("\n[SUCCESS] Migration completed successfully!")
+
+    except Exception as e:
+        print(f"\n[ERROR] Migration failed: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    migrate()
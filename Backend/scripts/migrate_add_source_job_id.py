@@ -0,0 +1,56 @@
+"""
+Database Migration Script
+Adds tickets.source_job_id (the video analysis job that created a ticket),
+so a job completed again after a failure reuses its ticket instead of
+creating duplicates.
+"""
+from sqlalchemy import text
+from database import engine
+import sys
+
+
+def migrate():
+    """Run migration to add tickets.source_job_id and its index"""
+    print("Starting migration: Adding source_job_id to tickets...")
+
+    try:
+        with engine.connect() as conn:
+            # Start transaction
+            trans = conn.begin()
+
+            try:
+                # Check if column already exists
+                if engine.url.drivername == 'sqlite':
+                    result = conn.execute(text("""
+                        SELECT COUNT(*) FROM pragma_table_info('tickets')
+                        WHERE name = 'source_job_id'
+                    """))
+                else:
+                    result = conn.execute(text("""
+                        SELECT COUNT(*) FROM information_schema.columns
+                        WHERE table_name = 'tickets' AND column_name = 'source_job_id'
+                    """))
+
+                if result.scalar() == 0:
+                    print("Adding source_job_id column...")
+                    conn.execute(text("ALTER TABLE tickets ADD COLUMN source_job_id VARCHAR(32)"))
+                    conn.execute(text("CREATE INDEX ix_tickets_source_job_id ON tickets(source_job_id)"))
+                    print("[OK] Column and index added")
+                else:
+                    print("[OK] source_job_id already exists")
+
+                # Commit transaction
+                trans.commit()
+                print("\n[SUCCESS] Migration completed successfully!")
+
+            except Exception as e:
+                trans.rollback()
+                raise e
+
+    except Exception as e:
+        print(f"\n[ERROR] Migration failed: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    migrate()
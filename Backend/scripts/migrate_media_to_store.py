@@ -0,0 +1,130 @@
+"""
+Database Migration Script
+Moves complaint media out of the database into the content-addressed
+media store (see app_utils/media_store.py):
+- Adds storage_key, original_key and size_bytes to complaint_images
+- Makes image_data nullable (SQLite needs a table rebuild for this)
+- Writes every inline blob to the store, records its key and size,
+  and clears image_data
+
+Safe to re-run: rows that already have a storage_key are skipped.
+"""
+from sqlalchemy import text
+from database import engine
+from app_models import ComplaintImage
+from app_utils.media_store import get_media_store
+import sys
+
+BATCH_SIZE = 100
+
+NEW_COLUMNS = {
+    "storage_key": "VARCHAR(64)",
+    "original_key": "VARCHAR(64)",
+    "size_bytes": "BIGINT",
+}
+
+
+def _sqlite_columns(conn, table):
+    return {row[1]: row for row in conn.execute(text(f"PRAGMA table_info('{table}')"))}
+
+
+def _migrate_schema_sqlite(conn):
+    columns = _sqlite_columns(conn, "complaint_images")
+    image_data_not_null = bool(columns.get("image_data") and columns["image_data"][3])
+
+    if not image_data_not_null:
+        for name, sql_type in NEW_COLUMNS.items():
+            if name not in columns:
+                conn.execute(text(f"ALTER TABLE complaint_images ADD COLUMN {name} {sql_type}"))
+        print("[OK] Columns checked/added")
+        return
+
+    # SQLite cannot drop NOT NULL in place: rebuild the table from the current model
+    print("Rebuilding complaint_images to make image_data nullable...")
+    conn.execute(text("ALTER TABLE complaint_images RENAME TO complaint_images_old"))
+    for (index_name,) in conn.execute(text(
+        "SELECT name FROM sqlite_master WHERE type = 'index' "
+        "AND tbl_name = 'complaint_images_old' AND sql IS NOT NULL"
+    )).fetchall():
+        conn.execute(text(f'DROP INDEX "{index_name}"'))
+
+    ComplaintImage.__table__.create(conn)
+
+    new_columns = _sqlite_columns(conn, "complaint_images")
+    shared = ", ".join(name for name in columns if name in new_columns)
+    conn.execute(text(f"INSERT INTO complaint_images ({shared}) SELECT {shared} FROM complaint_images_old"))
+    conn.execute(text("DROP TABLE complaint_images_old"))
+    print("[OK] Table rebuilt")
+
+
+def _migrate_schema_postgres(conn):
+    for name, sql_type in NEW_COLUMNS.items():
+        conn.execute(text(f"ALTER TABLE complaint_images ADD COLUMN IF NOT EXISTS {name} {sql_type}"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_complaint_images_storage_key ON complaint_images(storage_key)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_complaint_images_original_key ON complaint_images(original_key)"))
+    conn.execute(text("ALTER TABLE complaint_images ALTER COLUMN image_data DROP NOT NULL"))
+    print("[OK] Columns checked/added, image_data nullable")
+
+
+def _move_blobs(conn):
+    store = get_media_store()
+    moved = 0
+    last_id = 0
+    while True:
+        rows = conn.execute(text("""
+            SELECT id, image_data, content_type FROM complaint_images
+            WHERE id > :last_id AND storage_key IS NULL AND image_data IS NOT NULL
+            ORDER BY id LIMIT :limit
+        """), {"last_id": last_id, "limit": BATCH_SIZE}).fetchall()
+        if not rows:
+            break
+
+        for row_id, image_data, content_type in rows:
+            data = bytes(image_data)
+            key = store.put(data, content_type)
+            conn.execute(
+                text("UPDATE complaint_images SET storage_key = :key, size_bytes = :size, image_data = NULL WHERE id = :id"),
+                {"key": key, "size": len(data), "id": row_id}
+            )
+            moved += 1
+        last_id = rows[-1][0]
+        print(f"  moved {moved} blob(s)...")
+    return moved
+
+
+def migrate():
+    """Run migration to move media blobs into the media store"""
+    print("Starting migration: Moving complaint media into the media store...")
+    
+    try:
+        with engine.connect() as conn:
+            # Start transaction
+            trans = conn.begin()
+            
+            try:
+                if engine.url.drivername == 'sqlite':
+                    _migrate_schema_sqlite(conn)
+                elif engine.url.drivername.startswith('postgresql'):
+                    _migrate_schema_postgres(conn)
+                else:
+                    print("[ERROR] Unsupported database for this migration")
+                    sys.exit(1)
+
+                moved = _move_blobs(conn)
+                print(f"[OK] Moved {moved} blob(s) into the media store")
+                
+                # Commit transaction
+                trans.commit()
+                print("\n[SUCCESS] Migration completed successfully!")
+                
+            except Exception as e:
+                trans.rollback()
+                raise e
+                
+    except Exception as e:
+        print(f"\n[ERROR] Migration failed: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,71 @@
+"""
+INT8 Quantization Script
+Calibrates the custom detector on a local image set, writes an INT8
+ONNX Runtime / OpenVINO model and reports the mAP delta against FP32
+(see app_utils/quantize.py).
+
+Usage (from Backend/):
+    python -m scripts.quantize_model --data path/to/dataset.yaml
+    python -m scripts.quantize_model --data dataset.yaml --backend openvino --calib-images path/to/images
+
+Then serve it with YOLO_WEIGHTS=<printed path>.
+"""
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+from yolo_service import YOLO_ROOT, _import_dependencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="INT8 post-training quantization of the YOLOv5 detector")
+    parser.add_argument("--weights", default=str(YOLO_ROOT / "weights" / "best.pt"), help="FP32 weights (.pt)")
+    parser.add_argument("--data", required=True, help="dataset YAML (val split is used for the mAP report)")
+    parser.add_argument("--backend", default="onnx", choices=("onnx", "openvino"))
+    parser.add_argument("--img-size", type=int, default=640)
+    parser.add_argument("--calib-images", default=None, help="calibration images (default: the dataset's train split)")
+    parser.add_argument("--calib-size", type=int, default=300, help="max calibration images")
+    parser.add_argument("--method", default="minmax", choices=("minmax", "entropy", "percentile"),
+                        help="ONNX Runtime calibration method")
+    parser.add_argument("--output", default=None, help="INT8 model path (default: next to the weights)")
+    parser.add_argument("--no-val", action="store_true", help="skip the FP32 vs INT8 val.py comparison")
+    parser.add_argument("--max-map-drop", type=float, default=0.01,
+                        help="fail if mAP@0.5 drops by more than this (absolute)")
+    opt = parser.parse_args()
+
+    _import_dependencies()  # puts yolov5 (export.py, val.py, utils) on sys.path
+    from app_utils.quantize import quantize_model
+
+    try:
+        report = quantize_model(
+            Path(opt.weights),
+            opt.data,
+            cache_dir=Path(os.getenv("YOLO_RUNTIME_CACHE", str(YOLO_ROOT / "runtime_cache"))),
+            backend=opt.backend,
+            img_size=opt.img_size,
+            calibration_images=opt.calib_images,
+            calibration_size=opt.calib_size,
+            method=opt.method,
+            output_path=Path(opt.output) if opt.output else None,
+            run_validation=not opt.no_val,
+        )
+    except Exception as e:
+        print(f"\n[ERROR] Quantization failed: {e}")
+        sys.exit(1)
+
+    print(json.dumps(report, indent=2))
+    if "delta" in report:
+        drop = -report["delta"]["mAP50"]
+        print(f"\nmAP@0.5 {report['fp32']['mAP50']:.4f} -> {report['int8']['mAP50']:.4f} "
+              f"(delta {report['delta']['mAP50']:+.4f}), {report.get('speedup', '?')}x faster")
+        if drop > opt.max_map_drop:
+            print(f"[ERROR] mAP@0.5 dropped by {drop:.4f} (> {opt.max_map_drop}); try --method entropy or more calibration images")
+            sys.exit(1)
+
+    print(f"\n[SUCCESS] Serve it with YOLO_WEIGHTS={report['int8_model']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Adaptive Live Controller
+Closed-loop tuning of the live pipeline against a per-tick time budget
+(LIVE_TARGET_FPS, or LIVE_LATENCY_BUDGET_MS when set).
+
+It tracks an exponential moving average of the inference latency per
+batch and of the JPEG encode latency per frame, and moves three knobs one
+step at a time:
+- inference resolution, among the stride multiples the model accepts
+  (YOLOv5Service.supported_img_sizes / check_img_size)
+- inference stride: only every k-th captured frame is considered
+- JPEG quality of the viewer stream
+
+Over budget it first lowers the resolution, then raises the stride; with
+plenty of headroom it undoes those in reverse order. JPEG quality follows
+the encode latency separately. Every change is reported through
+on_change so it can be published on the events stream.
+"""
+import os
+import threading
+from typing import Callable, List, Optional
+
+LIVE_TARGET_FPS = float(os.getenv("LIVE_TARGET_FPS", "15"))
+LIVE_LATENCY_BUDGET_MS = float(os.getenv("LIVE_LATENCY_BUDGET_MS", "0"))
+LIVE_MAX_FRAME_STRIDE = int(os.getenv("LIVE_MAX_FRAME_STRIDE", "4"))
+
+EMA_ALPHA = 0.2
+ADJUST_EVERY = 10      # inference ticks between decisions
+OVER_BUDGET = 1.1      # degrade above 110% of the budget
+UNDER_BUDGET = 0.6     # upgrade below 60% of the budget
+JPEG_QUALITY_STEP = 10
+JPEG_QUALITY_MIN = 50
+
+
+class AdaptiveController:
+    """Shared by all cameras of a CameraRegistry (they share one batched forward pass)"""
+
+    def __init__(
+        self,
+        target_fps: float = LIVE_TARGET_FPS,
+        latency_budget_ms: float = LIVE_LATENCY_BUDGET_MS,
+        max_frame_stride: int = LIVE_MAX_FRAME_STRIDE,
+        jpeg_quality: int = 80,
+        on_change: Optional[Callable[[dict], None]] = None,
+    ):
+        self.budget = latency_budget_ms / 1000 if latency_budget_ms > 0 else 1 / target_fps
+        self.max_frame_stride = max_frame_stride
+        self.max_jpeg_quality = jpeg_quality
+        self.on_change = on_change
+
+        self.img_sizes: List[int] = []
+        self.img_size: Optional[int] = None  # None until configure(): service default
+        self.frame_stride = 1
+        self.jpeg_quality = jpeg_quality
+
+        self.infer_ema: Optional[float] = None
+        self.encode_ema: Optional[float] = None
+        self._ticks = 0
+        self._lock = threading.Lock()
+
+    def configure(self, img_sizes: List[int]):
+        """Set the resolution ladder (smallest first); starts at the largest size"""
+        with self._lock:
+            self.img_sizes = list(img_sizes)
+            self.img_size = self.img_sizes[-1] if self.img_sizes else None
+
+    @staticmethod
+    def _ema(current: Optional[float], sample: float) -> float:
+        return sample if current is None else (1 - EMA_ALPHA) * current + EMA_ALPHA * sample
+
+    def record_encode(self, seconds: float):
+        with self._lock:
+            self.encode_ema = self._ema(self.encode_ema, seconds)
+
+    def record_inference(self, seconds: float):
+        """Feed one batch latency; may adjust the knobs"""
+        with self._lock:
+            self.infer_ema = self._ema(self.infer_ema, seconds)
+            self._ticks += 1
+            if self._ticks % ADJUST_EVERY:
+                return
+            changes = self._adjust()
+            state = self._snapshot_locked() if changes else None
+
+        if state and self.on_change:
+            state["changes"] = changes
+            self.on_change(state)
+
+    def _adjust(self) -> List[str]:
+        changes = []
+        size_index = self.img_sizes.index(self.img_size) if self.img_size in self.img_sizes else -1
+
+        # Inference: resolution first, then frame stride
+        if self.infer_ema > self.budget * OVER_BUDGET:
+            if size_index > 0:
+                self.img_size = self.img_sizes[size_index - 1]
+                changes.append(f"img_size -> {self.img_size}")
+            elif self.frame_stride < self.max_frame_stride:
+                self.frame_stride += 1
+                changes.append(f"frame_stride -> {self.frame_stride}")
+        elif self.infer_ema < self.budget * UNDER_BUDGET:
+            if self.frame_stride > 1:
+                self.frame_stride -= 1
+                changes.append(f"frame_stride -> {self.frame_stride}")
+            elif 0 <= size_index < len(self.img_sizes) - 1:
+                self.img_size = self.img_sizes[size_index + 1]
+                changes.append(f"img_size -> {self.img_size}")
+
+        # Encoding runs in parallel with inference and gets half the budget
+        if self.encode_ema is not None:
+            if self.encode_ema > self.budget * 0.5 and self.jpeg_quality > JPEG_QUALITY_MIN:
+                self.jpeg_quality = max(JPEG_QUALITY_MIN, self.jpeg_quality - JPEG_QUALITY_STEP)
+                changes.append(f"jpeg_quality -> {self.jpeg_quality}")
+            elif self.encode_ema < self.budget * 0.25 and self.jpeg_quality < self.max_jpeg_quality:
+                self.jpeg_quality = min(self.max_jpeg_quality, self.jpeg_quality + JPEG_QUALITY_STEP)
+                changes.append(f"jpeg_quality -> {self.jpeg_quality}")
+
+        return changes
+
+    def _snapshot_locked(self) -> dict:
+        return {
+            "img_size": self.img_size,
+            "frame_stride": self.frame_stride,
+            "jpeg_quality": self.jpeg_quality,
+            "budget_ms": round(self.budget * 1000, 1),
+            "inference_ms": round(self.infer_ema * 1000, 1) if self.infer_ema is not None else None,
+            "encode_ms": round(self.encode_ema * 1000, 1) if self.encode_ema is not None else None,
+        }
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return self._snapshot_locked()
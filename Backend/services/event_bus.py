@@ -0,0 +1,89 @@
+"""
+Event Bus
+Asyncio-native fan-out of live detection events to SSE clients.
+
+Events may be published from any thread (the vision threads log from
+outside the event loop). Each event gets a monotonically increasing
+sequence id and is handed to every subscriber's asyncio.Queue with
+loop.call_soon_threadsafe, so an idle subscriber just awaits its queue -
+no polling - and delivery is immediate. A bounded history lets a
+reconnecting client resume from its Last-Event-ID.
+"""
+import asyncio
+import threading
+from collections import deque
+from typing import List, Optional, Tuple
+
+EVENT_HISTORY_SIZE = 50
+SUBSCRIBER_QUEUE_SIZE = 256
+
+
+class EventBus:
+    """Thread-safe publisher, asyncio subscribers"""
+
+    def __init__(self, history_size: int = EVENT_HISTORY_SIZE, queue_size: int = SUBSCRIBER_QUEUE_SIZE):
+        self._history = deque(maxlen=history_size)  # (seq, event)
+        self._subscribers = {}  # queue -> loop
+        self._lock = threading.Lock()
+        self._seq = 0
+        self.queue_size = queue_size
+
+    def publish(self, event: dict) -> int:
+        """Record an event and push it to every subscriber. Safe to call from any thread."""
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+            self._history.append((seq, event))
+            subscribers = list(self._subscribers.items())
+
+        for queue, loop in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._offer, queue, seq, event)
+            except RuntimeError:
+                # Subscriber's loop is closed; it will never unsubscribe itself
+                self.unsubscribe(queue)
+        return seq
+
+    @staticmethod
+    def _offer(queue: asyncio.Queue, seq: int, event: dict):
+        # Runs on the subscriber's loop. A client that stopped reading loses its oldest events.
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait((seq, event))
+
+    def subscribe(self, last_event_id: Optional[int] = None) -> Tuple[asyncio.Queue, List[Tuple[int, dict]]]:
+        """
+        Register a subscriber on the running event loop.
+
+        Returns:
+            (queue, backlog): the backlog holds the retained events after
+            last_event_id (the whole history when None); the queue receives
+            everything published afterwards, with no gap or overlap
+        """
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        with self._lock:
+            after = 0 if last_event_id is None else last_event_id
+            # An id from before a restart (ahead of our counter) means: send the full history
+            if after > self._seq:
+                after = 0
+            backlog = [(seq, event) for seq, event in self._history if seq > after]
+            self._subscribers[queue] = loop
+        return queue, backlog
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        with self._lock:
+            self._subscribers.pop(queue, None)
+
+    def clear_history(self):
+        """Forget retained events (sequence ids keep increasing)"""
+        with self._lock:
+            self._history.clear()
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+
+# Live detection log stream (routers/yolo_live.py)
+live_events = EventBus()
@@ -0,0 +1,195 @@
+"""
+Frame Hub
+Publish/subscribe fan-out for encoded live frames. A camera's encoder
+publishes each annotated frame once; every viewer (MJPEG response,
+WebSocket, ...) holds a small bounded queue of the shared object. When a
+viewer falls behind, its oldest frames are dropped - it never slows down
+the producer or other viewers, and viewer count never changes inference
+load.
+
+Threaded consumers use Subscription (blocking get); asyncio consumers use
+AsyncSubscription, which is fed through loop.call_soon_threadsafe.
+"""
+import asyncio
+import threading
+from collections import deque
+from typing import List, Optional
+
+SUBSCRIBER_QUEUE_SIZE = 2
+
+
+class Subscription:
+    """One viewer's drop-oldest queue of frames"""
+
+    def __init__(self, hub: "FrameHub", maxsize: int):
+        self._hub = hub
+        self._queue = deque(maxlen=maxsize)
+        self._cond = threading.Condition()
+        self._closed = False
+        self.delivered = 0
+        self.dropped = 0
+
+    def _push(self, frame):
+        with self._cond:
+            if len(self._queue) == self._queue.maxlen:
+                self.dropped += 1  # deque(maxlen) evicts the oldest frame
+            self._queue.append(frame)
+            self._cond.notify()
+
+    def _close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def get(self, timeout: Optional[float] = None):
+        """
+        Next frame for this viewer.
+
+        Returns:
+            The next frame, or None once the hub is closed and the queue is drained
+            (or on timeout)
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._queue or self._closed, timeout)
+            if not self._queue:
+                return None
+            self.delivered += 1
+            return self._queue.popleft()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed and not self._queue
+
+    def close(self):
+        """Unsubscribe (e.g. the viewer disconnected)"""
+        self._hub.unsubscribe(self)
+        self._close()
+
+    def __iter__(self):
+        try:
+            while True:
+                frame = self.get()
+                if frame is None:
+                    return
+                yield frame
+        finally:
+            self.close()
+
+
+class AsyncSubscription:
+    """Drop-oldest queue for a viewer running on an asyncio event loop"""
+
+    def __init__(self, hub: "FrameHub", maxsize: int):
+        self._hub = hub
+        self._loop = asyncio.get_running_loop()
+        self._queue = deque(maxlen=maxsize)
+        self._ready = asyncio.Event()
+        self._closed = False
+        self.delivered = 0
+        self.dropped = 0
+
+    def _push(self, frame):
+        try:
+            self._loop.call_soon_threadsafe(self._push_in_loop, frame)
+        except RuntimeError:
+            # Loop already closed: the viewer is gone
+            self._hub.unsubscribe(self)
+
+    def _push_in_loop(self, frame):
+        if len(self._queue) == self._queue.maxlen:
+            self.dropped += 1
+        self._queue.append(frame)
+        self._ready.set()
+
+    def _close(self):
+        try:
+            self._loop.call_soon_threadsafe(self._close_in_loop)
+        except RuntimeError:
+            pass
+
+    def _close_in_loop(self):
+        self._closed = True
+        self._ready.set()
+
+    async def get(self):
+        """Next frame, or None once the hub is closed and the queue is drained"""
+        while not self._queue:
+            if self._closed:
+                return None
+            self._ready.clear()
+            await self._ready.wait()
+        self.delivered += 1
+        return self._queue.popleft()
+
+    def close(self):
+        self._hub.unsubscribe(self)
+        self._closed = True
+        self._ready.set()
+
+
+class FrameHub:
+    """Fan-out of one producer's frames to any number of subscribers"""
+
+    def __init__(self):
+        self._subscribers: List = []
+        self._lock = threading.Lock()
+        self._latest = None
+        self._closed = False
+        self.published = 0
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self, maxsize: int = SUBSCRIBER_QUEUE_SIZE) -> Subscription:
+        """New viewer; it starts with the most recent frame so the picture appears immediately"""
+        return self._add(Subscription(self, maxsize))
+
+    def subscribe_async(self, maxsize: int = SUBSCRIBER_QUEUE_SIZE) -> AsyncSubscription:
+        """Same as subscribe(), for a consumer on the running asyncio loop"""
+        return self._add(AsyncSubscription(self, maxsize))
+
+    def _add(self, sub):
+        with self._lock:
+            if self._latest is not None:
+                sub._push(self._latest)
+            if self._closed:
+                sub._close()
+            else:
+                self._subscribers.append(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            if sub in self._subscribers:
+                self._subscribers.remove(sub)
+
+    def publish(self, frame):
+        with self._lock:
+            self._latest = frame
+            self.published += 1
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            sub._push(frame)
+
+    def drop_latest(self):
+        """Forget the cached frame (it went stale while nobody was subscribed)"""
+        with self._lock:
+            self._latest = None
+
+    def close(self):
+        """No more frames: subscribers drain their queues, then end"""
+        with self._lock:
+            self._closed = True
+            subscribers, self._subscribers = self._subscribers, []
+        for sub in subscribers:
+            sub._close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            subscribers = list(self._subscribers)
+        return {
+            "subscribers": len(subscribers),
+            "published": self.published,
+            "dropped": sum(sub.dropped for sub in subscribers),
+        }
@@ -0,0 +1,502 @@
+"""
+Live Camera Pipeline
+Capture, YOLO inference and JPEG encoding run in separate threads connected
+by single-slot "latest value" mailboxes - the same latest-frame pattern as
+LoadStreams.update in yolov5/utils/dataloaders.py. Each stage always picks
+up the newest item and drops whatever it could not keep up with, so the
+capture never stalls behind the model and end-to-end latency stays at about
+one inference instead of growing with queue depth.
+
+Encoded frames are fanned out through a FrameHub, so any number of viewers
+share one encode per frame and viewer count never changes inference load.
+
+An AdaptiveController (services/adaptive_controller.py) shared by all
+cameras trades inference resolution, frame stride and JPEG quality against
+a target frame rate.
+
+A per-camera MotionGate (services/motion_gate.py) skips inference on
+frames that did not change noticeably since the last inferred one.
+Frames skipped by the gate or the frame stride are still encoded and
+published, with the boxes carried over from the tracker, so viewers keep
+the camera's frame rate.
+
+Several named cameras can run at once. Each has its own capture and encode
+threads, while a single shared inference thread stacks the newest frame of
+every active camera into one batched forward pass per tick (like
+LoadStreams does for multiple sources).
+"""
+import math
+import os
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional
+
+import cv2
+
+from app_utils.tracking import SortTracker
+from services.adaptive_controller import AdaptiveController
+from services.frame_hub import FrameHub
+from services.motion_gate import MotionGate
+from yolo_service import get_yolo_service
+
+LIVE_JPEG_QUALITY = int(os.getenv("LIVE_JPEG_QUALITY", "80"))
+LIVE_MAX_CAMERAS = int(os.getenv("LIVE_MAX_CAMERAS", "8"))
+LIVE_MOTION_GATE = os.getenv("LIVE_MOTION_GATE", "1") == "1"
+LIVE_ADAPTIVE = os.getenv("LIVE_ADAPTIVE", "1") == "1"
+
+
+class LatestSlot:
+    """
+    Single-item mailbox. put() overwrites the current item; get() waits for
+    an item newer than the last sequence number the reader has seen.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._item = None
+        self._seq = 0
+        self._closed = False
+
+    def put(self, item):
+        with self._cond:
+            self._item = item
+            self._seq += 1
+            self._cond.notify_all()
+
+    def get(self, after: int = 0, timeout: Optional[float] = None):
+        """
+        Returns:
+            (seq, item) for the newest item past `after`, or (after, None)
+            once the slot is closed and drained, or on timeout
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq > after or self._closed, timeout)
+            if self._seq > after:
+                return self._seq, self._item
+            return after, None
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class LiveResult:
+    """One frame on its way from the inference stage to the encoder (inferred, or passed through with tracked boxes)"""
+
+    def __init__(self, frame_id: int, frame, detections: list):
+        self.frame_id = frame_id
+        self.frame = frame  # clean capture (for saving / re-analysis); boxes are drawn on a copy by the encoder
+        self.detections = detections
+        self.timestamp = time.time()
+        self.final = False
+
+
+class EncodedFrame:
+    """What viewers receive: the annotated JPEG plus the detections drawn on it"""
+
+    def __init__(self, frame_id: int, timestamp: float, jpeg: bytes, detections: list):
+        self.frame_id = frame_id
+        self.timestamp = timestamp
+        self.jpeg = jpeg
+        self.detections = detections
+
+
+def parse_source(source):
+    """'0' -> webcam index 0; anything else (RTSP/HTTP URL, file path) is passed to OpenCV as-is"""
+    if isinstance(source, str) and source.isnumeric():
+        return int(source)
+    return source
+
+
+class CameraStream:
+    """
+    One named video source with its own capture and encode threads.
+    Inference is done by the CameraRegistry's shared inference thread.
+
+    on_result(stream, result) runs on the inference thread for every
+    inferred frame; returning True makes that frame the last one (it is
+    still encoded and delivered to viewers) and stops the stream.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        source=0,
+        latitude: Optional[float] = None,
+        longitude: Optional[float] = None,
+        on_result: Optional[Callable[["CameraStream", LiveResult], bool]] = None,
+        jpeg_quality: int = LIVE_JPEG_QUALITY,
+        motion_gate: Optional[MotionGate] = None,
+        controller: Optional[AdaptiveController] = None,
+    ):
+        self.name = name
+        self.source = parse_source(source)
+        self.location = {"latitude": latitude, "longitude": longitude}
+        self.session_id = uuid.uuid4().hex[:8]
+        self.on_result = on_result
+        self.jpeg_quality = jpeg_quality
+        self.gate = motion_gate or (MotionGate() if LIVE_MOTION_GATE else None)
+        self.controller = controller
+        self.conf_threshold: Optional[float] = None  # per-camera override of the service threshold
+        # Stable track ids across inferred frames (no history kept: the stream never ends)
+        self.tracker = SortTracker(keep_history=False)
+
+        self.frames = LatestSlot()   # raw captured frames
+        self.results = LatestSlot()  # LiveResult from inference (or passed through)
+        self.jpegs = FrameHub()      # EncodedFrame, fanned out to viewers
+
+        self.stats = {
+            "captured": 0, "inferred": 0, "encoded": 0, "dropped": 0, "gated": 0, "strided": 0, "fps": 0.0
+        }
+        self.started_at = None
+        self.last_status_at = 0.0  # for periodic status logging by the result handler
+        self._stop = threading.Event()
+        self._started = False
+        self._cap = None
+        self._is_file = False
+        self._frame_interval = 1 / 30
+        self._last_seen = 0  # last frame seq taken by the inference thread
+        self._last_inferred = 0  # last frame seq sent to the model (frame stride)
+        self._last_detections: list = []  # tracked boxes of the last inferred frame
+        self._last_infer_time = None
+        self._on_frame = None  # wakes the shared inference thread
+        self._threads = []
+
+    @property
+    def running(self) -> bool:
+        return self._started and not self._stop.is_set()
+
+    def info(self) -> dict:
+        return {
+            "name": self.name,
+            "source": str(self.source),
+            "session_id": self.session_id,
+            "running": self.running,
+            "latitude": self.location["latitude"],
+            "longitude": self.location["longitude"],
+            "started_at": self.started_at,
+            "stats": dict(self.stats),
+            "skip_ratio": self.skip_ratio,
+            "tracks": self.tracker.stats(),
+            "conf_threshold": self.conf_threshold,
+            "viewers": self.jpegs.stats(),
+        }
+
+    @property
+    def skip_ratio(self) -> float:
+        """Share of considered frames the motion gate kept away from the model"""
+        return self.gate.skip_ratio if self.gate else 0.0
+
+    def start(self, on_frame: Optional[Callable[[], None]] = None) -> bool:
+        """Open the source and start the capture / encode threads. Returns False if it cannot be opened."""
+        cap = cv2.VideoCapture(self.source)
+        if not cap.isOpened():
+            return False
+
+        # Keep the driver queue short; the capture thread drains it continuously anyway
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        self._frame_interval = 1 / ((fps if math.isfinite(fps) else 0) % 100 or 30)
+        self._is_file = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) > 0
+        self._cap = cap
+        self._on_frame = on_frame
+
+        self._started = True
+        self.started_at = time.time()
+        for stage, target in (("capture", self._capture_loop), ("encode", self._encode_loop)):
+            thread = threading.Thread(target=target, name=f"live-{self.name}-{stage}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return True
+
+    def stop(self):
+        """Stop capturing and release viewers (results already delivered are still encoded)"""
+        self._stop.set()
+        self.frames.close()
+        self.results.close()
+
+    async def mjpeg(self):
+        """
+        multipart/x-mixed-replace generator for one viewer. It waits on the
+        event loop (no worker thread per viewer) and unsubscribes as soon as
+        the client goes away, even if the camera publishes nothing new.
+        """
+        sub = self.jpegs.subscribe_async()
+        try:
+            while True:
+                frame = await sub.get()
+                if frame is None:
+                    return
+                yield (
+                    b"--frame\r\n"
+                    b"Content-Type: image/jpeg\r\n\r\n" +
+                    frame.jpeg +
+                    b"\r\n"
+                )
+        finally:
+            sub.close()
+
+    # ---------------- CALLED BY THE INFERENCE THREAD ----------------
+    def take_frame(self):
+        """
+        Newest frame not yet taken, if it passes the frame stride and motion
+        gate, or None. Frames that do not are published straight to the
+        encoder with the tracker's boxes instead of being inferred.
+        """
+        seq, frame = self.frames.get(self._last_seen, timeout=0)
+        if frame is None:
+            return None
+        # Frames captured while the model was busy are skipped, never queued
+        self.stats["dropped"] += seq - self._last_seen - 1
+        self._last_seen = seq
+
+        # Adaptive frame stride: infer every k-th frame (and the last one of a file)
+        stride = self.controller.frame_stride if self.controller else 1
+        if seq - self._last_inferred < stride and not self.frames.closed:
+            self.stats["strided"] += 1
+            # Between keyframes the boxes follow the tracks' motion model
+            self._pass_through(seq, frame, self.tracker.predict())
+            return None
+
+        if self.gate is not None and not self.gate.should_infer(frame):
+            self.stats["gated"] += 1
+            # Scene unchanged since the last inferred frame: its boxes still apply.
+            # The tracker is not advanced, so tracks do not age out on a static scene
+            self._pass_through(seq, frame, self._last_detections)
+            return None
+        self._last_inferred = seq
+        return frame
+
+    def _pass_through(self, seq: int, frame, detections: list):
+        """Hand a frame that is not inferred to the encoder (on_result only sees inferred frames)"""
+        if not self.results.closed:
+            self.results.put(LiveResult(seq, frame, detections))
+
+    def deliver(self, frame, detections: list):
+        now = time.monotonic()
+        if self._last_infer_time is not None and now > self._last_infer_time:
+            self.stats["fps"] = 1 / (now - self._last_infer_time)
+        self._last_infer_time = now
+        self.stats["inferred"] += 1
+
+        if self.conf_threshold is not None:
+            detections = [det for det in detections if det["confidence"] >= self.conf_threshold]
+        self.tracker.predict()
+        detections = self._last_detections = self.tracker.update(detections, self._last_inferred)
+        result = LiveResult(self._last_inferred, frame, detections)
+        try:
+            result.final = bool(self.on_result and self.on_result(self, result))
+        except Exception as e:
+            print(f"Live result handler error ({self.name}): {e}")
+        self.results.put(result)
+        if result.final:
+            self.stop()
+
+    def finished(self) -> bool:
+        """Capture has ended and every captured frame has been taken"""
+        return self.frames.closed and self.frames.get(self._last_seen, timeout=0)[1] is None
+
+    def close_results(self):
+        """End of file: every frame has been inferred, let the encoder finish"""
+        self.results.close()
+
+    # ---------------- STAGES ----------------
+    def _capture_loop(self):
+        cap = self._cap
+        next_due = time.monotonic()
+        try:
+            while not self._stop.is_set():
+                success, frame = cap.read()
+                if not success:
+                    if self._is_file:
+                        break  # end of video file
+                    # Camera / stream hiccup: re-open like LoadStreams does
+                    print(f"Live source {self.name} ({self.source}) unresponsive, re-opening...")
+                    time.sleep(0.1)
+                    cap.open(self.source)
+                    continue
+
+                self.stats["captured"] += 1
+                self.frames.put(frame)
+                if self._on_frame:
+                    self._on_frame()
+
+                if self._is_file:
+                    # Files replay at their native frame rate (cameras are paced by the driver)
+                    next_due += self._frame_interval
+                    time.sleep(max(0.0, next_due - time.monotonic()))
+        except Exception as e:
+            print(f"Live capture error ({self.name}): {e}")
+        finally:
+            cap.release()
+            self._stop.set()
+            self.frames.close()
+            if self._on_frame:
+                self._on_frame()
+
+    def _encode_loop(self):
+        seen = 0
+        yolo = None
+        try:
+            while True:
+                seen, result = self.results.get(seen)
+                if result is None:
+                    break
+                if not self.jpegs.subscriber_count:
+                    # Nobody is watching: skip the encode entirely
+                    self.jpegs.drop_latest()
+                    if result.final:
+                        break
+                    continue
+                quality = self.controller.jpeg_quality if self.controller else self.jpeg_quality
+                encode_start = time.perf_counter()
+                annotated = result.frame
+                if result.detections:
+                    yolo = yolo or get_yolo_service()
+                    annotated = result.frame.copy()
+                    yolo.draw_boxes(annotated, result.detections)
+                ok, buffer = cv2.imencode(".jpg", annotated, [cv2.IMWRITE_JPEG_QUALITY, quality])
+                if self.controller:
+                    self.controller.record_encode(time.perf_counter() - encode_start)
+                if ok:
+                    self.stats["encoded"] += 1
+                    self.jpegs.publish(EncodedFrame(result.frame_id, result.timestamp, buffer.tobytes(), result.detections))
+                if result.final:
+                    break
+        finally:
+            self.jpegs.close()
+
+
+class CameraRegistry:
+    """
+    Named live cameras sharing one batched inference thread.
+
+    Every tick the inference thread takes the newest unseen frame from each
+    active camera and runs them through a single detect_batch() call, so N
+    feeds cost one forward pass per tick instead of N.
+    """
+
+    def __init__(self, max_cameras: int = LIVE_MAX_CAMERAS):
+        self.max_cameras = max_cameras
+        self._streams: Dict[str, CameraStream] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self.batch_stats = {"batches": 0, "frames": 0, "last_batch_size": 0}
+        self.controller = AdaptiveController(jpeg_quality=LIVE_JPEG_QUALITY) if LIVE_ADAPTIVE else None
+
+    def add(
+        self,
+        name: str,
+        source=0,
+        latitude: Optional[float] = None,
+        longitude: Optional[float] = None,
+        on_result: Optional[Callable[[CameraStream, LiveResult], bool]] = None,
+    ) -> Optional[CameraStream]:
+        """
+        Start a camera under `name` (replacing a stopped one of the same name).
+        Returns None if the source cannot be opened.
+
+        Raises:
+            ValueError: name already running or too many active cameras
+        """
+        with self._lock:
+            existing = self._streams.get(name)
+            if existing is not None and existing.running:
+                raise ValueError(f"Camera '{name}' is already running")
+            active = sum(1 for stream in self._streams.values() if stream.running)
+            if active >= self.max_cameras:
+                raise ValueError(f"Camera limit reached ({self.max_cameras} active)")
+
+            stream = CameraStream(name, source, latitude, longitude, on_result, controller=self.controller)
+            if not stream.start(on_frame=self._wake.set):
+                return None
+            self._streams[name] = stream
+            self._ensure_thread()
+        return stream
+
+    def get(self, name: str) -> Optional[CameraStream]:
+        with self._lock:
+            return self._streams.get(name)
+
+    def streams(self) -> List[CameraStream]:
+        with self._lock:
+            return list(self._streams.values())
+
+    def any_running(self) -> bool:
+        return any(stream.running for stream in self.streams())
+
+    def remove(self, name: str) -> Optional[CameraStream]:
+        with self._lock:
+            stream = self._streams.pop(name, None)
+        if stream is not None:
+            stream.stop()
+        return stream
+
+    def stop_all(self):
+        with self._lock:
+            streams = list(self._streams.values())
+            self._streams.clear()
+        for stream in streams:
+            stream.stop()
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._inference_loop, name="live-inference", daemon=True)
+            self._thread.start()
+
+    def _inference_loop(self):
+        yolo = get_yolo_service()
+        if self.controller is not None and self.controller.img_size is None:
+            self.controller.configure(yolo.supported_img_sizes())
+
+        while True:
+            self._wake.wait(timeout=1.0)
+            # Clear before collecting: a frame arriving mid-batch re-arms the event
+            self._wake.clear()
+
+            batch = []
+            for stream in self.streams():
+                frame = stream.take_frame()
+                if frame is not None:
+                    batch.append((stream, frame))
+                elif stream.finished():
+                    stream.close_results()
+
+            if not batch:
+                continue
+
+            img_size = self.controller.img_size if self.controller else None
+            # Run at the lowest threshold any camera in the batch asked for; deliver() filters per camera
+            conf_threshold = min(
+                stream.conf_threshold if stream.conf_threshold is not None else yolo.conf_threshold
+                for stream, _ in batch
+            )
+            try:
+                infer_start = time.perf_counter()
+                outputs = yolo.detect_batch(
+                    [frame for _, frame in batch],
+                    save_annotated=False, img_size=img_size, conf_threshold=conf_threshold
+                )
+                if self.controller:
+                    self.controller.record_inference(time.perf_counter() - infer_start)
+            except Exception as e:
+                print(f"Live inference error: {e}")
+                time.sleep(0.1)
+                continue
+
+            self.batch_stats["batches"] += 1
+            self.batch_stats["frames"] += len(batch)
+            self.batch_stats["last_batch_size"] = len(batch)
+            for (stream, frame), (detections, _) in zip(batch, outputs):
+                stream.deliver(frame, detections)
+
+
+# Process-wide registry used by the live router
+camera_registry = CameraRegistry()
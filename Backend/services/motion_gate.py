@@ -0,0 +1,84 @@
+"""
+Motion Gate
+Cheap pre-filter in front of live inference. Each frame is compared with
+the last frame that was actually inferred, in two ways:
+- downscaled grayscale differencing: the fraction of pixels that changed
+  noticeably (local motion)
+- pHash delta via app_utils/image_hash.py: Hamming distance between the
+  frames' perceptual hashes (scene change, e.g. the camera pans)
+
+Inference only runs on significant change, or on a keyframe every N frames
+so nothing can stay hidden from the model indefinitely. On a parked
+monitoring vehicle most frames are skipped.
+"""
+import os
+
+import cv2
+
+from app_utils.image_hash import MASK64, calculate_array_phash
+
+GATE_SIZE = (64, 64)
+
+
+class MotionGate:
+    """Per-camera decision: is this frame different enough to be worth a forward pass?"""
+
+    def __init__(
+        self,
+        pixel_delta: int = int(os.getenv("LIVE_MOTION_PIXEL_DELTA", "25")),
+        changed_fraction: float = float(os.getenv("LIVE_MOTION_FRACTION", "0.01")),
+        phash_distance: int = int(os.getenv("LIVE_SCENE_PHASH_DISTANCE", "8")),
+        keyframe_interval: int = int(os.getenv("LIVE_KEYFRAME_INTERVAL", "30")),
+    ):
+        self.pixel_delta = pixel_delta
+        self.changed_fraction = changed_fraction
+        self.phash_distance = phash_distance
+        self.keyframe_interval = keyframe_interval
+
+        self._ref = None        # downscaled gray of the last inferred frame
+        self._ref_phash = None
+        self._since_keyframe = 0
+        self._force = False
+        self.passed = 0
+        self.skipped = 0
+        self.last_reason = None
+
+    @property
+    def skip_ratio(self) -> float:
+        total = self.passed + self.skipped
+        return self.skipped / total if total else 0.0
+
+    def request_keyframe(self):
+        """Let the next frame through regardless of change (e.g. a viewer asked for fresh detections)"""
+        self._force = True
+
+    def should_infer(self, frame) -> bool:
+        """Decide for one BGR frame; a passing frame becomes the new reference"""
+        small = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), GATE_SIZE, interpolation=cv2.INTER_AREA)
+        phash = calculate_array_phash(small)
+        self._since_keyframe += 1
+
+        reason = None
+        if self._force or self._ref is None or self._since_keyframe >= self.keyframe_interval:
+            reason = "keyframe"
+            self._force = False
+        else:
+            changed = cv2.countNonZero(
+                cv2.threshold(cv2.absdiff(small, self._ref), self.pixel_delta, 255, cv2.THRESH_BINARY)[1]
+            )
+            if changed >= self.changed_fraction * small.size:
+                reason = "motion"
+            elif (phash is not None and self._ref_phash is not None
+                  and ((phash ^ self._ref_phash) & MASK64).bit_count() >= self.phash_distance):  # signed 64-bit hashes
+                reason = "scene"
+
+        if reason is None:
+            self.skipped += 1
+            return False
+
+        self._ref = small
+        self._ref_phash = phash
+        self._since_keyframe = 0
+        self.passed += 1
+        self.last_reason = reason
+        return True
@@ -0,0 +1,325 @@
+"""
+Video Analysis Jobs
+Uploaded videos are analysed in the background instead of inside the
+upload request.
+
+A job's upload is streamed to uploads/jobs/<job_id>/source.<ext> and split
+into fixed-length segments. Segments are decoded, batched and inferred in
+parallel (each worker seeks to its own start frame and writes its own
+annotated segment file), then stitched into one annotated video. Progress
+is tracked per segment and the job state lives next to the files in
+job.json, so a job interrupted by a failure or a restart resumes from the
+segments that already finished.
+
+When every segment is done the on_complete callback (registered by
+routers/complaints.py) turns the merged detections into tickets.
+"""
+import json
+import os
+import shutil
+import subprocess
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, List, Optional
+
+import cv2
+
+from app_utils.executors import ExecutorSaturated, video_executor
+from yolo_service import get_yolo_service
+
+JOBS_DIR = Path("uploads/jobs")
+VIDEO_SEGMENT_SECONDS = float(os.getenv("VIDEO_SEGMENT_SECONDS", "10"))
+VIDEO_SEGMENT_WORKERS = int(os.getenv("VIDEO_SEGMENT_WORKERS", "2"))
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+class VideoJob:
+    """State of one video analysis job (mirrored to <job dir>/job.json)"""
+
+    def __init__(self, job_id: str, file_name: str, content_type: str, context: Optional[dict] = None):
+        self.job_id = job_id
+        self.file_name = file_name
+        self.content_type = content_type
+        self.context = context or {}   # caller data for on_complete (location, user, ...)
+        self.status = QUEUED
+        self.error: Optional[str] = None
+        self.total_frames = 0
+        self.segments: List[List[int]] = []   # [start_frame, end_frame] per segment
+        self.completed_segments: List[int] = []
+        self.detections: List[dict] = []
+        self.result: Optional[dict] = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self._frames_done: Dict[int, int] = {}  # running segment -> frames done (not persisted)
+
+    @property
+    def dir(self) -> Path:
+        return JOBS_DIR / self.job_id
+
+    @property
+    def source_path(self) -> Path:
+        return self.dir / f"source{Path(self.file_name).suffix or '.mp4'}"
+
+    @property
+    def output_path(self) -> Path:
+        return self.dir / "annotated.mp4"
+
+    def segment_path(self, index: int, suffix: str = ".mp4") -> Path:
+        return self.dir / f"segment_{index:04d}{suffix}"
+
+    @property
+    def frames_done(self) -> int:
+        done = sum(end - start for i, (start, end) in enumerate(self.segments) if i in self.completed_segments)
+        return done + sum(list(self._frames_done.values()))
+
+    @property
+    def progress(self) -> float:
+        if self.status == COMPLETED:
+            return 1.0
+        return min(self.frames_done / self.total_frames, 1.0) if self.total_frames else 0.0
+
+    def info(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "file_name": self.file_name,
+            "progress": round(self.progress, 3),
+            "frames_done": self.frames_done,
+            "total_frames": self.total_frames,
+            "segments": len(self.segments),
+            "completed_segments": len(self.completed_segments),
+            "detections": self.detections if self.status == COMPLETED else None,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+    def save(self):
+        """Persist the resumable state (atomic replace)"""
+        self.updated_at = time.time()
+        state = {
+            key: getattr(self, key) for key in (
+                "job_id", "file_name", "content_type", "context", "status", "error", "total_frames",
+                "segments", "completed_segments", "detections", "result", "created_at", "updated_at",
+            )
+        }
+        tmp_path = self.dir / "job.json.tmp"
+        tmp_path.write_text(json.dumps(state))
+        os.replace(tmp_path, self.dir / "job.json")
+
+    @classmethod
+    def load(cls, job_dir: Path) -> Optional["VideoJob"]:
+        try:
+            state = json.loads((job_dir / "job.json").read_text())
+        except (OSError, ValueError):
+            return None
+        job = cls(state["job_id"], state["file_name"], state["content_type"], state.get("context"))
+        for key, value in state.items():
+            setattr(job, key, value)
+        return job
+
+
+def _concat_segments(paths: List[Path], output_path: Path, fps: float, size: tuple):
+    """Join segment files; stream copy with ffmpeg when available, else re-encode with OpenCV"""
+    if shutil.which("ffmpeg"):
+        list_file = output_path.with_suffix(".txt")
+        list_file.write_text("".join(f"file '{path.resolve()}'\n" for path in paths))
+        try:
+            completed = subprocess.run(
+                ["ffmpeg", "-y", "-loglevel", "error", "-f", "concat", "-safe", "0",
+                 "-i", str(list_file), "-c", "copy", str(output_path)],
+                capture_output=True,
+            )
+            if completed.returncode == 0:
+                return
+            print(f"⚠️ ffmpeg concat failed, re-encoding segments: {completed.stderr.decode(errors='ignore')[-200:]}")
+        finally:
+            list_file.unlink(missing_ok=True)
+
+    out = get_yolo_service().open_video_writer(output_path, fps, *size)
+    try:
+        for path in paths:
+            cap = cv2.VideoCapture(str(path))
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                out.write(frame)
+            cap.release()
+    finally:
+        out.release()
+
+
+class VideoJobManager:
+    """Queues jobs on video_executor and fans their segments out to a worker pool"""
+
+    def __init__(self, segment_workers: int = VIDEO_SEGMENT_WORKERS):
+        self._jobs: Dict[str, VideoJob] = {}
+        self._lock = threading.Lock()
+        self._segment_pool = ThreadPoolExecutor(max_workers=segment_workers, thread_name_prefix="video-segment")
+        # on_complete(job) -> result dict, stored on the job (e.g. created tickets)
+        self.on_complete: Optional[Callable[[VideoJob], dict]] = None
+
+    def create(self, upload: BinaryIO, file_name: str, content_type: str, context: Optional[dict] = None) -> VideoJob:
+        """Stream an upload into a new job directory (blocking: run on the I/O pool)"""
+        job = VideoJob(uuid.uuid4().hex, file_name, content_type, context)
+        job.dir.mkdir(parents=True, exist_ok=True)
+        with open(job.source_path, "wb") as f:
+            shutil.copyfileobj(upload, f, UPLOAD_CHUNK_SIZE)
+        job.save()
+        with self._lock:
+            self._jobs[job.job_id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[VideoJob]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None and all(c.isalnum() for c in job_id):
+            job = VideoJob.load(JOBS_DIR / job_id)
+            if job is not None:
+                with self._lock:
+                    job = self._jobs.setdefault(job_id, job)
+        return job
+
+    def start(self, job: VideoJob) -> Future:
+        """
+        Queue a job (new, failed or interrupted); finished segments are kept.
+
+        Raises:
+            ExecutorSaturated: if too many jobs are already queued. The job
+                keeps its previous status, so a failed job stays failed and
+                resume_pending does not pick it up later.
+        """
+        previous = (job.status, job.error)
+        job.status = QUEUED
+        job.error = None
+        job.save()
+        try:
+            return video_executor.submit(self._run, job)
+        except ExecutorSaturated:
+            job.status, job.error = previous
+            job.save()
+            raise
+
+    def discard(self, job: VideoJob):
+        """Forget a job that was never started and delete its files"""
+        with self._lock:
+            self._jobs.pop(job.job_id, None)
+        shutil.rmtree(job.dir, ignore_errors=True)
+
+    def resume_pending(self) -> int:
+        """Re-queue jobs that were queued or running when the server stopped"""
+        if not JOBS_DIR.exists():
+            return 0
+        resumed = 0
+        for job_dir in JOBS_DIR.iterdir():
+            job = self.get(job_dir.name)
+            if job is not None and job.status in (QUEUED, RUNNING):
+                self.start(job)
+                resumed += 1
+        return resumed
+
+    # ---------------- WORKER ----------------
+    def _run(self, job: VideoJob):
+        job.status = RUNNING
+        job.save()
+        try:
+            fps, size = self._plan(job)
+            pending = [i for i in range(len(job.segments)) if i not in job.completed_segments]
+            print(f"🎬 Video job {job.job_id}: {len(pending)}/{len(job.segments)} segment(s) to analyse")
+
+            futures = [self._segment_pool.submit(self._run_segment, job, i) for i in pending]
+            # Wait for every segment (even after a failure) so a resume never races a running worker
+            errors = [error for error in (future.exception() for future in futures) if error is not None]
+            if errors:
+                raise errors[0]
+
+            job.detections = self._merge(job)
+            _concat_segments([job.segment_path(i) for i in range(len(job.segments))], job.output_path, fps, size)
+            if self.on_complete:
+                job.result = self.on_complete(job)
+            job.status = COMPLETED
+            job.save()
+            self._cleanup(job)
+            print(f"✅ Video job {job.job_id} completed: {len(job.detections)} tracked object(s)")
+        except Exception as e:
+            job.status = FAILED
+            job.error = str(e)
+            job.save()
+            print(f"❌ Video job {job.job_id} failed: {e}")
+
+    def _plan(self, job: VideoJob) -> tuple:
+        """Read the video properties and split it into segments (once per job)"""
+        cap = cv2.VideoCapture(str(job.source_path))
+        if not cap.isOpened():
+            raise ValueError(f"Failed to open video: {job.file_name}")
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30
+        size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+
+        if not job.segments:
+            job.total_frames = total_frames
+            if total_frames <= 0:
+                job.segments = [[0, None]]  # unknown length: one segment to the end
+            else:
+                length = max(1, int(fps * VIDEO_SEGMENT_SECONDS))
+                job.segments = [[start, min(start + length, total_frames)] for start in range(0, total_frames, length)]
+            job.save()
+        return fps, size
+
+    def _run_segment(self, job: VideoJob, index: int):
+        start, end = job.segments[index]
+
+        def progress(frames: int):
+            job._frames_done[index] = frames
+
+        detections, frames = get_yolo_service().detect_video_segment(
+            job.source_path, job.segment_path(index),
+            start_frame=start, end_frame=end, progress=progress, sampling=job.context.get("sampling"),
+        )
+        job.segment_path(index, ".json").write_text(json.dumps({"frames": frames, "detections": detections}))
+
+        with self._lock:
+            job._frames_done.pop(index, None)
+            if end is None:
+                job.segments[index][1] = start + frames
+                job.total_frames = start + frames
+            job.completed_segments.append(index)
+            job.save()
+
+    def _merge(self, job: VideoJob) -> List[dict]:
+        """
+        Concatenate the segments' tracked detections. Track ids are renumbered
+        to stay unique; an object crossing a segment boundary counts once per
+        segment (tickets only use the best confidence per issue).
+        """
+        merged = []
+        for index in range(len(job.segments)):
+            segment = json.loads(job.segment_path(index, ".json").read_text())
+            for det in segment["detections"]:
+                merged.append(dict(det, track_id=len(merged) + 1, segment=index))
+        return merged
+
+    def _cleanup(self, job: VideoJob):
+        """Drop everything but job.json once the result is stored"""
+        for path in job.dir.iterdir():
+            if path.name != "job.json":
+                path.unlink(missing_ok=True)
+
+    def shutdown(self):
+        self._segment_pool.shutdown(wait=False, cancel_futures=True)
+
+
+# Global manager (routers/complaints.py sets on_complete)
+video_jobs = VideoJobManager()
@@ -0,0 +1,40 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app_models import Ticket, SubTicket
+from database import Base, SessionLocal, engine
+from routers import inspector
+
+
+@pytest.fixture
+def client():
+    Base.metadata.create_all(engine)
+    with SessionLocal() as db:
+        db.add(Ticket(ticket_id="MDMS-TEST0001", latitude=17.38, longitude=78.48))
+        db.add_all([
+            SubTicket(sub_id="SUB-GRB001", ticket_id="MDMS-TEST0001", issue_type="garbage", authority="Garbage"),
+            SubTicket(sub_id="SUB-RDS001", ticket_id="MDMS-TEST0001", issue_type="pathholes", authority="Roads"),
+        ])
+        db.commit()
+
+    app = FastAPI()
+    app.include_router(inspector.router)
+    yield TestClient(app)
+    Base.metadata.drop_all(engine)
+
+
+def test_tickets_filtered_by_authority(client):
+    response = client.get("/api/inspector/tickets", params={"authority": "Garbage"})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["count"] == 1
+    assert [ticket["sub_id"] for ticket in body["tickets"]] == ["SUB-GRB001"]
+
+
+def test_tickets_without_authority_filter(client):
+    response = client.get("/api/inspector/tickets")
+
+    assert response.status_code == 200
+    assert {ticket["sub_id"] for ticket in response.json()["tickets"]} == {"SUB-GRB001", "SUB-RDS001"}
@@ -2,14 +2,32 @@
 YOLOv5 Detection Service
 Handles model loading and inference for object detection
 """
+import os
 import sys
+import time
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Tuple, Optional
+from typing import Callable, List, Tuple, Optional, Sequence
 
 # Add YOLOv5 to path
 YOLO_ROOT = Path(__file__).parent.parent / "yolov_5" / "yolov5"
 YOLO_ROOT = YOLO_ROOT.resolve()
 
+# How the fallback COCO model backs up the custom one (see YOLOv5Service.__init__)
+CASCADE_MODES = ("sequential", "gated", "parallel")
+
+# Annotation colour (BGR)
+BOX_COLOR = (0, 255, 0)
+
+# Fallback COCO model -> municipal categories
+# Garbage often looks like 'handbag', 'backpack', or 'bottle' to a standard model
+FALLBACK_CLASS_MAP = {name: "garbage" for name in ['handbag', 'backpack', 'suitcase', 'bottle', 'cup']}
+# Vehicles below this confidence are reported as street debris
+FALLBACK_LOW_CONF_VEHICLES = {'car', 'truck', 'bus'}
+FALLBACK_DEBRIS_CONF = 0.4
+
 # Lazy imports - only import when actually needed
 def _import_dependencies():
     """Import all required dependencies"""
@@ -83,9 +101,8 @@ def _import_dependencies():
                 scale_boxes,
                 LOGGER,
             )
-            from utils.augmentations import letterbox
+            from utils.plots import Annotator
             from utils.torch_utils import select_device
-            from utils.dataloaders import LoadImages
         finally:
             # Restore Backend path if it was there
             if backend_in_path:
@@ -99,9 +116,8 @@ def _import_dependencies():
             'non_max_suppression': non_max_suppression,
             'scale_boxes': scale_boxes,
             'LOGGER': LOGGER,
-            'letterbox': letterbox,
+            'Annotator': Annotator,
             'select_device': select_device,
-            'LoadImages': LoadImages,
         }
     except ImportError as e:
         raise ImportError(
@@ -121,16 +137,36 @@ class YOLOv5Service:
         img_size: int = 640,
         conf_threshold: float = 0.40,
         iou_threshold: float = 0.45,
+        batch_window_ms: Optional[float] = None,
+        max_batch_size: Optional[int] = None,
+        cascade: Optional[str] = None,
+        backend: Optional[str] = None,
     ):
         """
         Initialize YOLOv5 service
         
         Args:
-            weights_path: Path to model weights file (.pt)
+            weights_path: Path to model weights (env YOLO_WEIGHTS): .pt, or any
+                DetectMultiBackend export such as the INT8 models from
+                scripts/quantize_model.py (.onnx / *_openvino_model dir)
             device: Device to run inference on ('cpu', 'cuda', '0', etc.)
             img_size: Input image size for inference
             conf_threshold: Confidence threshold for detections
             iou_threshold: IoU threshold for NMS
+            batch_window_ms: How long the micro-batcher waits to coalesce frames
+                (env YOLO_BATCH_WINDOW_MS, default 10). 0 disables batching.
+            max_batch_size: Max frames per batched forward pass
+                (env YOLO_MAX_BATCH, default 8)
+            cascade: How the fallback COCO model is combined with the custom one
+                (env YOLO_CASCADE, default "sequential"):
+                - sequential: fallback pass on every frame the custom model found nothing in
+                - gated: same, but only for frames whose raw objectness reaches
+                  YOLO_CASCADE_OBJECTNESS (something is there, just not a custom class)
+                - parallel: both models run concurrently on the shared input tensor
+            backend: Inference runtime (env YOLO_BACKEND, default "auto"):
+                "pytorch", "onnx" or "openvino"; "auto" picks ONNX Runtime /
+                OpenVINO on CPU when installed. .pt weights are exported once
+                per weights hash into YOLO_RUNTIME_CACHE (see app_utils/runtime_export.py).
         """
         # Import dependencies
         deps = _import_dependencies()
@@ -142,14 +178,16 @@ class YOLOv5Service:
         self.non_max_suppression = deps['non_max_suppression']
         self.scale_boxes = deps['scale_boxes']
         self.LOGGER = deps['LOGGER']
-        self.letterbox = deps['letterbox']
+        self.Annotator = deps['Annotator']
         self.select_device = deps['select_device']
-        self.LoadImages = deps['LoadImages']
         
         self.device = self.select_device(device)
         self.img_size = img_size
         self.conf_threshold = conf_threshold
         self.iou_threshold = iou_threshold
+        self.video_keyframe_interval = int(os.getenv("YOLO_VIDEO_KEYFRAME_INTERVAL", "3"))
+        self.video_batch_size = int(os.getenv("YOLO_VIDEO_BATCH", "4"))
+        self._local = threading.local()  # per-thread preprocessing buffers
         
         # Default weights paths
         custom_weights = YOLO_ROOT / "weights" / "best.pt"
@@ -159,6 +197,7 @@ class YOLOv5Service:
         default_weights = YOLO_ROOT / "yolov5s.pt"
 
         # If weights_path provided, use it. Otherwise try custom, then default.
+        weights_path = weights_path or os.getenv("YOLO_WEIGHTS")
         if weights_path:
             self.weights_path = Path(weights_path)
         elif custom_weights.exists():
@@ -169,26 +208,21 @@ class YOLOv5Service:
         if not self.weights_path.exists():
             raise FileNotFoundError(f"Model weights not found at {self.weights_path}")
         
+        from app_utils.runtime_export import YOLO_INTRA_OP_THREADS, resolve_backend, runtime_of
+
+        self.backend = resolve_backend(backend or os.getenv("YOLO_BACKEND", "auto"), self.device.type)
+        self.runtime_cache = Path(os.getenv("YOLO_RUNTIME_CACHE", str(YOLO_ROOT / "runtime_cache")))
+        if self.backend == "pytorch" and self.device.type == "cpu" and YOLO_INTRA_OP_THREADS:
+            self.torch.set_num_threads(YOLO_INTRA_OP_THREADS)
+        
         # Load main model
-        self.model = self.DetectMultiBackend(
-            str(self.weights_path),
-            device=self.device,
-            dnn=False,
-            data=None,
-            fp16=False
-        )
+        self.model = self._load_model(self.weights_path)
 
         # Load Fallback COCO model if we are using custom weights
         self.fallback_model = None
         if self.weights_path != default_weights and default_weights.exists():
             try:
-                self.fallback_model = self.DetectMultiBackend(
-                    str(default_weights),
-                    device=self.device,
-                    dnn=False,
-                    data=None,
-                    fp16=False
-                )
+                self.fallback_model = self._load_model(default_weights)
                 self.LOGGER.info("✅ Fallback COCO model (yolov5s.pt) loaded successfully.")
                 self.fallback_names = self.fallback_model.names
             except Exception as e:
@@ -201,6 +235,19 @@ class YOLOv5Service:
         self.stride = self.model.stride
         self.names = self.model.names
         self.pt = self.model.pt
+        # PyTorch and our dynamic-axes exports accept any stride-multiple input shape
+        self.dynamic_shapes = self.pt or self.model.dynamic_export
+        
+        # Class id -> name lookup arrays; the fallback one has the smart mapping baked in
+        self._class_names = self._class_lookup(self.names)
+        self._fallback_class_names = None
+        self._fallback_vehicle_ids = None
+        if self.fallback_names is not None:
+            self._fallback_class_names = self._class_lookup(self.fallback_names, FALLBACK_CLASS_MAP)
+            self._fallback_vehicle_ids = self.np.array([
+                class_id for class_id, name in enumerate(self._class_lookup(self.fallback_names))
+                if name in FALLBACK_LOW_CONF_VEHICLES
+            ], dtype=int)
         
         # Check image size
         self.img_size = self.check_img_size(self.img_size, s=self.stride)
@@ -209,10 +256,63 @@ class YOLOv5Service:
         imgsz = (1, 3, self.img_size, self.img_size) if isinstance(self.img_size, int) else (1, 3, *self.img_size)
         self.model.warmup(imgsz=imgsz)
         
-        self.LOGGER.info(f"YOLOv5 model loaded from {weights_path}")
+        self.LOGGER.info(f"YOLOv5 model loaded from {self.weights_path}")
         self.LOGGER.info(f"Using device: {self.device}")
         self.LOGGER.info(f"Model classes: {self.names}")
+
+        # Fallback cascade
+        self.cascade = cascade or os.getenv("YOLO_CASCADE", "sequential")
+        if self.cascade not in CASCADE_MODES:
+            raise ValueError(f"Unknown cascade mode {self.cascade!r} (expected one of {', '.join(CASCADE_MODES)})")
+        self.cascade_objectness = float(os.getenv("YOLO_CASCADE_OBJECTNESS", "0.1"))
+        self.cascade_stats = {"frames": 0, "empty": 0, "fallback": 0}
+        self._stats_lock = threading.Lock()
+        # Parallel cascade: each calling thread (batcher, live cameras, video workers)
+        # gets its own fallback thread, see _start_fallback
+        self._parallel_fallback = bool(self.fallback_model) and self.cascade == "parallel"
+        if self.fallback_model:
+            self.LOGGER.info(f"Fallback cascade: {self.cascade}")
+
+        self.LOGGER.info(f"Inference backend: {runtime_of(self.model)} (dynamic input shapes: {self.dynamic_shapes})")
+
+        # Micro-batching scheduler for concurrent detect_image callers
+        if batch_window_ms is None:
+            batch_window_ms = float(os.getenv("YOLO_BATCH_WINDOW_MS", "10"))
+        if max_batch_size is None:
+            max_batch_size = int(os.getenv("YOLO_MAX_BATCH", "8"))
+        self.batcher = None
+        if batch_window_ms > 0 and max_batch_size > 1:
+            self.batcher = InferenceBatcher(self, window_ms=batch_window_ms, max_batch_size=max_batch_size)
+            self.LOGGER.info(f"Micro-batching enabled: window={batch_window_ms}ms, max_batch={max_batch_size}")
     
+    def _load_model(self, weights_path: Path) -> any:
+        """
+        DetectMultiBackend for these weights on self.backend. .pt weights are
+        served from a cached ONNX / OpenVINO export; if the export fails the
+        PyTorch weights are used as before.
+        """
+        from app_utils.runtime_export import export_runtime_model, has_dynamic_input, runtime_of, tune_runtime
+
+        model_path = weights_path
+        if self.backend != "pytorch" and weights_path.suffix == ".pt":
+            exported = export_runtime_model(weights_path, self.backend, self.img_size, self.runtime_cache)
+            if exported is not None:
+                model_path = exported
+            else:
+                self.LOGGER.warning(f"⚠️ {self.backend} export of {weights_path.name} failed, serving PyTorch weights")
+        
+        model = self.DetectMultiBackend(
+            str(model_path),
+            device=self.device,
+            dnn=False,
+            data=None,
+            fp16=False
+        )
+        if model_path != weights_path or weights_path.suffix != ".pt":
+            tune_runtime(model, runtime_of(model), model_path)
+        model.dynamic_export = has_dynamic_input(model)  # our exports (incl. INT8) use dynamic axes
+        return model
+
     def detect(
         self,
         image_path: str | Path,
@@ -234,82 +334,10 @@ class YOLOv5Service:
         if not image_path.exists():
             raise FileNotFoundError(f"Image not found: {image_path}")
         
-        # Load image
-        dataset = self.LoadImages(
-            str(image_path),
-            img_size=self.img_size,
-            stride=self.stride,
-            auto=self.pt
-        )
-        
-        detections = []
-        annotated_img = None
-        
-        for path, im, im0s, vid_cap, s in dataset:
-            # Preprocess
-            im = self.torch.from_numpy(im).to(self.device)
-            im = im.half() if self.model.fp16 else im.float()
-            im /= 255.0
-            if len(im.shape) == 3:
-                im = im[None]  # Add batch dimension
-            
-            # Inference
-            pred = self.model(im, augment=False, visualize=False)
-            
-            # NMS
-            pred = self.non_max_suppression(
-                pred,
-                self.conf_threshold,
-                self.iou_threshold,
-                classes=None,
-                agnostic=False,
-                max_det=1000
-            )
-            
-            # Process predictions
-            im0 = im0s.copy()
-            gn = self.torch.tensor(im0.shape)[[1, 0, 1, 0]]  # normalization gain whwh
-            
-            for i, det in enumerate(pred):
-                if len(det):
-                    # Rescale boxes from img_size to im0 size
-                    det[:, :4] = self.scale_boxes(im.shape[2:], det[:, :4], im0.shape).round()
-                    
-                    # Extract detections
-                    for *xyxy, conf, cls in reversed(det):
-                        x1, y1, x2, y2 = [float(x.item()) for x in xyxy]
-                        confidence = float(conf.item())
-                        class_id = int(cls.item())
-                        class_name = self.names[class_id]
-                        
-                        detections.append({
-                            "class_name": class_name,
-                            "confidence": confidence,
-                            "bbox": {
-                                "x1": x1,
-                                "y1": y1,
-                                "x2": x2,
-                                "y2": y2,
-                            }
-                        })
-                        
-                        # Draw bounding box on image
-                        if save_annotated:
-                            label = f"{class_name} {confidence:.2f}"
-                            self.cv2.rectangle(im0, (int(x1), int(y1)), (int(x2), int(y2)), (0, 255, 0), 2)
-                            self.cv2.putText(
-                                im0,
-                                label,
-                                (int(x1), int(y1) - 10),
-                                self.cv2.FONT_HERSHEY_SIMPLEX,
-                                0.5,
-                                (0, 255, 0),
-                                2
-                            )
-            
-            annotated_img = im0
-        
-        return detections, annotated_img
+        im0 = self.cv2.imread(str(image_path))
+        if im0 is None:
+            raise ValueError(f"Failed to read image: {image_path}")
+        return self.detect_batch([im0], save_annotated)[0]
     
     def detect_image(
         self,
@@ -319,6 +347,9 @@ class YOLOv5Service:
         """
         Run detection on a numpy array (image)
         
+        Concurrent callers are coalesced by the micro-batcher into a single
+        batched forward pass when batching is enabled.
+        
         Args:
             im0: Input image as numpy array (BGR)
             save_annotated: Whether to return annotated image
@@ -329,81 +360,219 @@ class YOLOv5Service:
         if im0 is None:
             raise ValueError("Input image is None")
         
-        # Use YOLOv5 preprocessing
-        im = self.letterbox(im0, self.img_size, stride=self.stride, auto=self.pt)[0]
-        im = im.transpose((2, 0, 1))[::-1]
-        im = self.np.ascontiguousarray(im)
-        
-        # Convert to tensor
-        im_tensor = self.torch.from_numpy(im).to(self.device).float()
-        im_tensor /= 255.0
-        if im_tensor.ndim == 3:
-            im_tensor = im_tensor[None]
-        
-        # Inference
-        self.LOGGER.info(f"Running inference on image with shape {im_tensor.shape}")
-        pred = self.model(im_tensor, augment=False, visualize=False)
-        self.LOGGER.info(f"Raw predictions count: {len(pred[0]) if len(pred) else 0}")
-        
-        # NMS
-        pred = self.non_max_suppression(
-            pred, self.conf_threshold, self.iou_threshold,
-            classes=None, agnostic=False, max_det=1000
+        if self.batcher is not None:
+            return self.batcher.submit(im0, save_annotated).result()
+        return self.detect_batch([im0], save_annotated)[0]
+
+    def detect_batch(
+        self,
+        images: Sequence[any],
+        save_annotated: bool | Sequence[bool] = True,
+        img_size: Optional[int] = None,
+        conf_threshold: Optional[float] = None,
+    ) -> List[Tuple[List[dict], any]]:
+        """
+        Run detection on several images in one batched forward pass
+        
+        Args:
+            images: List of input images as numpy arrays (BGR)
+            save_annotated: Whether to draw boxes (single flag or one per image)
+            img_size: Inference size override, one of supported_img_sizes() (default: self.img_size)
+            conf_threshold: Confidence threshold override (default: self.conf_threshold)
+            
+        Returns:
+            List of (detections list, annotated image array), one per input image;
+            the input image itself (not a copy) where save_annotated is False
+        """
+        if not images:
+            return []
+        if any(im0 is None for im0 in images):
+            raise ValueError("Input image is None")
+        if isinstance(save_annotated, bool):
+            save_annotated = [save_annotated] * len(images)
+        
+        # Single frames keep the minimum-rectangle letterbox; batches share one square shape
+        auto = self.dynamic_shapes and len(images) == 1
+        im_tensor, geometries = self._preprocessor()(
+            images, img_size or self.img_size, auto=auto, half=self.model.fp16
         )
         
-        detections = []
-        annotated_img = im0.copy()
+        preds, fallback_mask = self._infer(im_tensor, conf_threshold)
+        
+        return [
+            self._postprocess(det, im_tensor.shape[2:], im0, using_fallback, annotate, geometry.ratio_pad)
+            for det, im0, using_fallback, annotate, geometry
+            in zip(preds, images, fallback_mask, save_annotated, geometries)
+        ]
+
+    def supported_img_sizes(self, candidates: Sequence[int] = (320, 416, 512, 640)) -> List[int]:
+        """
+        Inference sizes detect_batch accepts: stride multiples up to the
+        configured img_size (PyTorch weights or our dynamic-axes exports -
+        other exported models are compiled for a single input shape).
+        """
+        if not self.dynamic_shapes or not isinstance(self.img_size, int):
+            return [self.img_size]
+        sizes = {self.check_img_size(size, s=self.stride) for size in candidates if size <= self.img_size}
+        sizes.add(self.img_size)
+        return sorted(sizes)
+
+    def _preprocessor(self) -> any:
+        """This thread's letterbox/normalize buffers (reused across frames of the same shape)"""
+        preprocessor = getattr(self._local, "preprocessor", None)
+        if preprocessor is None:
+            from app_utils.preprocess import Preprocessor
+            preprocessor = self._local.preprocessor = Preprocessor(self.torch, self.device, self.stride)
+        return preprocessor
+
+    def _infer(self, im_tensor: any, conf_threshold: Optional[float] = None) -> Tuple[List[any], List[bool]]:
+        """
+        Batched forward + NMS with per-frame fallback
         
-        # Track which model was used
-        using_fallback = False
+        Frames where the custom model found nothing are answered by the
+        fallback COCO model, according to self.cascade (see __init__).
         
-        # 🔥 Fallback Logic: If no detections and fallback model exists, try it
-        if (not pred or not any(len(d) for d in pred)) and self.fallback_model:
-            self.LOGGER.info("No custom detections found. Trying fallback model...")
-            using_fallback = True
-            pred = self.fallback_model(im_tensor, augment=False, visualize=False)
-            pred = self.non_max_suppression(
-                pred, self.conf_threshold, self.iou_threshold,
-                classes=None, agnostic=False, max_det=1000
-            )
+        Returns:
+            Tuple of (per-frame det tensors, per-frame "used fallback" flags)
+        """
+        conf_threshold = self.conf_threshold if conf_threshold is None else conf_threshold
+        self.LOGGER.info(f"Running inference on batch with shape {tuple(im_tensor.shape)}")
+        
+        # Parallel cascade: the fallback pass starts before we know whether it is needed
+        fallback_future = self._start_fallback(im_tensor) if self._parallel_fallback else None
+        
+        pred = self._forward(self.model, im_tensor)
+        preds = self._nms(pred, conf_threshold)
+        fallback_mask = [False] * len(preds)
+        
+        # 🔥 Fallback Logic: frames with no detections go through the fallback model
+        empty = [i for i, det in enumerate(preds) if det is None or not len(det)]
+        frames, empty_frames, fallback_frames = len(preds), len(empty), 0
+        
+        if empty and self.fallback_model:
+            if fallback_future is not None:
+                pred = fallback_future.result()
+                fallback_preds = self._nms(self._select(pred, empty, len(preds)), conf_threshold)
+            else:
+                if self.cascade == "gated":
+                    # Cheap check on the custom model's raw output: skip frames with nothing object-like
+                    objectness = self._raw(pred)[..., 4].amax(dim=1).tolist()
+                    empty = [i for i in empty if objectness[i] >= self.cascade_objectness]
+                fallback_preds = []
+                if empty:
+                    self.LOGGER.info(f"No custom detections found in {len(empty)} frame(s). Trying fallback model...")
+                    sub = im_tensor[empty] if len(empty) < len(preds) else im_tensor
+                    fallback_preds = self._nms(self._forward(self.fallback_model, sub), conf_threshold)
+            
+            fallback_frames = len(empty)
+            for i, det in zip(empty, fallback_preds):
+                preds[i] = det
+                fallback_mask[i] = True
+        elif fallback_future is not None:
+            fallback_future.cancel()  # custom model found something everywhere; result unused
+        
+        # Called from the batcher, live and pool threads at once
+        with self._stats_lock:
+            self.cascade_stats["frames"] += frames
+            self.cascade_stats["empty"] += empty_frames
+            self.cascade_stats["fallback"] += fallback_frames
+        return preds, fallback_mask
+
+    def _start_fallback(self, im_tensor: any) -> Optional[Future]:
+        """
+        Start the parallel fallback pass on the calling thread's own fallback
+        thread, so callers never queue behind each other's passes. Returns None
+        (sequential fallback for this call) while this caller's previous,
+        unused pass is still running - a started pass cannot be cancelled.
+        """
+        local = self._local
+        previous = getattr(local, "fallback_future", None)
+        if previous is not None and not previous.done():
+            return None
+        pool = getattr(local, "fallback_pool", None)
+        if pool is None:
+            # Freed with the calling thread's locals; the idle worker then exits
+            pool = local.fallback_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="yolo-fallback")
+        local.fallback_future = pool.submit(self._forward, self.fallback_model, im_tensor)
+        return local.fallback_future
+
+    def _forward(self, model: any, im_tensor: any) -> any:
+        # no_grad is thread-local, so it is entered here (the parallel cascade calls this from its own thread)
+        with self.torch.no_grad():
+            return model(im_tensor, augment=False, visualize=False)
 
-        if len(pred):
-            for i, det in enumerate(pred):
-                if det is not None and len(det) > 0:
-                    det[:, :4] = self.scale_boxes(im_tensor.shape[2:], det[:, :4], im0.shape).round()
-                    for *xyxy, conf, cls in reversed(det):
-                        x1, y1, x2, y2 = [float(x.item()) for x in xyxy]
-                        confidence = float(conf.item())
-                        
-                        # Use correct names list
-                        current_names = self.fallback_names if using_fallback else self.names
-                        class_name = current_names[int(cls)]
-                        
-                        self.LOGGER.info(f"NMS Result: {class_name} ({confidence:.2f})")
-
-                        # 🧠 SMART MAPPING: Map COCO objects to municipal categories
-                        # Garbage often looks like 'handbag', 'backpack', or 'bottle' to a standard model
-                        if using_fallback:
-                            if class_name in ['handbag', 'backpack', 'suitcase', 'bottle', 'cup']:
-                                class_name = "garbage"
-                            elif class_name in ['car', 'truck', 'bus'] and confidence < 0.4:
-                                # Low confidence vehicles on road could be debris
-                                class_name = "street_debris"
-
-                        detections.append({
-                            "class_name": class_name,
-                            "confidence": confidence,
-                            "bbox": {"x1": x1, "y1": y1, "x2": x2, "y2": y2}
-                        })
-                        
-                        if save_annotated:
-                            label = f"{class_name} {confidence:.2f}"
-                            self.cv2.rectangle(annotated_img, (int(x1), int(y1)), (int(x2), int(y2)), (0, 255, 0), 2)
-                            self.cv2.putText(annotated_img, label, (int(x1), int(y1) - 10),
-                                            self.cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+    def _nms(self, pred: any, conf_threshold: float) -> List[any]:
+        return self.non_max_suppression(
+            pred, conf_threshold, self.iou_threshold,
+            classes=None, agnostic=False, max_det=1000
+        )
+
+    @staticmethod
+    def _raw(pred: any) -> any:
+        """Inference output tensor (B, anchors, 5 + classes) of a DetectMultiBackend call"""
+        return pred[0] if isinstance(pred, (list, tuple)) else pred
+
+    def _select(self, pred: any, indices: List[int], total: int) -> any:
+        """Rows of a raw prediction for a subset of the batch"""
+        return pred if len(indices) == total else self._raw(pred)[indices]
+
+    def _postprocess(
+        self,
+        det: any,
+        im_shape: any,
+        im0: any,
+        using_fallback: bool,
+        save_annotated: bool,
+        ratio_pad: Optional[tuple] = None,
+    ) -> Tuple[List[dict], any]:
+        """
+        Rescale one frame's NMS output to the original image and build detection dicts
+        
+        The image is only copied when boxes are drawn; otherwise im0 itself is returned.
+        """
+        annotated_img = im0.copy() if save_annotated else im0
+        if det is None or not len(det):
+            return [], annotated_img
+        
+        det[:, :4] = self.scale_boxes(im_shape, det[:, :4], im0.shape, ratio_pad).round()
+        
+        # One device->host transfer per frame (reversed: lowest confidence first, as before)
+        rows = det[:, :6].cpu().numpy()[::-1]
+        class_ids = rows[:, 5].astype(int)
+        confidences = rows[:, 4]
+        
+        if using_fallback:
+            # 🧠 SMART MAPPING: Map COCO objects to municipal categories (see FALLBACK_CLASS_MAP)
+            class_names = self._fallback_class_names[class_ids]
+            # Low confidence vehicles on road could be debris
+            debris = self.np.isin(class_ids, self._fallback_vehicle_ids) & (confidences < FALLBACK_DEBRIS_CONF)
+            class_names[debris] = "street_debris"
+        else:
+            class_names = self._class_names[class_ids]
+        
+        names, counts = self.np.unique(class_names, return_counts=True)
+        self.LOGGER.info(f"NMS Result: {', '.join(f'{n} x{c}' for n, c in zip(names, counts))}")
+        
+        detections = [
+            {"class_name": name, "confidence": confidence, "bbox": {"x1": x1, "y1": y1, "x2": x2, "y2": y2}}
+            for name, confidence, (x1, y1, x2, y2)
+            in zip(class_names.tolist(), confidences.tolist(), rows[:, :4].tolist())
+        ]
+        
+        if save_annotated:
+            self.draw_boxes(annotated_img, detections)
         
         return detections, annotated_img
 
+    def _class_lookup(self, names, remap: Optional[dict] = None) -> any:
+        """Model names (dict or list) as an object array indexed by class id, optionally remapped"""
+        if isinstance(names, dict):
+            lookup = [names.get(i, str(i)) for i in range(max(names) + 1)]
+        else:
+            lookup = list(names)
+        remap = remap or {}
+        return self.np.array([remap.get(name, name) for name in lookup], dtype=object)
+
     def detect_from_bytes(
         self,
         image_bytes: bytes,
@@ -419,155 +588,268 @@ class YOLOv5Service:
         video_path: str | Path,
         output_path: Optional[str | Path] = None,
         conf_threshold: Optional[float] = None,
+        keyframe_interval: Optional[int] = None,
+        sampling: Optional[str] = None,
     ) -> Tuple[str, List[dict], int]:
         """
-        Run detection on a video file
+        Run detection on a video file with object tracking
         
         Args:
             video_path: Path to input video file
             output_path: Path to save annotated video (optional)
             conf_threshold: Confidence threshold (uses instance default if None)
+            keyframe_interval: Run the detector every N frames, tracking in between
+                (env YOLO_VIDEO_KEYFRAME_INTERVAL, default 3; 1 = every frame)
+            sampling: Keyframe selection mode, "stride", "scene" or "budget"
+                (see services/video_sampling.py; env YOLO_VIDEO_SAMPLING)
             
         Returns:
-            Tuple of (output_video_path, cumulative_detections, frames_processed)
+            Tuple of (output_video_path, cumulative_detections, frames_processed);
+            cumulative_detections has one best-confidence entry per tracked object
+            (with track_id, hits, first_frame, last_frame)
         """
-        import time
         start_time = time.time()
         
         video_path = Path(video_path)
         if not video_path.exists():
             raise FileNotFoundError(f"Video not found: {video_path}")
         
-        # Use instance threshold or provided one
-        conf_thresh = conf_threshold if conf_threshold is not None else self.conf_threshold
-        
         # Set output path
         if output_path is None:
             output_path = video_path.parent / f"annotated_{video_path.name}"
         else:
             output_path = Path(output_path)
         
-        # Load video
+        cumulative_detections, frames_processed = self.detect_video_segment(
+            video_path, output_path,
+            conf_threshold=conf_threshold, keyframe_interval=keyframe_interval, sampling=sampling,
+        )
+        
+        processing_time = time.time() - start_time
+        self.LOGGER.info(
+            f"Video processing complete: {frames_processed} frames, "
+            f"{len(cumulative_detections)} tracked objects, {processing_time:.2f}s"
+        )
+        
+        return str(output_path), cumulative_detections, frames_processed
+
+    def detect_video_segment(
+        self,
+        video_path: str | Path,
+        output_path: str | Path,
+        start_frame: int = 0,
+        end_frame: Optional[int] = None,
+        conf_threshold: Optional[float] = None,
+        keyframe_interval: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        progress: Optional[Callable[[int], None]] = None,
+        sampling: Optional[str] = None,
+    ) -> Tuple[List[dict], int]:
+        """
+        Detect and track frames [start_frame, end_frame) of a video, writing
+        the annotated frames to output_path as they are produced
+        
+        Frames are read in windows of sampling interval * batch_size; the
+        window's keyframes (picked by a FrameSampler) go through one
+        detect_batch call and the tracker propagates boxes over the frames
+        in between.
+        
+        Args:
+            start_frame / end_frame: Frame range (end_frame None = to the end)
+            batch_size: Keyframes per forward pass (env YOLO_VIDEO_BATCH, default 4)
+            progress: Called with the number of frames done so far in this range
+            sampling: Keyframe selection mode (see detect_video)
+            
+        Returns:
+            Tuple of (tracked detections with absolute frame numbers, frames_processed)
+        """
+        from app_utils.tracking import SortTracker
+        from services.video_sampling import FrameSampler
+
+        conf_thresh = conf_threshold if conf_threshold is not None else self.conf_threshold
+        batch_size = max(1, batch_size or self.video_batch_size)
+        
         cap = self.cv2.VideoCapture(str(video_path))
         if not cap.isOpened():
             raise ValueError(f"Failed to open video: {video_path}")
+        if start_frame:
+            cap.set(self.cv2.CAP_PROP_POS_FRAMES, start_frame)
         
         # Get video properties
         fps = int(cap.get(self.cv2.CAP_PROP_FPS)) or 30
         width = int(cap.get(self.cv2.CAP_PROP_FRAME_WIDTH))
         height = int(cap.get(self.cv2.CAP_PROP_FRAME_HEIGHT))
         total_frames = int(cap.get(self.cv2.CAP_PROP_FRAME_COUNT))
+        last_frame = total_frames if end_frame is None else min(end_frame, total_frames or end_frame)
         
-        self.LOGGER.info(f"Processing video: {width}x{height}, {fps} FPS, {total_frames} frames")
+        sampler = FrameSampler(fps, sampling, keyframe_interval or self.video_keyframe_interval)
         
-        # Create video writer - try 'avc1' for H.264 (web compatible)
-        try:
-            fourcc = self.cv2.VideoWriter_fourcc(*'avc1')
-            out = self.cv2.VideoWriter(str(output_path), fourcc, fps, (width, height))
-            if not out.isOpened():
-                raise Exception("avc1 failed")
-        except:
-            # Fallback to mp4v if avc1 is not available
-            fourcc = self.cv2.VideoWriter_fourcc(*'mp4v')
-            out = self.cv2.VideoWriter(str(output_path), fourcc, fps, (width, height))
+        self.LOGGER.info(
+            f"Processing video: {width}x{height}, {fps} FPS, frames {start_frame}-{last_frame or 'end'}, "
+            f"sampling={sampler.mode} every {sampler.interval} frame(s)"
+        )
+        out = self.open_video_writer(output_path, fps, width, height)
         
+        # Detector on keyframes only; the tracker propagates boxes in between
+        tracker = SortTracker(max_age=max(30, 3 * sampler.max_gap))
+        window = sampler.interval * batch_size
         frames_processed = 0
-        cumulative_detections = []
         
         try:
-            while True:
-                ret, frame = cap.read()
-                if not ret:
+            while end_frame is None or start_frame + frames_processed < end_frame:
+                limit = window if end_frame is None else min(window, end_frame - start_frame - frames_processed)
+                frames = []
+                while len(frames) < limit:
+                    ret, frame = cap.read()
+                    if not ret:
+                        break
+                    frames.append(frame)
+                if not frames:
                     break
                 
-                # Preprocess frame
-                im = self.letterbox(frame, self.img_size, stride=self.stride, auto=self.pt)[0]
-                im = im.transpose((2, 0, 1))[::-1]  # HWC to CHW, BGR to RGB
-                im = self.np.ascontiguousarray(im)
-                
-                # Convert to tensor
-                im_tensor = self.torch.from_numpy(im).to(self.device)
-                im_tensor = im_tensor.half() if self.model.fp16 else im_tensor.float()
-                im_tensor /= 255.0
-                if len(im_tensor.shape) == 3:
-                    im_tensor = im_tensor[None]
-                
-                # Inference - Primary
-                pred = self.model(im_tensor, augment=False, visualize=False)
-                pred = self.non_max_suppression(
-                    pred, conf_thresh, self.iou_threshold,
-                    classes=None, agnostic=False, max_det=1000
+                keyframes = [i for i, frame in enumerate(frames) if sampler.is_keyframe(frames_processed + i, frame)]
+                results = self.detect_batch(
+                    [frames[i] for i in keyframes], save_annotated=False, conf_threshold=conf_thresh
                 )
+                keyframe_detections = {i: detections for i, (detections, _) in zip(keyframes, results)}
                 
-                using_fallback = False
-                # Fallback Logic
-                if (not pred or not any(len(d) for d in pred)) and self.fallback_model:
-                    using_fallback = True
-                    pred = self.fallback_model(im_tensor, augment=False, visualize=False)
-                    pred = self.non_max_suppression(
-                        pred, conf_thresh, self.iou_threshold,
-                        classes=None, agnostic=False, max_det=1000
-                    )
-
-                # Process detections
-                frame_detections_count = 0
-                for det in pred:
-                    if det is not None and len(det) > 0:
-                        # Rescale boxes
-                        det[:, :4] = self.scale_boxes(im_tensor.shape[2:], det[:, :4], frame.shape).round()
-                        
-                        # Use correct names list
-                        current_names = self.fallback_names if using_fallback else self.names
-
-                        # Draw bounding boxes
-                        for *xyxy, conf, cls in reversed(det):
-                            x1, y1, x2, y2 = [int(x.item()) for x in xyxy]
-                            confidence = float(conf.item())
-                            class_name = current_names[int(cls)]
-                            
-                            # 🧠 SMART MAPPING: Map COCO objects to municipal categories
-                            if using_fallback:
-                                if class_name in ['handbag', 'backpack', 'suitcase', 'bottle', 'cup']:
-                                    class_name = "garbage"
-                                elif class_name in ['car', 'truck', 'bus'] and confidence < 0.4:
-                                    class_name = "street_debris"
-
-                            cumulative_detections.append({
-                                "class_name": class_name,
-                                "confidence": confidence,
-                                "frame": frames_processed
-                            })
-
-                            # Draw box
-                            label = f"{class_name} {confidence:.2f}"
-                            self.cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                            self.cv2.putText(frame, label, (x1, y1 - 10),
-                                            self.cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-                            frame_detections_count += 1
-                
-                frames_processed += 1
-                out.write(frame)
+                for i, frame in enumerate(frames):
+                    propagated = tracker.predict()
+                    if i in keyframe_detections:
+                        boxes = tracker.update(keyframe_detections[i], start_frame + frames_processed + i)
+                    else:
+                        boxes = propagated
+                    self.draw_boxes(frame, boxes)
+                    out.write(frame)
                 
-                if frames_processed % 30 == 0:
-                    self.LOGGER.info(f"Processed {frames_processed}/{total_frames} frames")
+                frames_processed += len(frames)
+                if progress:
+                    progress(frames_processed)
+                if len(frames) < limit:
+                    break  # end of stream
         
         finally:
             cap.release()
             out.release()
         
-        processing_time = time.time() - start_time
-        self.LOGGER.info(f"Video processing complete: {frames_processed} frames, {len(cumulative_detections)} total detections, {processing_time:.2f}s")
-        
-        return str(output_path), cumulative_detections, frames_processed
+        self.LOGGER.info(f"Sampled {sampler.sampled}/{frames_processed} frames ({sampler.mode})")
+        # One best-confidence detection per tracked object (not one per frame per box)
+        # Single-sighting objects included: the clip is over, a defect seen once is still a defect
+        return tracker.summary(include_unconfirmed=True), frames_processed
+
+    def open_video_writer(self, output_path: str | Path, fps: float, width: int, height: int) -> any:
+        """cv2.VideoWriter, H.264 ('avc1', web compatible) when available, else 'mp4v'"""
+        try:
+            fourcc = self.cv2.VideoWriter_fourcc(*'avc1')
+            out = self.cv2.VideoWriter(str(output_path), fourcc, fps, (width, height))
+            if not out.isOpened():
+                raise Exception("avc1 failed")
+        except:
+            # Fallback to mp4v if avc1 is not available
+            fourcc = self.cv2.VideoWriter_fourcc(*'mp4v')
+            out = self.cv2.VideoWriter(str(output_path), fourcc, fps, (width, height))
+        return out
+
+    def draw_boxes(self, frame: any, boxes: List[dict]):
+        """Draw detection / track boxes in place (thin boxes are propagated by a tracker, not detected)"""
+        annotators = {}  # line width -> Annotator over the same frame
+        for box in boxes:
+            bbox = box["bbox"]
+            label = f"{box['class_name']} {box['confidence']:.2f}"
+            if box.get("track_id") is not None:
+                label = f"#{box['track_id']} {label}"
+            width = 1 if box.get("predicted") else 2
+            annotator = annotators.get(width)
+            if annotator is None:
+                annotator = annotators[width] = self.Annotator(frame, line_width=width)
+            annotator.box_label((bbox["x1"], bbox["y1"], bbox["x2"], bbox["y2"]), label, color=BOX_COLOR)
+
+
+class InferenceBatcher:
+    """
+    Request-coalescing inference scheduler
+    
+    Frames submitted from any thread are queued; a single worker thread
+    collects everything that arrives within `window_ms` (up to
+    `max_batch_size` frames), runs one batched forward + NMS through
+    `YOLOv5Service.detect_batch` and resolves each caller's Future.
+    """
+    
+    def __init__(self, service: "YOLOv5Service", window_ms: float = 10, max_batch_size: int = 8):
+        self.service = service
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self._queue = queue.Queue()
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="yolo-batcher", daemon=True)
+        self._thread.start()
+    
+    @property
+    def pending(self) -> int:
+        """Frames queued or in a running batch"""
+        return self._pending
+    
+    def submit(self, im0: any, save_annotated: bool = True) -> Future:
+        """
+        Queue a frame for detection; the Future resolves to (detections, annotated_img).
+        Async callers should await it (asyncio.wrap_future) rather than block
+        a pool thread on it, so enough frames arrive to fill a batch.
+        """
+        future = Future()
+        with self._pending_lock:
+            self._pending += 1
+        future.add_done_callback(self._done)
+        self._queue.put((im0, save_annotated, future))
+        return future
+    
+    def _done(self, _future: Future):
+        with self._pending_lock:
+            self._pending -= 1
+    
+    def _collect(self) -> list:
+        """Block for the first frame, then gather more until the window closes or the batch is full"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+    
+    def _run(self):
+        while True:
+            batch = [item for item in self._collect() if item[2].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                results = self.service.detect_batch(
+                    [im0 for im0, _, _ in batch],
+                    [annotate for _, annotate, _ in batch],
+                )
+            except Exception as e:
+                self.service.LOGGER.warning(f"Batched inference failed for {len(batch)} frame(s): {e}")
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, _, future), result in zip(batch, results):
+                future.set_result(result)
 
 
 # Global service instance (lazy loading)
 _yolo_service: Optional[YOLOv5Service] = None
+_yolo_service_lock = threading.Lock()
 
 
 def get_yolo_service() -> YOLOv5Service:
     """Get or create YOLOv5 service instance"""
     global _yolo_service
     if _yolo_service is None:
-        _yolo_service = YOLOv5Service()
+        with _yolo_service_lock:
+            if _yolo_service is None:
+                _yolo_service = YOLOv5Service()
     return _yolo_service